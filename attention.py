@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""Attention backends for TransformerBlock beyond the stock MultiHeadAttention.
+
+  - "chunked": exact softmax attention computed over blocks of keys with an
+               online (running max / running sum) softmax, so at most
+               (batch, heads, length, chunk_size) scores exist at a time; the
+               backward pass recomputes each block instead of storing it
+  - "local":   sliding-window attention where every position only attends to
+               the `window` positions before it (or around it when not
+               causal), computed blockwise in O(length * window)
+
+EfficientAttention keeps the weight layout of layers.MultiHeadAttention
+(query/key/value kernels of shape (embed, heads, key_dim), output kernel of
+shape (heads, key_dim, embed)), so the KV-cached TransformerDecoder in
+generation.py reads either layer the same way.
+"""
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras import layers
+
+ATTENTION_BACKENDS = ("mha", "chunked", "local")
+
+# Added to masked scores; large enough to vanish in the softmax, finite so
+# fully masked rows never produce NaNs
+_MASK_VALUE = -1e30
+
+
+def chunked_attention(q, k, v, chunk_size=128, causal=False):
+    """Exact attention over key blocks of `chunk_size`; q is already scaled.
+
+    q, k, v have shape (batch, length, heads, key_dim) and so does the result.
+    Computed in float32 whatever the input dtype. The forward pass keeps only
+    the output and the per-query log-sum-exp; the backward pass recomputes
+    each block's probabilities from them. Both passes loop over the key blocks
+    in a tf.while_loop, which keeps the graph optimizer from merging the
+    recomputation with the forward pass (and so keeping every block alive).
+    """
+    dtype = q.dtype
+    q, k, v = (tf.transpose(tf.cast(t, tf.float32), [0, 2, 1, 3]) for t in (q, k, v))
+    length = q.shape[2]
+    chunks = -(-length // chunk_size)
+
+    # Pad the keys to whole blocks; padded keys are masked out like future ones
+    pad = [[0, 0], [0, 0], [0, chunks * chunk_size - length], [0, 0]]
+    k, v = tf.pad(k, pad), tf.pad(v, pad)
+    query_pos = tf.range(length)[:, None]
+
+    def block(t, i):
+        # Block i of a padded (batch, heads, length, key_dim) tensor; a reshape
+        # and gather keeps the block shape static, which XLA needs
+        blocks = tf.reshape(t, tf.concat([tf.shape(t)[:2], [chunks, chunk_size, t.shape[-1]]], 0))
+        return tf.gather(blocks, i, axis=2)
+
+    def block_scores(q, k, i):
+        scores = tf.einsum("bhqd,bhkd->bhqk", q, block(k, i))
+        key_pos = i * chunk_size + tf.range(chunk_size)[None, :]
+        masked = key_pos >= length
+        if causal:
+            masked = masked | (key_pos > query_pos)
+        return tf.where(masked, _MASK_VALUE, scores)
+
+    @tf.custom_gradient
+    def attend(q, k, v):
+        def body(i, m, l, acc):
+            # Online softmax: rescale what was accumulated to the new running max
+            scores = block_scores(q, k, i)
+            m_new = tf.maximum(m, tf.reduce_max(scores, axis=-1))
+            p = tf.exp(scores - m_new[..., None])
+            correction = tf.exp(m - m_new)
+            l = l * correction + tf.reduce_sum(p, axis=-1)
+            acc = acc * correction[..., None] + tf.einsum("bhqk,bhkd->bhqd", p, block(v, i))
+            return i + 1, m_new, l, acc
+
+        m = tf.fill(tf.shape(q)[:3], _MASK_VALUE)
+        _, m, l, acc = tf.while_loop(lambda i, *_: i < chunks, body,
+                                     (tf.constant(0), m, tf.zeros_like(m), tf.zeros_like(q)))
+        out = acc / l[..., None]
+        lse = m + tf.math.log(l)
+
+        def grad(dout):
+            delta = tf.reduce_sum(dout * out, axis=-1, keepdims=True)
+
+            def grad_body(i, dq, dk, dv):
+                p = tf.exp(block_scores(q, k, i) - lse[..., None])
+                ds = p * (tf.einsum("bhqd,bhkd->bhqk", dout, block(v, i)) - delta)
+                dq = dq + tf.einsum("bhqk,bhkd->bhqd", ds, block(k, i))
+                dk = dk.write(i, tf.einsum("bhqk,bhqd->bhkd", ds, q))
+                dv = dv.write(i, tf.einsum("bhqk,bhqd->bhkd", p, dout))
+                return i + 1, dq, dk, dv
+
+            def blocks_array():
+                return tf.TensorArray(tf.float32, size=chunks, element_shape=block(k, 0).shape)
+
+            _, dq, dk, dv = tf.while_loop(lambda i, *_: i < chunks, grad_body,
+                                          (tf.constant(0), tf.zeros_like(q), blocks_array(), blocks_array()))
+
+            def unblock(array):
+                # (chunks, batch, heads, chunk_size, key_dim) -> (batch, heads, padded length, key_dim)
+                t = tf.transpose(array.stack(), [1, 2, 0, 3, 4])
+                return tf.reshape(t, tf.shape(k))
+
+            return dq, unblock(dk), unblock(dv)
+
+        return out, grad
+
+    out = attend(q, k, v)
+    return tf.cast(tf.transpose(out, [0, 2, 1, 3]), dtype)
+
+
+def _local_mask(length, window, causal):
+    # Static (blocks, window, context) mask: query i of block n may attend to
+    # context slot j (keys of the previous, current [and next] block) when the
+    # key lies inside the sliding window and inside the sequence
+    blocks = -(-length // window)
+    context = 2 * window if causal else 3 * window
+    query_abs = np.arange(blocks)[:, None, None] * window + np.arange(window)[None, :, None]
+    key_abs = np.arange(blocks)[:, None, None] * window + np.arange(context)[None, None, :] - window
+    rel = key_abs - query_abs
+    inside = (rel <= 0) & (rel > -window) if causal else np.abs(rel) < window
+    return inside & (key_abs >= 0) & (key_abs < length)
+
+
+def local_attention(q, k, v, window=128, causal=False):
+    """Sliding-window attention; q is already scaled.
+
+    Every query attends to the `window` positions ending at itself (causal)
+    or the positions less than `window` away on either side. Queries are
+    processed in blocks of `window`, each against its neighbouring key
+    blocks, so memory grows linearly with the length.
+    """
+    dtype = q.dtype
+    q, k, v = (tf.cast(t, tf.float32) for t in (q, k, v))
+    length = q.shape[1]
+    blocks = -(-length // window)
+    pad = blocks * window - length
+
+    def to_blocks(t):
+        t = tf.pad(t, [[0, 0], [0, pad], [0, 0], [0, 0]])
+        return tf.reshape(t, [-1, blocks, window, t.shape[2], t.shape[3]])
+
+    def with_neighbours(t):
+        # Concatenate the previous [and next] block onto every block
+        zeros = tf.zeros_like(t[:, :1])
+        parts = [tf.concat([zeros, t[:, :-1]], axis=1), t]
+        if not causal:
+            parts.append(tf.concat([t[:, 1:], zeros], axis=1))
+        return tf.concat(parts, axis=2)
+
+    qb = to_blocks(q)
+    kb, vb = with_neighbours(to_blocks(k)), with_neighbours(to_blocks(v))
+
+    scores = tf.einsum("bnqhd,bnkhd->bnhqk", qb, kb)
+    mask = tf.constant(_local_mask(length, window, causal)[:, None])
+    weights = tf.nn.softmax(tf.where(mask, scores, _MASK_VALUE), axis=-1)
+    out = tf.einsum("bnhqk,bnkhd->bnqhd", weights, vb)
+
+    out = tf.reshape(out, [-1, blocks * window, out.shape[3], out.shape[4]])[:, :length]
+    return tf.cast(out, dtype)
+
+
+class EfficientAttention(layers.Layer):
+    """Multi-head self-attention with a chunked or sliding-window backend.
+
+    Called like layers.MultiHeadAttention: att(query, value,
+    use_causal_mask=...). `window` only applies to the "local" backend.
+    """
+
+    def __init__(self, num_heads, key_dim, backend="chunked", chunk_size=128, window=128, **kwargs):
+        super().__init__(**kwargs)
+        if backend not in ("chunked", "local"):
+            raise ValueError(f"Unknown attention backend {backend!r}")
+        self.num_heads = num_heads
+        self.key_dim = key_dim
+        self.backend = backend
+        self.chunk_size = chunk_size
+        self.window = window if backend == "local" else None
+
+    def build(self, query_shape, value_shape=None):
+        embed_dim = query_shape[-1]
+        heads, key_dim = self.num_heads, self.key_dim
+
+        # Same variables, shapes and order as layers.MultiHeadAttention
+        def projection(name):
+            kernel = self.add_weight(name=f"{name}_kernel", shape=(embed_dim, heads, key_dim),
+                                     initializer="glorot_uniform")
+            bias = self.add_weight(name=f"{name}_bias", shape=(heads, key_dim), initializer="zeros")
+            return kernel, bias
+
+        self.wq, self.bq = projection("query")
+        self.wk, self.bk = projection("key")
+        self.wv, self.bv = projection("value")
+        self.wo = self.add_weight(name="output_kernel", shape=(heads, key_dim, embed_dim),
+                                  initializer="glorot_uniform")
+        self.bo = self.add_weight(name="output_bias", shape=(embed_dim,), initializer="zeros")
+
+    def call(self, query, value, use_causal_mask=False):
+        q = tf.einsum("ble,ehd->blhd", query, self.wq) + self.bq
+        k = tf.einsum("ble,ehd->blhd", value, self.wk) + self.bk
+        v = tf.einsum("ble,ehd->blhd", value, self.wv) + self.bv
+        q = q * tf.cast(1.0 / np.sqrt(self.key_dim), q.dtype)
+
+        if self.backend == "chunked":
+            out = chunked_attention(q, k, v, self.chunk_size, use_causal_mask)
+        else:
+            out = local_attention(q, k, v, self.window, use_causal_mask)
+        return tf.einsum("blhd,hde->ble", out, self.wo) + self.bo
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Transformer train-step time and peak memory vs SEQLEN per attention backend.
+
+Every configuration trains the full-sequence (causal) Transformer for a few
+steps on random tokens in a fresh process, so the peak resident memory of one
+configuration does not leak into the next. The reported memory is the growth
+of the peak RSS over the RSS right before training, which is dominated by the
+attention scores: (batch, heads, SEQLEN, SEQLEN) for "mha", (batch, heads,
+SEQLEN, chunk) for "chunked" and (batch, heads, SEQLEN, 2 * window) for
+"local".
+
+Usage:
+    python benchmarks/bench_attention.py --lengths 10 256 1024 4096 --batch-size 8
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# (label, builder kwargs); key_dim is filled in from --embed-dim / --num-heads
+BACKENDS = [
+    ("mha (key_dim=embed)", {"attention": "mha", "key_dim": None}),
+    ("mha", {"attention": "mha"}),
+    ("chunked", {"attention": "chunked"}),
+    ("local", {"attention": "local"}),
+]
+
+
+def _rss_mb():
+    with open("/proc/self/statm") as fin:
+        return int(fin.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def _run(seqlen, kwargs, args):
+    # Imported in the worker so each configuration starts from a clean process
+    import numpy as np
+
+    from transformer import build_transformer_model
+
+    vocab_size = 64
+    model = build_transformer_model(seqlen, vocab_size, embed_dim=args.embed_dim, num_heads=args.num_heads,
+                                    full_sequence=True, chunk_size=args.chunk_size, window=args.window,
+                                    **kwargs)
+    rng = np.random.default_rng(0)
+    tokens = rng.integers(0, vocab_size, (args.batch_size * args.steps, seqlen + 1)).astype(np.int32)
+    X, Y = tokens[:, :-1], tokens[:, 1:]
+
+    base_mb = _rss_mb()
+    start = time.perf_counter()
+    model.train_on_batch(X[:args.batch_size], Y[:args.batch_size])
+    build_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(1, args.steps):
+        batch = slice(i * args.batch_size, (i + 1) * args.batch_size)
+        model.train_on_batch(X[batch], Y[batch])
+    step_ms = (time.perf_counter() - start) / max(args.steps - 1, 1) * 1000
+
+    # ru_maxrss is in kilobytes on Linux
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return build_s, step_ms, peak_mb - base_mb
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 128, 512, 1024, 2048, 4096])
+    parser.add_argument("--backends", nargs="+", default=[label for label, _ in BACKENDS])
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--steps", type=int, default=4, help="Train steps per configuration (first is warm-up)")
+    parser.add_argument("--embed-dim", type=int, default=64)
+    parser.add_argument("--num-heads", type=int, default=2)
+    parser.add_argument("--chunk-size", type=int, default=128)
+    parser.add_argument("--window", type=int, default=128)
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    print(f"{'backend':20s} {'seqlen':>6s} {'build s':>8s} {'step ms':>9s} {'peak MB':>8s}")
+    for seqlen in args.lengths:
+        for label, kwargs in BACKENDS:
+            if label not in args.backends:
+                continue
+            kwargs = dict(kwargs)
+            kwargs.setdefault("key_dim", args.embed_dim // args.num_heads)
+            with ctx.Pool(1) as pool:
+                try:
+                    build_s, step_ms, peak_mb = pool.apply(_run, (seqlen, kwargs, args))
+                except Exception as exc:  # e.g. out of memory at long lengths
+                    print(f"{label:20s} {seqlen:6d} failed: {type(exc).__name__}")
+                    continue
+            print(f"{label:20s} {seqlen:6d} {build_s:8.2f} {step_ms:9.1f} {peak_mb:8.0f}")
+
+
+if __name__ == "__main__":
+    main()
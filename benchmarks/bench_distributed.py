@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""Data-parallel scaling test: 1, 2 and 4 local workers with tf.distribute.
+
+For every worker count the same training run (fixed global batch size, so
+each worker gets global / workers samples per step) is launched as that many
+local processes with a generated TF_CONFIG and MultiWorkerMirroredStrategy,
+the CPU threads split evenly between them. One worker is the plain
+single-process baseline. --mode mirrored runs a single process with that
+many logical CPU replicas instead. The report gives steady-state samples/sec,
+speedup and efficiency over one worker, and the final loss and validation
+bits-per-character, which should stay close to the baseline.
+
+Usage:
+    python benchmarks/bench_distributed.py --path sample_data/alice.txt --workers 1 2 4
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _free_ports(count):
+    sockets = [socket.socket() for _ in range(count)]
+    for sock in sockets:
+        sock.bind(("localhost", 0))
+    ports = [sock.getsockname()[1] for sock in sockets]
+    for sock in sockets:
+        sock.close()
+    return ports
+
+
+def _worker(args):
+    # One cluster member: runs the training and, on the chief, writes the result
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(args.threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    import distributed
+    import trainer
+
+    distribute = "none" if args.num_workers == 1 else args.mode
+    config = trainer.TrainConfig(name=f"{args.model}-{args.mode}-{args.num_workers}", model=args.model,
+                                 corpus_path=args.path, cache_dir=args.cache_dir, seqlen=args.seqlen,
+                                 batch_size=args.batch_size, num_iterations=args.iterations, num_preds=1,
+                                 seed=args.seed, eval_max_windows=args.eval_max_windows, test_fraction=0.0,
+                                 distribute=distribute, replicas=args.num_workers)
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = trainer.train(config)
+
+    if distributed.is_chief():
+        with open(args.result, "w") as fout:
+            json.dump({key: result[key] for key in ("samples_per_sec", "step_time_ms", "final_loss", "val_bpc",
+                                                    "replicas")}, fout)
+
+
+def _launch(args, num_workers, result_path):
+    # Start every member of a local cluster (or the single process) and wait for them
+    multi_worker = args.mode == "multi_worker" and num_workers > 1
+    processes = num_workers if multi_worker else 1
+    threads = max(1, (os.cpu_count() or 1) // processes)
+    ports = _free_ports(processes)
+
+    import distributed
+
+    children = []
+    for index in range(processes):
+        env = dict(os.environ)
+        env.pop("TF_CONFIG", None)
+        if multi_worker:
+            env["TF_CONFIG"] = distributed.local_cluster_config(processes, index, ports)
+        command = [sys.executable, os.path.abspath(__file__), "--worker", "--num-workers", str(num_workers),
+                   "--threads", str(threads), "--result", result_path, *args.passthrough]
+        children.append(subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL))
+    codes = [child.wait() for child in children]
+    if any(codes):
+        raise RuntimeError(f"worker exited with {codes}")
+    with open(result_path) as fin:
+        return json.load(fin)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--path", default="sample_data/alice.txt")
+    parser.add_argument("--cache-dir", default=".corpus_cache")
+    parser.add_argument("--model", default="gru")
+    parser.add_argument("--mode", default="multi_worker", choices=["multi_worker", "mirrored"])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--seqlen", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=256, help="Global batch size")
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--eval-max-windows", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    # Internal: the options of one launched worker process
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--num-workers", type=int, default=1, help=argparse.SUPPRESS)
+    parser.add_argument("--threads", type=int, default=1, help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        _worker(args)
+        return
+
+    # Every option except the worker list is forwarded to the workers unchanged
+    args.passthrough = ["--path", args.path, "--cache-dir", args.cache_dir, "--model", args.model,
+                        "--mode", args.mode, "--seqlen", str(args.seqlen), "--batch-size", str(args.batch_size),
+                        "--iterations", str(args.iterations), "--eval-max-windows", str(args.eval_max_windows),
+                        "--seed", str(args.seed)]
+
+    import corpus
+    # Build the corpus cache once, before the workers start
+    corpus.load_encoded_corpus(args.path, args.cache_dir)
+
+    print(f"{args.model} {args.mode}, global batch {args.batch_size}, {os.cpu_count()} CPUs")
+    print(f"{'workers':>7s} {'samples/sec':>12s} {'speedup':>8s} {'efficiency':>10s} {'final loss':>10s} "
+          f"{'val bpc':>8s}")
+    baseline = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for num_workers in args.workers:
+            result = _launch(args, num_workers, os.path.join(tmp, f"result-{num_workers}.json"))
+            rate = result["samples_per_sec"]
+            baseline = baseline or rate
+            speedup = rate / baseline
+            print(f"{num_workers:7d} {rate:12,.0f} {speedup:8.2f} {speedup / num_workers:10.2f} "
+                  f"{result['final_loss']:10.4f} {result['val_bpc'][-1]:8.4f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""Last-position vs full-sequence (many-to-many) training of each architecture.
+
+Last-position mode trains on overlapping step-1 windows with one target each;
+full-sequence mode trains on non-overlapping windows with a target at every
+position. Both see every training character as a target once per epoch. The
+benchmark reports windows (forward passes) per epoch, epoch time and held-out
+bits-per-character after every epoch.
+
+Usage:
+    python benchmarks/bench_full_sequence.py --path sample_data/alice.txt --epochs 3
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import corpus
+import dataset
+import evaluation
+import models
+
+# (label, full_sequence)
+MODES = [
+    ("last position", False),
+    ("full sequence", True),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--path", default="sample_data/alice.txt")
+    parser.add_argument("--seqlen", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--eval-windows", type=int, default=20000)
+    parser.add_argument("--models", nargs="+", default=sorted(models.MODEL_BUILDERS))
+    args = parser.parse_args()
+
+    encoded, chars = corpus.load_encoded_corpus(args.path)
+    splits = evaluation.split_corpus(encoded)
+
+    print(f"{'model':12s} {'mode':14s} {'epoch':>5s} {'windows':>9s} {'time s':>8s} {'val bpc':>8s}")
+    for name in args.models:
+        for label, full_sequence in MODES:
+            # Non-overlapping windows are enough once every position is a target
+            step = args.seqlen if full_sequence else 1
+            windows = corpus.num_windows(len(splits["train"]), args.seqlen, step)
+            train_ds = dataset.make_dataset(splits["train"], args.seqlen, step,
+                                            batch_size=args.batch_size, seed=0,
+                                            full_sequence=full_sequence)
+            model = models.build_model(name, args.seqlen, len(chars), full_sequence=full_sequence)
+
+            for epoch in range(args.epochs):
+                start = time.perf_counter()
+                model.fit(train_ds, epochs=1, verbose=0)
+                elapsed = time.perf_counter() - start
+                bpc = evaluation.evaluate(model, splits["val"], args.seqlen,
+                                          max_windows=args.eval_windows)["bpc"]
+                print(f"{name:12s} {label:14s} {epoch:5d} {windows:9,d} {elapsed:8.2f} {bpc:8.4f}")
+
+
+if __name__ == "__main__":
+    main()
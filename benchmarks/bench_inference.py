@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Per-call latency (p50 / p99) of model.predict vs the compiled inference paths.
+
+For every architecture this times a single next-character prediction through:
+  - model.predict on a (1, SEQLEN) window (the original hot loop)
+  - the tf.function window graph from inference.export_window_fn (with / without XLA)
+  - the single-step recurrent graph from inference.export_step_fn (SimpleRNN / GRU)
+
+Usage:
+    python benchmarks/bench_inference.py --calls 200
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tensorflow as tf
+import inference
+import models
+
+
+def percentiles(fn, calls):
+    # Warm up (tracing / XLA compilation) before measuring
+    for _ in range(3):
+        fn()
+    times = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    times = 1000.0 * np.asarray(times)
+    return np.percentile(times, 50), np.percentile(times, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vocab", type=int, default=50)
+    parser.add_argument("--seqlen", type=int, default=10)
+    parser.add_argument("--hidden", type=int, default=128)
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    built = {
+        "SimpleRNN": models.build_model("simple_rnn", args.seqlen, args.vocab, hidden_size=args.hidden),
+        "GRU": models.build_model("gru", args.seqlen, args.vocab, hidden_size=args.hidden),
+        "Transformer": models.build_model("transformer", args.seqlen, args.vocab),
+    }
+    window = np.random.default_rng(0).integers(0, args.vocab, (1, args.seqlen)).astype(np.int32)
+    token = window[:, -1]
+
+    print(f"{'model':12s} {'path':26s} {'p50 ms':>9s} {'p99 ms':>9s}")
+    for name, model in built.items():
+        paths = {
+            "model.predict": lambda: model.predict(window, verbose=0),
+            "tf.function window": lambda fn=inference.export_window_fn(model, jit_compile=False): fn(window).numpy(),
+            "tf.function window + XLA": lambda fn=inference.export_window_fn(model): fn(window).numpy(),
+        }
+        if name != "Transformer":
+            state = tf.zeros((1, args.hidden))
+            paths["tf.function step + XLA"] = lambda fn=inference.export_step_fn(model): fn(token, state)[0].numpy()
+
+        for path, fn in paths.items():
+            p50, p99 = percentiles(fn, args.calls)
+            print(f"{name:12s} {path:26s} {p50:9.3f} {p99:9.3f}")
+
+
+if __name__ == "__main__":
+    main()
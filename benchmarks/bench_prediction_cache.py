@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""Generation speed, hit rate and memory of the next-token prediction cache.
+
+Trains each architecture briefly on the corpus, then times two workloads
+with and without a shared prediction_cache.PredictionCache:
+
+  - greedy:  temperature-0 generation from held-out windows, which tends to
+             loop and revisit the same contexts
+  - prompts: a stream of sampled requests whose prompts come from a small
+             pool, as repeated production prompts do; every request is
+             generated on its own and all of them share one cache
+
+The report gives tokens/sec for both, the speedup, the cache hit rate and
+its size, and whether the greedy output matches the uncached run.
+
+Usage:
+    python benchmarks/bench_prediction_cache.py --path sample_data/alice.txt --backend compiled
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import corpus
+import dataset
+import generation
+import models
+import prediction_cache
+
+
+def timed_generate(run, cache_size):
+    # Returns (outputs, seconds, cache stats or None) of run(cache)
+    cache = prediction_cache.PredictionCache(cache_size) if cache_size else None
+    start = time.perf_counter()
+    out = run(cache)
+    return out, time.perf_counter() - start, cache.stats() if cache is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--path", default="sample_data/alice.txt")
+    parser.add_argument("--cache-dir", default=".corpus_cache")
+    parser.add_argument("--seqlen", type=int, default=10)
+    parser.add_argument("--train-steps", type=int, default=500)
+    parser.add_argument("--backend", default="numpy", choices=["numpy", "compiled"])
+    parser.add_argument("--tokens", type=int, default=200, help="Tokens generated per seed / request")
+    parser.add_argument("--batch", type=int, default=16, help="Greedy seeds generated together")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--prompts", type=int, default=10, help="Distinct prompts the requests draw from")
+    parser.add_argument("--cache-size", type=int, default=65536)
+    parser.add_argument("--models", nargs="+", default=sorted(models.MODEL_BUILDERS))
+    args = parser.parse_args()
+
+    encoded, chars = corpus.load_encoded_corpus(args.path, args.cache_dir)
+    X, _ = corpus.make_windows(encoded, args.seqlen)
+    train_ds = dataset.make_dataset(encoded, args.seqlen, batch_size=128, repeat=True, seed=0)
+
+    rng = np.random.default_rng(0)
+    seeds = np.asarray(X[np.sort(rng.choice(len(X), args.batch, replace=False))])
+    pool = np.asarray(X[np.sort(rng.choice(len(X), args.prompts, replace=False))])
+    prompts = pool[rng.integers(0, args.prompts, args.requests)]
+
+    print(f"{'model':12s} {'workload':8s} {'tok/s':>9s} {'cached':>9s} {'speedup':>8s} {'hit rate':>8s} "
+          f"{'entries':>8s} {'KB':>8s} {'same':>5s}")
+    for name in args.models:
+        model = models.build_model(name, args.seqlen, len(chars))
+        model.fit(train_ds, epochs=1, steps_per_epoch=args.train_steps, verbose=0)
+        decoder = generation.make_decoder(model, args.backend)
+
+        def greedy(cache):
+            return generation.generate(model, seeds, args.tokens, temperature=0.0, decoder=decoder,
+                                       cache=cache)
+
+        def requests(cache):
+            return [generation.generate(model, prompt, args.tokens, seed=i, decoder=decoder, cache=cache)
+                    for i, prompt in enumerate(prompts)]
+
+        for workload, run, n_tokens in [("greedy", greedy, seeds.shape[0] * args.tokens),
+                                        ("prompts", requests, args.requests * args.tokens)]:
+            # The second of two runs, so the XLA compilations for the subset
+            # batch sizes the cache produces are excluded too
+            plain, plain_time, _ = [timed_generate(run, 0) for _ in range(2)][-1]
+            cached, cached_time, stats = [timed_generate(run, args.cache_size) for _ in range(2)][-1]
+            same = all(np.array_equal(a, b) for a, b in zip(np.atleast_2d(plain), np.atleast_2d(cached)))
+            print(f"{name:12s} {workload:8s} {n_tokens / plain_time:9,.0f} {n_tokens / cached_time:9,.0f} "
+                  f"{plain_time / cached_time:8.2f} {stats['hit_rate']:8.1%} {stats['entries']:8d} "
+                  f"{stats['bytes'] / 1024:8.0f} {str(same):>5s}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
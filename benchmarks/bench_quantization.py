@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Side-by-side evaluation of the float Keras models and their TFLite exports.
+
+Trains each architecture briefly on the corpus, exports float32 / float16 /
+dynamic-range int8 / full int8 TFLite variants (int8 calibrated on training
+windows), and reports per-character loss, accuracy, file size and greedy
+generation latency on a held-out sample of windows.
+
+Usage:
+    python benchmarks/bench_quantization.py --path sample_data/alice.txt --train-steps 500
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import corpus
+import dataset
+import generation
+import models
+import quantize
+
+
+def generation_latency(decoder, seed, n_tokens):
+    # Mean milliseconds per generated character for a single seed
+    start = time.perf_counter()
+    generation.generate(None, seed, n_tokens, temperature=0.0, decoder=decoder)
+    return 1000.0 * (time.perf_counter() - start) / n_tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--path", default="sample_data/alice.txt")
+    parser.add_argument("--seqlen", type=int, default=10)
+    parser.add_argument("--train-steps", type=int, default=500)
+    parser.add_argument("--eval-windows", type=int, default=20000)
+    parser.add_argument("--tokens", type=int, default=100)
+    parser.add_argument("--output-dir", default="exports")
+    parser.add_argument("--models", nargs="+", default=sorted(models.MODEL_BUILDERS))
+    args = parser.parse_args()
+
+    encoded, chars = corpus.load_encoded_corpus(args.path)
+    X, y = corpus.make_windows(encoded, args.seqlen)
+    train_ds = dataset.make_dataset(encoded, args.seqlen, batch_size=128, repeat=True, seed=0)
+
+    # Evaluate on a fixed random sample of windows, calibrate on a disjoint one
+    rng = np.random.default_rng(0)
+    order = rng.permutation(len(X))
+    eval_idx = np.sort(order[:args.eval_windows])
+    X_eval, y_eval = np.asarray(X[eval_idx]), np.asarray(y[eval_idx])
+    calibration = quantize.representative_windows(X[np.sort(order[args.eval_windows:])])
+    seed = X_eval[0]
+
+    print(f"{'model':12s} {'variant':14s} {'size KB':>9s} {'loss':>7s} {'acc':>7s} {'ms/char':>8s}")
+    for name in args.models:
+        model = models.build_model(name, args.seqlen, len(chars))
+        model.fit(train_ds, epochs=1, steps_per_epoch=args.train_steps, verbose=0)
+
+        # Float reference: the Keras model itself, generating through its NumPy decoder
+        size = sum(w.nbytes for w in model.get_weights())
+        metrics = quantize.evaluate(lambda x: model(x, training=False).numpy(), X_eval, y_eval)
+        latency = generation_latency(generation.make_decoder(model), seed, args.tokens)
+        print(f"{name:12s} {'keras float32':14s} {size / 1024:9.1f} {metrics['loss']:7.4f} "
+              f"{metrics['accuracy']:7.4f} {latency:8.3f}")
+
+        for mode in quantize.QUANT_MODES:
+            path = os.path.join(args.output_dir, f"{name}_{mode}.tflite")
+            flatbuffer = quantize.export_tflite(model, mode, calibration, path)
+            tflite_model = quantize.TFLiteModel(flatbuffer)
+            metrics = quantize.evaluate(tflite_model.predict, X_eval, y_eval)
+            latency = generation_latency(quantize.TFLiteDecoder(tflite_model), seed, args.tokens)
+            print(f"{name:12s} {mode:14s} {len(flatbuffer) / 1024:9.1f} {metrics['loss']:7.4f} "
+                  f"{metrics['accuracy']:7.4f} {latency:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Load test for server.py: throughput and latency percentiles under concurrency.
+
+`--concurrency` clients each send generation requests back to back until
+`--requests` have completed, reading the streamed tokens as they arrive. The
+report gives requests and tokens per second, p50 / p99 of the time to the
+first token and of the full request, and the server's mean batch size (from
+/health) over the run.
+
+Usage:
+    python server.py saved_models/gru --port 8000 &
+    python benchmarks/bench_server.py --port 8000 --concurrency 1 8 32 --requests 200
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+
+async def _open(args):
+    if args.unix:
+        return await asyncio.open_unix_connection(args.unix)
+    return await asyncio.open_connection(args.host, args.port)
+
+
+async def _call(args, method, path, payload=None):
+    """Send one request; returns the status code and the decoded response lines."""
+    reader, writer = await _open(args)
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: {args.host}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while (line := (await reader.readline()).decode()) not in ("\r\n", ""):
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    lines, first_token = [], None
+    if headers.get("transfer-encoding") == "chunked":
+        # One JSON line per chunk; note when the first token arrives
+        while size := int((await reader.readline()).strip(), 16):
+            lines.append(json.loads(await reader.readexactly(size)))
+            await reader.readexactly(2)
+            if first_token is None:
+                first_token = time.perf_counter()
+    else:
+        lines.append(json.loads(await reader.readexactly(int(headers["content-length"]))))
+    writer.close()
+    return status, lines, first_token
+
+
+async def _client(args, remaining, results):
+    payload = {"prompt": args.prompt, "n_tokens": args.n_tokens, "temperature": args.temperature}
+    while remaining:
+        remaining.pop()
+        start = time.perf_counter()
+        status, lines, first_token = await _call(args, "POST", "/generate", payload)
+        if status != 200:
+            raise RuntimeError(f"server returned {status}: {lines}")
+        results.append((first_token - start, time.perf_counter() - start, lines[-1]["tokens"]))
+
+
+async def _run(args, concurrency):
+    before = (await _call(args, "GET", "/health"))[1][0]["stats"]
+    remaining = list(range(args.requests))
+    results = []
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(args, remaining, results) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    after = (await _call(args, "GET", "/health"))[1][0]["stats"]
+
+    ttft, latency, tokens = (np.array(column) * (1000 if i < 2 else 1) for i, column in enumerate(zip(*results)))
+    batch_size = (after["batched_requests"] - before["batched_requests"]) / max(after["batches"] - before["batches"], 1)
+    print(f"{concurrency:11d} {len(results) / elapsed:9.1f} {tokens.sum() / elapsed:10,.0f} "
+          f"{np.percentile(ttft, 50):9.1f} {np.percentile(ttft, 99):9.1f} "
+          f"{np.percentile(latency, 50):9.1f} {np.percentile(latency, 99):9.1f} {batch_size:10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--unix", help="Connect to this Unix socket instead of a TCP port")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32],
+                        help="Concurrent clients; one run per value")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per run")
+    parser.add_argument("--n-tokens", type=int, default=50)
+    parser.add_argument("--temperature", type=float, default=1.0)
+    parser.add_argument("--prompt", default="alice was beginning to get very tired")
+    args = parser.parse_args()
+
+    print(f"{'concurrency':>11s} {'req/s':>9s} {'tokens/s':>10s} {'ttft p50':>9s} {'ttft p99':>9s} "
+          f"{'lat p50':>9s} {'lat p99':>9s} {'batch size':>10s}   (latencies in ms)")
+    for concurrency in args.concurrency:
+        asyncio.run(_run(args, concurrency))
+
+
+if __name__ == "__main__":
+    main()
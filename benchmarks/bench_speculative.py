@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""Speculative decoding with the SimpleRNN as draft model for the GRU and Transformer.
+
+Trains the three architectures briefly on the same corpus, then for each
+target model, temperature and draft length k compares plain per-character
+generation from the target (one compiled window call per character,
+inference.CompiledWindowDecoder) against speculative.SpeculativeGenerator.
+The report gives tokens/sec for both, the speedup, the acceptance rate, the
+tokens gained per target call and, for greedy decoding, whether the output
+is identical. The exactness check samples the first two tokens many times
+from one seed and reports the total variation distance of the empirical
+joint distribution from the target's exact one, next to the same distance
+for plain sampling (the sampling noise floor).
+
+Usage:
+    python benchmarks/bench_speculative.py --path sample_data/alice.txt --k 2 4 8
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import corpus
+import dataset
+import generation
+import inference
+import models
+import speculative
+
+
+def timed(fn):
+    # Seconds of the second call, so tracing and compilation are excluded
+    fn()
+    start = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - start
+
+
+def joint_distance(samples, target, seed, temperature, vocab_size):
+    # Total variation distance between the empirical distribution of the first
+    # two sampled tokens and the target's exact one
+    window_fn = inference.export_window_fn(target)
+    first = generation.sampling_probs(window_fn(seed[None, :]).numpy(), temperature)[0]
+    windows = np.concatenate([np.repeat(seed[None, 1:], vocab_size, axis=0),
+                              np.arange(vocab_size, dtype=np.int32)[:, None]], axis=1)
+    second = generation.sampling_probs(window_fn(windows).numpy(), temperature)
+    exact = first[:, None] * second
+    counts = np.zeros((vocab_size, vocab_size))
+    np.add.at(counts, (samples[:, 0], samples[:, 1]), 1)
+    return 0.5 * np.abs(counts / len(samples) - exact).sum()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--path", default="sample_data/alice.txt")
+    parser.add_argument("--cache-dir", default=".corpus_cache")
+    parser.add_argument("--seqlen", type=int, default=10)
+    parser.add_argument("--train-steps", type=int, default=1000)
+    parser.add_argument("--targets", nargs="+", default=["gru", "transformer"])
+    parser.add_argument("--k", type=int, nargs="+", default=[2, 4, 8], help="Draft lengths")
+    parser.add_argument("--temperatures", type=float, nargs="+", default=[0.0, 1.0])
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=1, help="Seeds generated together")
+    parser.add_argument("--check-samples", type=int, default=20000,
+                        help="Samples for the exactness check (0 skips it)")
+    args = parser.parse_args()
+
+    encoded, chars = corpus.load_encoded_corpus(args.path, args.cache_dir)
+    X, _ = corpus.make_windows(encoded, args.seqlen)
+    train_ds = dataset.make_dataset(encoded, args.seqlen, batch_size=128, repeat=True, seed=0)
+    rng = np.random.default_rng(0)
+    seeds = np.asarray(X[np.sort(rng.choice(len(X), args.batch, replace=False))], dtype=np.int32)
+
+    trained = {}
+    for name in ["simple_rnn", *args.targets]:
+        trained[name] = models.build_model(name, args.seqlen, len(chars))
+        trained[name].fit(train_ds, epochs=1, steps_per_epoch=args.train_steps, verbose=0)
+    draft = trained["simple_rnn"]
+
+    print(f"{'target':12s} {'temp':>4s} {'k':>2s} {'plain tok/s':>11s} {'spec tok/s':>10s} {'speedup':>8s} "
+          f"{'accept':>7s} {'tok/call':>8s} {'same':>5s}")
+    for name in args.targets:
+        target = trained[name]
+        plain_decoder = inference.CompiledWindowDecoder(target)
+        for temperature in args.temperatures:
+            plain, plain_time = timed(lambda: generation.generate(target, seeds, args.tokens, temperature,
+                                                                  seed=0, decoder=plain_decoder))
+            for k in args.k:
+                generator = speculative.SpeculativeGenerator(target, draft, k)
+                out, spec_time = timed(lambda: generator.generate(seeds, args.tokens, temperature, seed=0))
+                stats = generator.stats
+                same = str(np.array_equal(plain, out)) if temperature == 0 else "-"
+                n_tokens = seeds.shape[0] * args.tokens
+                print(f"{name:12s} {temperature:4.1f} {k:2d} {n_tokens / plain_time:11,.0f} "
+                      f"{n_tokens / spec_time:10,.0f} {plain_time / spec_time:8.2f} "
+                      f"{stats['acceptance_rate']:7.1%} {stats['tokens_per_round']:8.2f} {same:>5s}", flush=True)
+
+        if args.check_samples:
+            # In chunks of seeds, which bounds the size of the verification batch
+            seed = seeds[0]
+            repeated = np.repeat(seed[None, :], 1000, axis=0)
+            generator = speculative.SpeculativeGenerator(target, draft, max(args.k))
+            chunks = range(-(-args.check_samples // len(repeated)))
+            spec = np.concatenate([generator.generate(repeated, 2, 1.0, seed=i) for i in chunks])
+            plain = np.concatenate([generation.generate(target, repeated, 2, 1.0, seed=i, decoder=plain_decoder)
+                                    for i in chunks])
+            print(f"{name:12s} exactness over {len(spec)} samples of the first two tokens: "
+                  f"TV distance speculative {joint_distance(spec, target, seed, 1.0, len(chars)):.4f}, "
+                  f"plain {joint_distance(plain, target, seed, 1.0, len(chars)):.4f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Unrolled fixed-window training vs stateful truncated BPTT for SimpleRNN / GRU.
+
+For every configuration the benchmark reports the time to build and trace the
+train step, the steady-state training speed in characters per second and the
+held-out bits-per-character, both on SEQLEN windows (unrolled models only) and
+reading the validation text as continuous streams. Unrolled graphs grow with
+SEQLEN; the stateful models keep the loop rolled and carry their state across
+batches, so the truncation length can grow without growing the graph.
+
+Usage:
+    python benchmarks/bench_stateful.py --path sample_data/alice.txt --lengths 10 50 200
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import corpus
+import dataset
+import evaluation
+import models
+from callbacks import ResetStatesCallback
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--path", default="sample_data/alice.txt")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 50, 200],
+                        help="SEQLEN values (window / truncation lengths) to compare")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--epochs", type=int, default=2)
+    parser.add_argument("--models", nargs="+", default=["simple_rnn", "gru"])
+    args = parser.parse_args()
+
+    encoded, chars = corpus.load_encoded_corpus(args.path)
+    splits = evaluation.split_corpus(encoded)
+
+    print(f"{'model':11s} {'mode':9s} {'seqlen':>6s} {'build s':>8s} {'chars/sec':>10s} "
+          f"{'window bpc':>10s} {'stream bpc':>10s}")
+    for name in args.models:
+        for seqlen in args.lengths:
+            for stateful in (False, True):
+                if stateful:
+                    train_ds = dataset.make_stream_dataset(splits["train"], seqlen, args.batch_size)
+                    model = models.build_model(name, seqlen, len(chars), stateful=True,
+                                               batch_size=args.batch_size)
+                    callbacks = [ResetStatesCallback()]
+                else:
+                    # Non-overlapping full-sequence windows: same targets per epoch
+                    train_ds = dataset.make_dataset(splits["train"], seqlen, seqlen,
+                                                    batch_size=args.batch_size, seed=0,
+                                                    full_sequence=True)
+                    model = models.build_model(name, seqlen, len(chars), full_sequence=True)
+                    callbacks = []
+
+                # The first step pays for building and tracing the train graph
+                start = time.perf_counter()
+                model.fit(train_ds.take(1), epochs=1, verbose=0)
+                build_s = time.perf_counter() - start
+
+                start = time.perf_counter()
+                model.fit(train_ds, epochs=args.epochs, callbacks=callbacks, verbose=0)
+                elapsed = time.perf_counter() - start
+
+                # Characters trained on, from the optimizer step count (minus the warm-up step)
+                steps = int(model.optimizer.iterations.numpy()) - 1
+                rate = steps * args.batch_size * seqlen / elapsed
+
+                window_bpc = "-" if stateful else \
+                    f"{evaluation.evaluate(model, splits['val'], seqlen)['bpc']:10.4f}"
+                stream_bpc = evaluation.evaluate_stream(model, splits["val"])["bpc"]
+                print(f"{name:11s} {'stateful' if stateful else 'unrolled':9s} {seqlen:6d} "
+                      f"{build_s:8.2f} {rate:10,.0f} {window_bpc:>10s} {stream_bpc:10.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""Reproducible speed and quality benchmark of the three architectures over a grid.
+
+Every (model, SEQLEN, HIDDEN_SIZE, batch size, seed) point trains through
+trainer.train in a fresh process with the seed pinned (Keras / NumPy / TF
+seeds, data shuffle order and, by default, deterministic TF ops). The
+vocabulary is the sorted corpus alphabet, so its order is fixed too; its
+digest is recorded with every row. Each point reports:
+
+  - train_samples_per_sec   steady-state training throughput (first epoch excluded)
+  - gen_tokens_per_sec      batched incremental generation with the trained model
+  - peak_rss_mb             peak resident memory of the process
+  - val_bpc / test_bpc      held-out bits-per-character (evaluation.py splits)
+
+HIDDEN_SIZE is the recurrent width of SimpleRNN / GRU and the feed-forward
+width (ff_dim) of the Transformer. The report is JSON (environment, grid
+and one row per point) and optionally CSV.
+
+Usage:
+    python benchmarks/bench_suite.py --path sample_data/alice.txt --seqlens 10 40 \\
+        --hidden-sizes 64 128 --batch-sizes 128 --seeds 0 1 --output bench_report.json
+"""
+
+import argparse
+import contextlib
+import csv
+import hashlib
+import io
+import itertools
+import json
+import multiprocessing as mp
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROW_FIELDS = ["model", "seqlen", "hidden_size", "batch_size", "seed", "final_loss", "val_bpc", "test_bpc",
+              "test_perplexity", "train_samples_per_sec", "step_time_ms", "gen_tokens_per_sec",
+              "peak_rss_mb", "wall_s", "vocab_size", "vocab_digest"]
+
+
+def _run_point(values, args):
+    # Runs in a fresh process so peak RSS belongs to this point alone
+    import resource
+
+    import numpy as np
+    import tensorflow as tf
+
+    import corpus
+    import evaluation
+    import generation
+    import models
+    import tokenizer
+    import trainer
+
+    if args.deterministic:
+        tf.config.experimental.enable_op_determinism()
+    start = time.perf_counter()
+
+    config = trainer.TrainConfig.from_dict(values)
+    with tempfile.TemporaryDirectory() as tmp:
+        config.save_dir = tmp
+        # Keep the progress bars and samples out of the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = trainer.train(config)
+        model, tok = models.load_trained_model(os.path.join(tmp, config.name))
+
+    # Generation speed from held-out seeds, after one warm-up call
+    encoded, _ = tokenizer.load_tokenized_corpus(config.corpus_path, config.tokenizer, config.vocab_size,
+                                                 config.cache_dir)
+    test = evaluation.split_corpus(encoded, config.val_fraction, config.test_fraction)["test"]
+    seeds = np.array(corpus.make_windows(test, config.seqlen)[0][:args.gen_batch])
+    decoder = generation.make_decoder(model)
+    generation.generate(model, seeds, 2, seed=config.seed, decoder=decoder)
+    gen_start = time.perf_counter()
+    out = generation.generate(model, seeds, args.gen_tokens, seed=config.seed, decoder=decoder)
+    gen_rate = out.size / (time.perf_counter() - gen_start)
+
+    hidden_key = "ff_dim" if config.model == "transformer" else "hidden_size"
+    return {
+        "model": config.model,
+        "seqlen": config.seqlen,
+        "hidden_size": config.model_kwargs[hidden_key],
+        "batch_size": config.batch_size,
+        "seed": config.seed,
+        "final_loss": result["final_loss"],
+        "val_bpc": result["val_bpc"][-1] if result["val_bpc"] else None,
+        "test_bpc": result["test"]["bpc"],
+        "test_perplexity": result["test"]["perplexity"],
+        "train_samples_per_sec": result["samples_per_sec"],
+        "step_time_ms": result["step_time_ms"],
+        "gen_tokens_per_sec": gen_rate,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "wall_s": time.perf_counter() - start,
+        "vocab_size": len(tok),
+        "vocab_digest": hashlib.sha256(json.dumps(tok.vocab).encode()).hexdigest()[:16],
+    }
+
+
+def _environment():
+    import numpy as np
+    import tensorflow as tf
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "git_commit": commit,
+            "python": platform.python_version(), "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "numpy": np.__version__, "tensorflow": tf.__version__}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--path", default="sample_data/alice.txt")
+    parser.add_argument("--cache-dir", default=".corpus_cache")
+    parser.add_argument("--models", nargs="+", default=["simple_rnn", "gru", "transformer"])
+    parser.add_argument("--seqlens", type=int, nargs="+", default=[10, 40])
+    parser.add_argument("--hidden-sizes", type=int, nargs="+", default=[128])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[128])
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0])
+    parser.add_argument("--iterations", type=int, default=3, help="Training iterations (epochs) per point")
+    parser.add_argument("--eval-max-windows", type=int, default=20000)
+    parser.add_argument("--gen-tokens", type=int, default=200)
+    parser.add_argument("--gen-batch", type=int, default=32)
+    parser.add_argument("--no-deterministic", dest="deterministic", action="store_false",
+                        help="Allow nondeterministic (faster) TF kernels")
+    parser.add_argument("--output", default="bench_report.json")
+    parser.add_argument("--csv", help="Also write the rows to this CSV file")
+    args = parser.parse_args()
+
+    import tokenizer
+    # Build the corpus cache once, before the workers start
+    tokenizer.load_tokenized_corpus(args.path, cache_dir=args.cache_dir)
+
+    grid = list(itertools.product(args.models, args.seqlens, args.hidden_sizes, args.batch_sizes, args.seeds))
+    ctx = mp.get_context("spawn")
+    rows = []
+    print(f"{'model':11s} {'seqlen':>6s} {'hidden':>6s} {'batch':>5s} {'seed':>4s} {'samples/s':>10s} "
+          f"{'gen tok/s':>10s} {'peak MB':>8s} {'val bpc':>8s} {'test bpc':>8s}")
+    for name, seqlen, hidden, batch_size, seed in grid:
+        hidden_key = "ff_dim" if name == "transformer" else "hidden_size"
+        values = {"name": f"{name}-{seqlen}-{hidden}-{batch_size}-{seed}", "model": name,
+                  "model_kwargs": {hidden_key: hidden}, "corpus_path": args.path, "cache_dir": args.cache_dir,
+                  "seqlen": seqlen, "batch_size": batch_size, "num_iterations": args.iterations,
+                  "num_preds": 1, "seed": seed, "eval_max_windows": args.eval_max_windows}
+        with ctx.Pool(1) as pool:
+            row = pool.apply(_run_point, (values, args))
+        rows.append(row)
+        print(f"{name:11s} {seqlen:6d} {hidden:6d} {batch_size:5d} {seed:4d} "
+              f"{row['train_samples_per_sec']:10,.0f} {row['gen_tokens_per_sec']:10,.0f} "
+              f"{row['peak_rss_mb']:8.0f} {row['val_bpc']:8.4f} {row['test_bpc']:8.4f}", flush=True)
+
+    report = {"environment": _environment(), "grid": vars(args), "rows": rows}
+    with open(args.output, "w") as fout:
+        json.dump(report, fout, indent=2)
+    if args.csv:
+        with open(args.csv, "w", newline="") as fout:
+            writer = csv.DictWriter(fout, ROW_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+    print(f"Wrote {args.output}" + (f" and {args.csv}" if args.csv else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Character vs BPE tokenization: training cost, compression and generation speed.
+
+For every vocabulary size the benchmark reports the BPE training time, the
+average characters per token, encoding throughput, the number of training
+windows per epoch and how many characters of text a GRU generates per second
+(one decoder step per token).
+
+Usage:
+    python benchmarks/bench_tokenizer.py --path sample_data/alice.txt --vocab-sizes 256 512 1024
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import corpus
+import generation
+import models
+import tokenizer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--path", default="sample_data/alice.txt")
+    parser.add_argument("--vocab-sizes", type=int, nargs="+", default=[256, 512, 1024])
+    parser.add_argument("--seqlen", type=int, default=10)
+    parser.add_argument("--tokens", type=int, default=200, help="Tokens generated per seed")
+    parser.add_argument("--batch", type=int, default=32, help="Seeds generated together")
+    args = parser.parse_args()
+
+    encoded, chars = corpus.load_encoded_corpus(args.path)
+    text = corpus.load_text(args.path)
+
+    tokenizers = [("char", 0.0, tokenizer.CharTokenizer(chars), np.asarray(encoded))]
+    for vocab_size in args.vocab_sizes:
+        start = time.perf_counter()
+        tok, ids = tokenizer.BPETokenizer.train(encoded, chars, vocab_size)
+        tokenizers.append((f"bpe-{vocab_size}", time.perf_counter() - start, tok, ids))
+
+    print(f"{'tokenizer':10s} {'vocab':>6s} {'train s':>8s} {'chars/tok':>9s} {'encode MB/s':>11s} "
+          f"{'windows':>9s} {'gen chars/s':>11s}")
+    for label, train_s, tok, ids in tokenizers:
+        start = time.perf_counter()
+        tok.encode(text)
+        encode_rate = len(text) / (time.perf_counter() - start) / 1e6
+
+        # Same model size for every tokenizer; only the vocabulary changes
+        model = models.build_gru_model(args.seqlen, len(tok))
+        seeds = corpus.make_windows(ids, args.seqlen)[0][:args.batch]
+        start = time.perf_counter()
+        out = generation.generate(model, seeds, args.tokens, temperature=1.0, seed=0)
+        gen_rate = tok.token_lengths[out].sum() / (time.perf_counter() - start)
+
+        print(f"{label:10s} {len(tok):6d} {train_s:8.2f} {len(text) / len(ids):9.2f} "
+              f"{encode_rate:11.1f} {corpus.num_windows(len(ids), args.seqlen):9,d} {gen_rate:11,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Training throughput of each architecture under float32 / XLA / bfloat16 modes.
+
+Usage:
+    python benchmarks/bench_training_modes.py --path sample_data/alice.txt --steps 200
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import corpus
+import dataset
+import models
+import trainer
+from callbacks import ThroughputCallback
+
+# (label, mixed_precision, xla)
+MODES = [
+    ("float32", False, False),
+    ("float32 + XLA", False, True),
+    ("mixed_bfloat16", True, False),
+    ("mixed_bfloat16 + XLA", True, True),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--path", default="sample_data/alice.txt")
+    parser.add_argument("--seqlen", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--steps", type=int, default=200, help="Training steps per measured epoch")
+    parser.add_argument("--epochs", type=int, default=3, help="Epochs per mode; the first is warm-up")
+    parser.add_argument("--models", nargs="+", default=sorted(models.MODEL_BUILDERS))
+    args = parser.parse_args()
+
+    encoded, chars = corpus.load_encoded_corpus(args.path)
+    train_ds = dataset.make_dataset(encoded, args.seqlen, batch_size=args.batch_size,
+                                    repeat=True)
+
+    print(f"{'model':12s} {'mode':22s} {'samples/sec':>12s} {'ms/step':>9s} {'speedup':>8s}")
+    for name in args.models:
+        baseline = None
+        for label, mixed_precision, xla in MODES:
+            policy = trainer.configure_precision(mixed_precision)
+            if mixed_precision and policy == "float32":
+                continue
+
+            model = models.build_model(name, args.seqlen, len(chars), jit_compile=xla)
+            throughput = ThroughputCallback(args.batch_size, verbose=False)
+            model.fit(train_ds, epochs=args.epochs, steps_per_epoch=args.steps,
+                      callbacks=[throughput], verbose=0)
+
+            # Skip the first epoch: it includes tracing and XLA compilation
+            steady = throughput.history[1:] or throughput.history
+            rate = float(np.mean([r["samples_per_sec"] for r in steady]))
+            step_ms = float(np.mean([r["step_time_ms"] for r in steady]))
+            baseline = baseline or rate
+            print(f"{name:12s} {label:22s} {rate:12,.0f} {step_ms:9.2f} {rate / baseline:7.2f}x")
+
+    trainer.configure_precision(False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Per-token latency of Transformer generation vs context length.
+
+Compares the original loop (model.predict over the full sliding window for
+every character) with the key/value-cached TransformerDecoder.
+
+Usage:
+    python benchmarks/bench_transformer_decoding.py --seqlens 10 100 1000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generation import TransformerDecoder
+from transformer import build_transformer_model
+
+
+def per_token_latency(step, n_tokens):
+    # Median wall time of a single generation step, in milliseconds
+    times = []
+    for _ in range(n_tokens):
+        start = time.perf_counter()
+        step()
+        times.append(time.perf_counter() - start)
+    return 1000.0 * float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vocab", type=int, default=50)
+    parser.add_argument("--seqlens", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--tokens", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'SEQLEN':>8} {'predict ms/tok':>16} {'cached ms/tok':>15} {'speedup':>8}")
+
+    for seqlen in args.seqlens:
+        model = build_transformer_model(seqlen, args.vocab)
+        window = rng.integers(0, args.vocab, (1, seqlen)).astype(np.int32)
+
+        # Original path: full forward pass over the window for every token
+        def predict_step():
+            pred = model.predict(window, verbose=0)[0]
+            window[0, :-1] = window[0, 1:]
+            window[0, -1] = np.argmax(pred)
+
+        decoder = TransformerDecoder(model)
+        probs = [decoder.prime(window)]
+
+        # Cached path: one attention row per token
+        def cached_step():
+            probs[0] = decoder.step(np.argmax(probs[0], axis=-1))
+
+        predict_step()
+        cached_step()
+        predict_ms = per_token_latency(predict_step, args.tokens)
+        cached_ms = per_token_latency(cached_step, args.tokens)
+        print(f"{seqlen:>8} {predict_ms:>16.3f} {cached_ms:>15.3f} {predict_ms / cached_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""Keras callbacks used by the training harness."""
+
+import time
+
+import tensorflow as tf
+from tensorflow import keras
+
+import evaluation
+import inference
+import instrumentation
+
+
+class ThroughputCallback(keras.callbacks.Callback):
+    """Record samples/sec and mean step time for every training epoch.
+
+    `batch_size` is the number of samples per step; `num_samples` (optional)
+    caps the count for the final, partial batch of each epoch.
+    """
+
+    def __init__(self, batch_size, num_samples=None, name="", verbose=True):
+        super().__init__()
+        self.batch_size = batch_size
+        self.num_samples = num_samples
+        self.name = name
+        self.verbose = verbose
+        self.history = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._steps = 0
+        self._epoch_start = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        self._steps += 1
+
+    def on_epoch_end(self, epoch, logs=None):
+        elapsed = time.perf_counter() - self._epoch_start
+        samples = self._steps * self.batch_size
+        if self.num_samples is not None:
+            samples = min(samples, self.num_samples)
+
+        record = {
+            "samples_per_sec": samples / elapsed if elapsed > 0 else 0.0,
+            "step_time_ms": 1000.0 * elapsed / max(self._steps, 1),
+            "steps": self._steps,
+            "epoch_time_s": elapsed,
+        }
+        self.history.append(record)
+
+        if self.verbose:
+            print(f"{self.name} throughput: {record['samples_per_sec']:,.0f} samples/sec, "
+                  f"{record['step_time_ms']:.2f} ms/step".strip())
+
+
+class InstrumentationCallback(keras.callbacks.Callback):
+    """Report every train step and epoch into an instrumentation registry.
+
+    Step times go to the `<prefix>/step` timer (so the export has p50 / p99
+    step latency, not just the epoch mean), epochs to `<prefix>/epoch`, the
+    step and sample counts to counters and the last epoch's samples/sec to
+    the `<prefix>/samples_per_sec` gauge. Defaults to instrumentation.default.
+    """
+
+    def __init__(self, batch_size, prefix="train", instruments=None):
+        super().__init__()
+        self.batch_size = batch_size
+        self.prefix = prefix
+        self.instruments = instrumentation.default if instruments is None else instruments
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._steps = 0
+        self._epoch_start = time.perf_counter()
+
+    def on_train_batch_begin(self, batch, logs=None):
+        self._step_start = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        self._steps += 1
+        self.instruments.add_time(f"{self.prefix}/step", time.perf_counter() - self._step_start)
+
+    def on_epoch_end(self, epoch, logs=None):
+        elapsed = time.perf_counter() - self._epoch_start
+        self.instruments.add_time(f"{self.prefix}/epoch", elapsed)
+        self.instruments.count(f"{self.prefix}/steps", self._steps)
+        self.instruments.count(f"{self.prefix}/samples", self._steps * self.batch_size)
+        if elapsed > 0:
+            self.instruments.gauge(f"{self.prefix}/samples_per_sec", self._steps * self.batch_size / elapsed)
+
+
+class ProfilerTraceCallback(keras.callbacks.Callback):
+    """Capture a TensorFlow profiler trace of a window of train steps.
+
+    Counts steps across epochs and model.fit calls, starts tracing before
+    step `start_step` (skipping the tracing / compilation of the first steps)
+    and stops after `num_steps` steps. View `logdir` with TensorBoard's
+    profile plugin.
+    """
+
+    def __init__(self, logdir, start_step=10, num_steps=10):
+        super().__init__()
+        self.logdir = logdir
+        self.start_step = start_step
+        self.num_steps = num_steps
+        self._step = 0
+        self._tracing = False
+
+    def on_train_batch_begin(self, batch, logs=None):
+        if self._step == self.start_step:
+            tf.profiler.experimental.start(self.logdir)
+            self._tracing = True
+
+    def on_train_batch_end(self, batch, logs=None):
+        self._step += 1
+        if self._tracing and self._step >= self.start_step + self.num_steps:
+            self._stop()
+
+    def on_train_end(self, logs=None):
+        # A window that runs past the end of training stops with it
+        if self._tracing:
+            self._stop()
+
+    def _stop(self):
+        tf.profiler.experimental.stop()
+        self._tracing = False
+
+
+class EvaluationCallback(keras.callbacks.Callback):
+    """Score held-out text after every epoch and add the metrics to the logs.
+
+    Adds `<prefix>_loss`, `<prefix>_bpc` and `<prefix>_perplexity` to the epoch
+    logs (so they show up in model.fit's history) and keeps every result in
+    self.history. `max_windows` bounds the cost with an evenly spaced subset.
+    With `streams`, a recurrent model is instead scored over that many
+    continuous streams (evaluation.evaluate_stream), as stateful models need.
+    Pass the tokenizer's token_lengths for subword tokens so bits-per-character
+    stays per character.
+    """
+
+    def __init__(self, encoded, seqlen, max_windows=None, prefix="val", name="", verbose=True,
+                 streams=None, token_lengths=None):
+        super().__init__()
+        self.encoded = encoded
+        self.seqlen = seqlen
+        self.max_windows = max_windows
+        self.prefix = prefix
+        self.name = name
+        self.verbose = verbose
+        self.streams = streams
+        self.token_lengths = token_lengths
+        self.history = []
+        self._window_fn = None
+
+    def on_epoch_end(self, epoch, logs=None):
+        if self.streams:
+            metrics = evaluation.evaluate_stream(self.model, self.encoded, self.streams,
+                                                 token_lengths=self.token_lengths)
+        else:
+            # Compile the inference graph once and reuse it for every epoch
+            if self._window_fn is None:
+                self._window_fn = inference.export_window_fn(self.model)
+            metrics = evaluation.evaluate(self.model, self.encoded, self.seqlen,
+                                          max_windows=self.max_windows, window_fn=self._window_fn,
+                                          token_lengths=self.token_lengths)
+        self.history.append(metrics)
+        if logs is not None:
+            for key in ("loss", "bpc", "perplexity"):
+                logs[f"{self.prefix}_{key}"] = metrics[key]
+
+        if self.verbose:
+            print(f"{self.name} {self.prefix}: {metrics['bpc']:.4f} bits/char, "
+                  f"perplexity {metrics['perplexity']:.3f}".strip())
+
+
+class ResetStatesCallback(keras.callbacks.Callback):
+    """Zero the hidden state of stateful recurrent layers at the start of every epoch.
+
+    Stream batches (dataset.make_stream_dataset) restart from the beginning
+    of each stream every epoch, so the state left over from the end of the
+    previous epoch must not leak into the first batch.
+    """
+
+    def on_epoch_begin(self, epoch, logs=None):
+        for layer in self.model.layers:
+            if getattr(layer, "stateful", False):
+                layer.reset_states()
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""Periodic, asynchronous training checkpoints that can be resumed exactly.
+
+A checkpoint holds the model weights, the optimizer state, the non-trainable
+variables (including the dropout seed generators) and a JSON blob with the
+loop state: the next iteration, the loss history and the NumPy RNG state used
+for picking generation seeds. Together with a per-iteration dataset seed (see
+dataset.make_dataset_factory) a resumed run continues exactly where the
+interrupted one stopped.
+"""
+
+import glob
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class TrainingCheckpointer:
+    """Save and restore the full training state of one model.
+
+    save() only copies the variable values to host memory; the .npz file is
+    written by a background thread, so training continues while it is on its
+    way to disk. Files are written under a temporary name and renamed, so a
+    crash mid-write never leaves a corrupt latest checkpoint.
+
+    With write=False the checkpointer only restores: save() and clear() do
+    nothing. Under tf.distribute every worker restores the same checkpoint
+    but only the chief writes (see trainer.train); create the checkpointer
+    inside strategy.scope(), since it builds the optimizer.
+    """
+
+    def __init__(self, directory, model, max_to_keep=3, async_write=True, write=True):
+        # Build the optimizer so its slot variables exist before a restore
+        if not model.optimizer.built:
+            model.optimizer.build(model.trainable_variables)
+
+        self.directory = directory
+        self.max_to_keep = max_to_keep
+        self.write = write
+        self.variables = (list(model.trainable_variables) + list(model.non_trainable_variables)
+                          + list(model.optimizer.variables))
+        self.executor = ThreadPoolExecutor(max_workers=1) if async_write else None
+        self.pending = None
+        if write:
+            os.makedirs(directory, exist_ok=True)
+
+    def checkpoints(self):
+        """Paths of the saved checkpoints, oldest written first.
+
+        Ordered by write time rather than iteration number, so the latest
+        checkpoint is always the one saved last.
+        """
+        paths = glob.glob(os.path.join(self.directory, "ckpt-*.npz"))
+        return sorted(paths, key=lambda p: (os.stat(p).st_mtime_ns,
+                                            int(re.search(r"ckpt-(\d+)\.npz$", p).group(1))))
+
+    def clear(self):
+        """Delete every checkpoint in the directory, e.g. from an earlier run.
+
+        A fresh (non-resumed) run must start from an empty directory, or a
+        later resume could pick up the older run's state.
+        """
+        if not self.write:
+            return
+        self.wait()
+        for path in glob.glob(os.path.join(self.directory, "ckpt-*.npz*")):
+            os.remove(path)
+
+    def latest_checkpoint(self):
+        paths = self.checkpoints()
+        return paths[-1] if paths else None
+
+    def save(self, iteration, losses, rng=None, **extra):
+        """Checkpoint the state after `iteration` completed iterations."""
+        if not self.write:
+            return None
+        state = {"iteration": iteration, "losses": [float(l) for l in losses], **extra}
+        if rng is not None:
+            state["rng"] = rng.bit_generator.state
+
+        # Snapshot now; only the file I/O happens in the background
+        arrays = {f"var_{i}": np.array(v.numpy()) for i, v in enumerate(self.variables)}
+        arrays["state"] = np.array(json.dumps(state))
+        path = os.path.join(self.directory, f"ckpt-{iteration}.npz")
+
+        # One write in flight at a time keeps checkpoints in order
+        self.wait()
+        if self.executor is None:
+            self._write(path, arrays)
+        else:
+            self.pending = self.executor.submit(self._write, path, arrays)
+        return path
+
+    def _write(self, path, arrays):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as fout:
+            np.savez(fout, **arrays)
+        os.replace(tmp_path, path)
+
+        # Drop the oldest-written checkpoints beyond max_to_keep
+        for old in self.checkpoints()[:-self.max_to_keep]:
+            os.remove(old)
+
+    def restore(self, rng=None):
+        """Restore the latest checkpoint; returns its loop state, or None if there is none.
+
+        When `rng` is given its bit generator is reset to the saved state.
+        """
+        self.wait()
+        path = self.latest_checkpoint()
+        if path is None:
+            return None
+
+        with np.load(path) as data:
+            if len(data.files) - 1 != len(self.variables):
+                raise ValueError(f"{path} does not match this model's variables")
+            for i, variable in enumerate(self.variables):
+                variable.assign(data[f"var_{i}"])
+            state = json.loads(str(data["state"]))
+
+        if rng is not None and "rng" in state:
+            rng.bit_generator.state = state["rng"]
+        return state
+
+    def wait(self):
+        """Block until the pending asynchronous write (if any) has finished."""
+        if self.pending is not None:
+            self.pending.result()
+            self.pending = None
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""Vectorized corpus encoding for the character-level models.
+
+Turns a raw text file into one flat integer array with a NumPy lookup table and
+builds the (SEQLEN, STEP) training windows as strided views over that array, so
+no per-window Python strings or per-character loops are ever created. Files that
+do not fit in memory can be streamed straight into an on-disk encoded array.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+import instrumentation
+
+# Number of bytes read from the input file per chunk when streaming
+CHUNK_BYTES = 1 << 24
+
+# Bump whenever the cleaning or encoding rules change so stale caches are ignored
+CACHE_VERSION = 1
+
+# Default directory for encoded corpus caches
+CACHE_DIR = ".corpus_cache"
+
+
+def iter_clean_chunks(path, chunk_bytes=CHUNK_BYTES):
+    """Yield the cleaned corpus as ASCII byte blocks of roughly `chunk_bytes`.
+
+    Applies the same cleaning as the original notebook: each line is stripped,
+    lowercased, decoded as ASCII (dropping anything else), empty lines are
+    skipped and the remaining lines are joined with a single space.
+    """
+    first = True
+    with open(path, "rb") as fin:
+        while True:
+            # readlines(hint) stops after ~chunk_bytes, so memory stays bounded
+            raw_lines = fin.readlines(chunk_bytes)
+            if not raw_lines:
+                break
+
+            cleaned = []
+            for line in raw_lines:
+                line = line.strip().lower().decode("ascii", "ignore")
+                if len(line) == 0:
+                    continue
+                cleaned.append(line)
+
+            if not cleaned:
+                continue
+
+            # Lines are space separated, including across chunk boundaries
+            block = " ".join(cleaned)
+            if not first:
+                block = " " + block
+            first = False
+
+            yield block.encode("ascii")
+
+
+def load_text(path):
+    """Read and clean the whole corpus into a single string."""
+    return b"".join(iter_clean_chunks(path)).decode("ascii")
+
+
+def build_vocab(data):
+    """Return the sorted list of unique characters in `data` (str, bytes or uint8 array)."""
+    codes = _as_codes(data)
+    present = np.flatnonzero(np.bincount(codes, minlength=256))
+    return [chr(c) for c in present]
+
+
+def build_lookup_table(chars):
+    """Build a 256-entry table mapping byte values to vocabulary indices (-1 if unknown)."""
+    table = np.full(256, -1, dtype=np.int32)
+    table[[ord(c) for c in chars]] = np.arange(len(chars), dtype=np.int32)
+    return table
+
+
+def encode_text(data, table, dtype=np.int32):
+    """Encode `data` into vocabulary indices with a single table lookup."""
+    encoded = table[_as_codes(data)]
+    if encoded.size and encoded.min() < 0:
+        raise ValueError("text contains characters that are not in the vocabulary")
+    return encoded.astype(dtype, copy=False)
+
+
+def decode(indices, chars):
+    """Turn a sequence of vocabulary indices back into a string."""
+    return "".join(chars[int(i)] for i in np.asarray(indices).reshape(-1))
+
+
+def encode_corpus(path, dtype=np.int32):
+    """Read, clean and encode a corpus that fits in memory.
+
+    Returns the encoded array and the sorted character vocabulary.
+    """
+    data = b"".join(iter_clean_chunks(path))
+    chars = build_vocab(data)
+    return encode_text(data, build_lookup_table(chars), dtype), chars
+
+
+def scan_vocab(path, chunk_bytes=CHUNK_BYTES):
+    """First streaming pass: collect the vocabulary without holding the corpus."""
+    counts = np.zeros(256, dtype=np.int64)
+    for block in iter_clean_chunks(path, chunk_bytes):
+        counts += np.bincount(_as_codes(block), minlength=256)
+    return [chr(c) for c in np.flatnonzero(counts)]
+
+
+def stream_encode_file(path, out_path, dtype=np.int32, chunk_bytes=CHUNK_BYTES):
+    """Encode a corpus larger than RAM straight to a raw binary file on disk.
+
+    Makes two passes over the input (vocabulary, then encoding) and only ever
+    holds one chunk in memory. Returns a read-only memory map of the encoded
+    array together with the character vocabulary.
+    """
+    chars = scan_vocab(path, chunk_bytes)
+    table = build_lookup_table(chars)
+
+    total = 0
+    with open(out_path, "wb") as fout:
+        for block in iter_clean_chunks(path, chunk_bytes):
+            encoded = encode_text(block, table, dtype)
+            encoded.tofile(fout)
+            total += encoded.size
+
+    # np.memmap refuses zero-length files, so an empty corpus gets an empty array
+    if total == 0:
+        return np.zeros(0, dtype=dtype), chars
+    return np.memmap(out_path, dtype=dtype, mode="r", shape=(total,)), chars
+
+
+def file_digest(path, chunk_bytes=CHUNK_BYTES):
+    """Return the SHA-256 hex digest of a file's raw contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fin:
+        for block in iter(lambda: fin.read(chunk_bytes), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@instrumentation.timed("corpus/load")
+def load_encoded_corpus(path, cache_dir=CACHE_DIR, dtype=np.int32, digest=None):
+    """Return the encoded corpus as a memory map, building the cache on first use.
+
+    The encoded array is stored as a raw binary file next to a small JSON file
+    holding its vocabulary, both named after the content hash of the source
+    text. Later runs only hash the file and memory-map the cached array, so
+    startup cost and resident memory do not grow with the corpus size.
+    Callers that already hold the file's `digest` (see file_digest) can pass
+    it in to skip the hashing.
+    """
+    dtype = np.dtype(dtype)
+    digest = file_digest(path) if digest is None else digest
+    key = f"{digest}-v{CACHE_VERSION}-{dtype.name}"
+    data_path = os.path.join(cache_dir, key + ".bin")
+    meta_path = os.path.join(cache_dir, key + ".json")
+
+    if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # Write under temporary names and rename, so an interrupted run never
+        # leaves a half-written cache behind
+        tmp_data = data_path + f".{os.getpid()}.tmp"
+        with instrumentation.timer("corpus/encode"):
+            encoded, chars = stream_encode_file(path, tmp_data, dtype)
+        length = len(encoded)
+        del encoded
+
+        tmp_meta = meta_path + f".{os.getpid()}.tmp"
+        with open(tmp_meta, "w") as fout:
+            json.dump({"source": os.path.abspath(path), "length": length,
+                       "dtype": dtype.name, "chars": chars}, fout)
+
+        os.replace(tmp_data, data_path)
+        os.replace(tmp_meta, meta_path)
+
+    with open(meta_path) as fin:
+        meta = json.load(fin)
+
+    if meta["length"] == 0:
+        return np.zeros(0, dtype=dtype), meta["chars"]
+    encoded = np.memmap(data_path, dtype=dtype, mode="r", shape=(meta["length"],))
+    return encoded, meta["chars"]
+
+
+def num_windows(length, seqlen, step=1):
+    """Number of (window, label) pairs make_windows produces for a corpus length."""
+    return max(0, (length - seqlen - 1) // step + 1)
+
+
+def make_windows(encoded, seqlen, step=1):
+    """Build the (X, y) training pairs as zero-copy strided views.
+
+    Row i of X is encoded[i*step : i*step + seqlen] and y[i] is the character
+    that follows it, exactly matching the original sliding-window loop.
+    """
+    encoded = np.asarray(encoded)
+    if len(encoded) <= seqlen:
+        raise ValueError("corpus is shorter than one window")
+
+    # Drop the last character from the inputs so every window has a label
+    X = np.lib.stride_tricks.sliding_window_view(encoded[:-1], seqlen)[::step]
+    y = encoded[seqlen::step]
+    return X, y
+
+
+def _as_codes(data):
+    # Normalize str / bytes / arrays to a flat uint8 view of byte values
+    if isinstance(data, str):
+        data = data.encode("ascii")
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return np.frombuffer(data, dtype=np.uint8)
+    return np.asarray(data, dtype=np.uint8).reshape(-1)
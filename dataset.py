@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""tf.data input pipeline over an encoded (optionally memory-mapped) corpus.
+
+Windows are never materialized up front: the pipeline shuffles window start
+indices, batches them, and gathers each batch from the encoded array in a
+parallel map, so memory stays flat regardless of corpus size.
+"""
+
+import numpy as np
+import tensorflow as tf
+
+import corpus
+import instrumentation
+
+# Number of window indices held in the shuffle buffer
+SHUFFLE_BUFFER = 1 << 16
+
+
+def gather_windows(encoded, starts, seqlen):
+    """Gather a batch of (X, y) pairs for the given window start offsets."""
+    starts = np.asarray(starts, dtype=np.int64)
+    offsets = starts[:, None] + np.arange(seqlen, dtype=np.int64)
+    return np.asarray(encoded[offsets]), np.asarray(encoded[starts + seqlen])
+
+
+def gather_sequence_windows(encoded, starts, seqlen):
+    """Gather (X, Y) pairs where Y[:, t] is the character following X[:, t]."""
+    starts = np.asarray(starts, dtype=np.int64)
+    offsets = starts[:, None] + np.arange(seqlen + 1, dtype=np.int64)
+    sequences = np.asarray(encoded[offsets])
+    return sequences[:, :-1], sequences[:, 1:]
+
+
+def make_dataset(encoded, seqlen, step=1, batch_size=128, shuffle=True,
+                 shuffle_buffer=SHUFFLE_BUFFER, seed=None, repeat=False, full_sequence=False,
+                 shard=None):
+    """Build a batched, prefetched tf.data.Dataset of (X, y) training windows.
+
+    Produces the same pairs as corpus.make_windows(encoded, seqlen, step), in
+    shuffled order when `shuffle` is set. With full_sequence=True the labels
+    are the next character at every position, shape (batch, seqlen), for the
+    many-to-many models (see models.py); use step=seqlen so windows do not
+    overlap. `shard=(num_shards, index)` keeps only every num_shards-th
+    window, for one worker of a distributed run (see distributed.py).
+    """
+    count = corpus.num_windows(len(encoded), seqlen, step)
+    dtype = tf.as_dtype(np.asarray(encoded[:0]).dtype)
+
+    # Each element is the start offset of one training window
+    ds = tf.data.Dataset.range(count)
+    if shard is not None:
+        ds = ds.shard(*shard)
+    if shuffle:
+        ds = ds.shuffle(min(shuffle_buffer, max(count, 1)), seed=seed,
+                        reshuffle_each_iteration=True)
+    if repeat:
+        ds = ds.repeat()
+
+    # Batch the offsets first so every gather is one vectorized NumPy call
+    ds = ds.batch(batch_size)
+
+    gather = gather_sequence_windows if full_sequence else gather_windows
+
+    def gather_batch(idx):
+        # Runs on the tf.data worker threads
+        with instrumentation.timer("dataset/gather"):
+            return gather(encoded, idx * step, seqlen)
+
+    def load_batch(indices):
+        X, y = tf.numpy_function(gather_batch, [indices], [dtype, dtype])
+        X.set_shape([None, seqlen])
+        y.set_shape([None, seqlen] if full_sequence else [None])
+        return X, y
+
+    ds = ds.map(load_batch, num_parallel_calls=tf.data.AUTOTUNE)
+    return ds.prefetch(tf.data.AUTOTUNE)
+
+
+def make_stream_dataset(encoded, seqlen, batch_size=128):
+    """Ordered batches for stateful truncated-BPTT training over contiguous streams.
+
+    The corpus is cut into batch_size equal contiguous streams and batch t holds
+    characters [t * seqlen, (t + 1) * seqlen) of every stream, labelled with
+    the next character at each position. Row b of consecutive batches
+    continues the same stretch of text, so a stateful model can carry its
+    hidden state from one batch to the next. The order is never shuffled.
+    """
+    stream_len = len(encoded) // batch_size
+    if stream_len <= seqlen:
+        raise ValueError("corpus is too short for batch_size streams of one window each")
+
+    # A view of the (memory-mapped) corpus: one row per stream
+    streams = encoded[:batch_size * stream_len].reshape(batch_size, stream_len)
+    steps = (stream_len - 1) // seqlen
+    dtype = tf.as_dtype(np.asarray(encoded[:0]).dtype)
+
+    def gather_step(t):
+        with instrumentation.timer("dataset/gather"):
+            start = int(t) * seqlen
+            sequences = np.asarray(streams[:, start:start + seqlen + 1])
+            return sequences[:, :-1], sequences[:, 1:]
+
+    def load_batch(t):
+        X, y = tf.numpy_function(gather_step, [t], [dtype, dtype])
+        X.set_shape([batch_size, seqlen])
+        y.set_shape([batch_size, seqlen])
+        return X, y
+
+    # Parallel map keeps the element order, which the carried state relies on
+    ds = tf.data.Dataset.range(steps).map(load_batch, num_parallel_calls=tf.data.AUTOTUNE)
+    return ds.prefetch(tf.data.AUTOTUNE)
+
+
+class DatasetFactory:
+    """Callable mapping a training iteration to its input dataset.
+
+    Iteration i shuffles with seed + i, so the window order of every
+    iteration is fixed and a resumed run sees exactly the batches the
+    interrupted run would have seen. Without an explicit seed a random base
+    seed is drawn once; it is stored in checkpoints (trainer.training_loop
+    saves and restores `seed`) so unseeded runs resume exactly too.
+
+    With a tf.distribute `strategy`, batch_size is the global batch: every
+    input pipeline (worker) reads its own shard of the windows in
+    per-replica batches. The shards repeat, and `steps_per_epoch` (passed to
+    model.fit by training_loop) ends each epoch after one pass over the
+    corpus, since the shards can differ by a window.
+    """
+
+    def __init__(self, encoded, seqlen, step=1, batch_size=128, seed=None, strategy=None, **kwargs):
+        self.encoded = encoded
+        self.seqlen = seqlen
+        self.step = step
+        self.batch_size = batch_size
+        self.seed = int(np.random.SeedSequence().generate_state(1)[0] >> 1) if seed is None else seed
+        self.strategy = strategy
+        self.kwargs = kwargs
+
+    @property
+    def steps_per_epoch(self):
+        if self.strategy is None:
+            return None
+        return max(1, corpus.num_windows(len(self.encoded), self.seqlen, self.step) // self.batch_size)
+
+    def __call__(self, iteration):
+        if self.strategy is None:
+            return make_dataset(self.encoded, self.seqlen, self.step, batch_size=self.batch_size,
+                                seed=self.seed + iteration, **self.kwargs)
+
+        def shard_dataset(context):
+            return make_dataset(self.encoded, self.seqlen, self.step,
+                                batch_size=context.get_per_replica_batch_size(self.batch_size),
+                                seed=self.seed + iteration, repeat=True,
+                                shard=(context.num_input_pipelines, context.input_pipeline_id), **self.kwargs)
+
+        return self.strategy.distribute_datasets_from_function(shard_dataset)
+
+
+def make_dataset_factory(encoded, seqlen, step=1, batch_size=128, seed=None, strategy=None, **kwargs):
+    """Return a DatasetFactory building the dataset for each training iteration."""
+    return DatasetFactory(encoded, seqlen, step, batch_size, seed, strategy, **kwargs)
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""Data-parallel training with tf.distribute on CPUs.
+
+  - "none":         the default single-device strategy (plain model.fit)
+  - "mirrored":     MirroredStrategy over `replicas` logical CPU devices in
+                    one process; each replica computes its slice of every
+                    batch and the gradients are all-reduced
+  - "multi_worker": MultiWorkerMirroredStrategy across processes (one per
+                    machine or per core group), configured through TF_CONFIG
+                    like any TensorFlow cluster:
+
+        TF_CONFIG='{"cluster": {"worker": ["host1:12345", "host2:12345"]},
+                    "task": {"type": "worker", "index": 0}}' python trainer.py ...
+
+Models are built under strategy.scope() and the input comes from
+dataset.DatasetFactory(strategy=...): every worker reads its own shard of
+the window offsets (tf.data shard before shuffle), batched to the
+per-replica batch size, so workers never read the same windows. The
+strategy has to be created before TensorFlow runs any op.
+"""
+
+import json
+import os
+
+import tensorflow as tf
+
+DISTRIBUTE_MODES = ("none", "mirrored", "multi_worker")
+
+
+def tf_config():
+    """The parsed TF_CONFIG environment variable ({} when unset)."""
+    return json.loads(os.environ.get("TF_CONFIG") or "{}")
+
+
+def is_chief():
+    """True for the process that should write checkpoints, models and reports.
+
+    That is the "chief" task if the cluster has one, otherwise worker 0, and
+    always true outside a cluster.
+    """
+    config = tf_config()
+    task = config.get("task", {})
+    if not task:
+        return True
+    if "chief" in config.get("cluster", {}):
+        return task.get("type") == "chief"
+    return task.get("type") == "worker" and task.get("index", 0) == 0
+
+
+def local_cluster_config(num_workers, index, ports):
+    """TF_CONFIG JSON for worker `index` of a cluster of local processes."""
+    return json.dumps({"cluster": {"worker": [f"localhost:{port}" for port in ports[:num_workers]]},
+                       "task": {"type": "worker", "index": index}})
+
+
+def configure_cpu_devices(count):
+    """Split the host CPU into `count` logical devices (before TF initializes)."""
+    cpu = tf.config.list_physical_devices("CPU")[0]
+    if len(tf.config.get_logical_device_configuration(cpu) or []) != count:
+        tf.config.set_logical_device_configuration(cpu, [tf.config.LogicalDeviceConfiguration()] * count)
+    return [device.name for device in tf.config.list_logical_devices("CPU")]
+
+
+def make_strategy(mode="none", replicas=2):
+    """Return the tf.distribute strategy for `mode` (see DISTRIBUTE_MODES)."""
+    if mode not in DISTRIBUTE_MODES:
+        raise ValueError(f"Unknown distribute mode {mode!r}, expected one of {DISTRIBUTE_MODES}")
+    if mode == "none":
+        return tf.distribute.get_strategy()
+    if mode == "mirrored":
+        return tf.distribute.MirroredStrategy(configure_cpu_devices(replicas))
+
+    # Ring all-reduce over gRPC; the cluster comes from TF_CONFIG
+    _patch_keras_multi_worker()
+    options = tf.distribute.experimental.CommunicationOptions(
+        implementation=tf.distribute.experimental.CommunicationImplementation.RING)
+    return tf.distribute.MultiWorkerMirroredStrategy(communication_options=options)
+
+
+# Keras releases whose private trainer code _patch_keras_multi_worker was checked against
+PATCHED_KERAS_VERSIONS = ("3.15",)
+
+
+def _patch_keras_multi_worker():
+    """Work around two Keras 3 bugs that stop model.fit under a real multi-worker cluster.
+
+    - The model is built from the first batch by reducing the whole (X, y)
+      structure in one strategy.reduce call, which MultiWorkerMirroredStrategy
+      rejects for nested values; build from this worker's local batch instead
+      (only the shapes and dtypes matter).
+    - The scalar loss / metric logs of every step are averaged with
+      strategy.reduce(..., axis=0), which fails for scalars; average them
+      over the replicas with axis=None.
+
+    Both replace private Keras functions, so they are only applied to the
+    Keras versions in PATCHED_KERAS_VERSIONS (anything else raises), and the
+    replacements defer to the original code unless the model was built under
+    a MultiWorkerMirroredStrategy. Applied once, when that strategy is created.
+    """
+    import keras
+    from keras.src.backend.tensorflow import trainer as tf_trainer
+
+    if getattr(tf_trainer, "_multi_worker_patched", False):
+        return
+    if ".".join(keras.__version__.split(".")[:2]) not in PATCHED_KERAS_VERSIONS:
+        raise RuntimeError(f"multi_worker training patches Keras internals and supports Keras "
+                           f"{', '.join(PATCHED_KERAS_VERSIONS)}; found {keras.__version__}")
+    reduce_per_replica = tf_trainer.reduce_per_replica
+    maybe_symbolic_build = tf_trainer.TensorFlowTrainer._maybe_symbolic_build
+
+    def is_multi_worker(strategy):
+        return isinstance(strategy, tf.distribute.MultiWorkerMirroredStrategy)
+
+    def patched_reduce_per_replica(values, strategy, reduction):
+        if reduction in ("auto", "mean") and is_multi_worker(strategy):
+            # Plain tensors are already reduced and pass through, as in Keras
+            return tf.nest.map_structure(
+                lambda v: strategy.reduce("MEAN", v, axis=None)
+                if isinstance(v, tf.distribute.DistributedValues) else v, values)
+        return reduce_per_replica(values, strategy, reduction)
+
+    def patched_maybe_symbolic_build(self, iterator=None, data_batch=None):
+        if not is_multi_worker(self._distribute_strategy) or iterator is None:
+            return maybe_symbolic_build(self, iterator, data_batch)
+        for _, _, it in iterator:
+            data_batch = next(it)
+            if all(isinstance(v, tf.distribute.DistributedValues) for v in tf.nest.flatten(data_batch)):
+                data_batch = tf.nest.map_structure(
+                    lambda v: self.distribute_strategy.experimental_local_results(v)[0], data_batch)
+            break
+        with self.distribute_strategy.scope():
+            self._symbolic_build(data_batch=data_batch)
+
+    tf_trainer.reduce_per_replica = patched_reduce_per_replica
+    tf_trainer.TensorFlowTrainer._maybe_symbolic_build = patched_maybe_symbolic_build
+    tf_trainer._multi_worker_patched = True
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""Held-out evaluation: contiguous train/val/test splits, bits-per-character and perplexity.
+
+The encoded corpus is cut into three contiguous blocks so no validation or
+test window overlaps the training text. Metrics come from large batched
+forward passes through a compiled window function, and can optionally be
+split into shards evaluated in parallel processes.
+"""
+
+import math
+import multiprocessing
+import os
+
+import numpy as np
+import tensorflow as tf
+
+import corpus
+import dataset
+import generation
+import inference
+import instrumentation
+import models
+import tokenizer as tokenizers
+
+# Windows per forward pass; large batches amortize the per-call overhead
+EVAL_BATCH_SIZE = 4096
+
+
+def split_corpus(encoded, val_fraction=0.05, test_fraction=0.05):
+    """Split the encoded corpus into contiguous train / val / test blocks.
+
+    Returns a dict of zero-copy views: the first (1 - val - test) of the text
+    is training data, followed by the validation block and the test block.
+    """
+    n = len(encoded)
+    n_test = int(n * test_fraction)
+    n_val = int(n * val_fraction)
+    n_train = n - n_val - n_test
+    return {
+        "train": encoded[:n_train],
+        "val": encoded[n_train:n_train + n_val],
+        "test": encoded[n_train + n_val:],
+    }
+
+
+def window_indices(num_windows, max_windows=None):
+    """Indices of the windows to score: all of them, or an evenly spaced subset."""
+    if max_windows is None or num_windows <= max_windows:
+        return np.arange(num_windows)
+    return np.linspace(0, num_windows - 1, max_windows).astype(np.int64)
+
+
+def _scored_indices(encoded, seqlen, max_windows):
+    # Window start offsets to score in one split; an empty split is an error,
+    # not a perfect score
+    count = corpus.num_windows(len(encoded), seqlen)
+    if count == 0:
+        raise ValueError(f"split of {len(encoded)} characters is shorter than one "
+                         f"window of {seqlen} + 1")
+    return window_indices(count, max_windows)
+
+
+def _evaluate_sums(predict_fn, encoded, seqlen, indices, batch_size, token_lengths=None):
+    # Accumulate summed negative log-likelihood (nats), correct predictions,
+    # scored tokens and the characters those tokens cover
+    nll = 0.0
+    correct = 0
+    chars = 0
+    for start in range(0, len(indices), batch_size):
+        X, y = dataset.gather_windows(encoded, indices[start:start + batch_size], seqlen)
+        probs = np.asarray(predict_fn(X.astype(np.int32)), dtype=np.float64)
+        picked = probs[np.arange(len(y)), y]
+        nll -= np.log(np.maximum(picked, 1e-12)).sum()
+        correct += int((probs.argmax(axis=-1) == y).sum())
+        chars += len(y) if token_lengths is None else int(token_lengths[y].sum())
+    return nll, correct, len(indices), chars
+
+
+def summarize(nll, correct, count, chars=None):
+    """Turn summed NLL / correct counts into the reported metrics.
+
+    `chars` is the number of characters the `count` scored tokens cover
+    (the same as count for character tokens). Loss, perplexity and accuracy
+    are per token; bits-per-character is per character, so it stays
+    comparable across tokenizers.
+    """
+    loss = nll / max(count, 1)
+    chars = count if chars is None else chars
+    return {
+        "loss": loss,                       # mean cross-entropy in nats
+        "bpc": nll / math.log(2) / max(chars, 1),   # bits per character
+        "perplexity": math.exp(loss),
+        "accuracy": correct / max(count, 1),
+        "windows": count,
+    }
+
+
+@instrumentation.timed("eval/windows")
+def evaluate(model, encoded, seqlen, batch_size=EVAL_BATCH_SIZE, max_windows=None,
+             window_fn=None, token_lengths=None):
+    """Score a model on every (or max_windows evenly spaced) window of `encoded`.
+
+    Pass a prebuilt inference.export_window_fn as `window_fn` to reuse its
+    compiled graph across calls, and the tokenizer's token_lengths when the
+    tokens are not single characters.
+    """
+    indices = _scored_indices(encoded, seqlen, max_windows)
+    window_fn = inference.export_window_fn(model) if window_fn is None else window_fn
+    return summarize(*_evaluate_sums(window_fn, encoded, seqlen, indices, batch_size,
+                                     token_lengths))
+
+
+@instrumentation.timed("eval/stream")
+def evaluate_stream(model, encoded, num_streams=16, token_lengths=None):
+    """Score a SimpleRNN / GRU model reading `encoded` as continuous streams.
+
+    The block is cut into num_streams contiguous streams that are stepped
+    through together with generation.RecurrentStepper, carrying the hidden
+    state along each whole stream, so every prediction sees all the text
+    before it in its stream. This matches stateful truncated-BPTT training,
+    where the window-based evaluate() would cut the context at SEQLEN.
+    """
+    stream_len = len(encoded) // num_streams
+    if stream_len < 2:
+        raise ValueError(f"split of {len(encoded)} characters is too short for "
+                         f"{num_streams} streams")
+    streams = np.asarray(encoded[:num_streams * stream_len]).reshape(num_streams, stream_len)
+
+    stepper = generation.RecurrentStepper(model)
+    stepper.reset(num_streams)
+    rows = np.arange(num_streams)
+    nll = 0.0
+    correct = 0
+    for t in range(stream_len - 1):
+        probs = np.asarray(stepper.step(streams[:, t]), dtype=np.float64)
+        y = streams[:, t + 1]
+        nll -= np.log(np.maximum(probs[rows, y], 1e-12)).sum()
+        correct += int((probs.argmax(axis=-1) == y).sum())
+
+    count = num_streams * (stream_len - 1)
+    chars = count if token_lengths is None else int(token_lengths[streams[:, 1:]].sum())
+    return summarize(nll, correct, count, chars)
+
+
+def _shard_worker(args):
+    (model_name, model_kwargs, weights, corpus_path, cache_dir, tokenizer, vocab_size, split,
+     fractions, seqlen, indices, batch_size, threads) = args
+
+    # Each process gets its own slice of the cores
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    encoded, tok = tokenizers.load_tokenized_corpus(corpus_path, tokenizer, vocab_size, cache_dir)
+    encoded = split_corpus(encoded, *fractions)[split]
+    model = models.build_model(model_name, seqlen, len(tok), **model_kwargs)
+    model.set_weights(weights)
+    return _evaluate_sums(inference.export_window_fn(model), encoded, seqlen, indices, batch_size,
+                          tok.token_lengths)
+
+
+def evaluate_sharded(model_name, model_kwargs, weights, corpus_path, seqlen, split="test",
+                     val_fraction=0.05, test_fraction=0.05, cache_dir=corpus.CACHE_DIR,
+                     processes=2, batch_size=EVAL_BATCH_SIZE, max_windows=None,
+                     tokenizer="char", vocab_size=512):
+    """Evaluate one split in `processes` parallel shards.
+
+    Workers rebuild the model from its builder name and weights and memory-map
+    the cached corpus themselves, so only the weights are sent between
+    processes. The per-shard sums are combined into the usual metrics.
+    `tokenizer` and `vocab_size` select the cached encoding, as in
+    tokenizer.load_tokenized_corpus.
+    """
+    encoded, _ = tokenizers.load_tokenized_corpus(corpus_path, tokenizer, vocab_size, cache_dir)
+    block = split_corpus(encoded, val_fraction, test_fraction)[split]
+    indices = _scored_indices(block, seqlen, max_windows)
+
+    threads = max(1, (os.cpu_count() or 1) // processes)
+    shards = [(model_name, model_kwargs, weights, corpus_path, cache_dir, tokenizer, vocab_size,
+               split, (val_fraction, test_fraction), seqlen, shard, batch_size, threads)
+              for shard in np.array_split(indices, processes) if len(shard)]
+
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(len(shards)) as pool:
+        sums = pool.map(_shard_worker, shards)
+
+    return summarize(*(sum(values) for values in zip(*sums)))
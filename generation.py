@@ -0,0 +1,407 @@
+# -*- coding: utf-8 -*-
+"""Incremental text generation for the SimpleRNN, GRU and Transformer models.
+
+Instead of re-running model.predict over the whole SEQLEN window for every new
+character, the trained weights are pulled out of the Keras model into NumPy
+single-step decoders. The recurrent models carry their hidden state forward,
+so each generated token costs one recurrent step; the Transformer keeps a
+key/value cache, so each token costs one attention row over the window.
+"""
+
+import numpy as np
+from tensorflow.keras.layers import GRU, Activation, Dense, Embedding, SimpleRNN
+
+import inference
+import instrumentation
+import prediction_cache
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def _softmax(x):
+    x = x - x.max(axis=-1, keepdims=True)
+    e = np.exp(x)
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+# NumPy equivalents of the Keras activations the models use
+_ACTIVATIONS = {
+    "tanh": np.tanh,
+    "sigmoid": _sigmoid,
+    "relu": lambda x: np.maximum(x, 0.0),
+    "linear": lambda x: x,
+    "softmax": _softmax,
+}
+
+
+def _activation(fn):
+    name = getattr(fn, "__name__", str(fn))
+    if name not in _ACTIVATIONS:
+        raise ValueError(f"Unsupported activation for incremental generation: {name}")
+    return _ACTIVATIONS[name]
+
+
+class RecurrentStepper:
+    """Single-step inference cell built from a trained SimpleRNN or GRU model.
+
+    Expects the Sequential layout used in rnn_nlp.py:
+    Embedding -> SimpleRNN/GRU -> Dense [-> Activation].
+    All methods work on a batch of independent sequences.
+    """
+
+    def __init__(self, model):
+        embedding = rnn = dense = None
+        output_activation = None
+        for layer in model.layers:
+            if isinstance(layer, Embedding):
+                embedding = layer
+            elif isinstance(layer, (SimpleRNN, GRU)):
+                rnn = layer
+            elif isinstance(layer, Dense):
+                dense = layer
+                output_activation = layer.activation
+            elif isinstance(layer, Activation):
+                output_activation = layer.activation
+
+        if embedding is None or rnn is None or dense is None:
+            raise ValueError("Model must contain Embedding, SimpleRNN/GRU and Dense layers")
+
+        self.embeddings = embedding.get_weights()[0]
+        self.kind = "gru" if isinstance(rnn, GRU) else "simple_rnn"
+        self.units = rnn.units
+        self.activation = _activation(rnn.activation)
+
+        weights = rnn.get_weights()
+        self.kernel, self.recurrent_kernel = weights[0], weights[1]
+        self.bias = weights[2] if rnn.use_bias else None
+
+        if self.kind == "gru":
+            self.recurrent_activation = _activation(rnn.recurrent_activation)
+            self.reset_after = rnn.cell.reset_after
+
+        self.dense_kernel, self.dense_bias = dense.get_weights()
+        self.output_activation = _activation(output_activation)
+
+        # Input-side projections are fixed per token, so precompute them once
+        # for the whole vocabulary: one table lookup replaces the input matmul
+        self.input_proj = self.embeddings @ self.kernel
+        if self.bias is not None:
+            self.input_proj = self.input_proj + (self.bias[0] if self.bias.ndim == 2 else self.bias)
+
+        self.state = None
+
+    def reset(self, batch_size=1):
+        """Zero the hidden state for `batch_size` sequences."""
+        self.state = np.zeros((batch_size, self.units), dtype=self.kernel.dtype)
+        return self.state
+
+    def step(self, tokens):
+        """Advance every sequence by one token and return next-token probabilities.
+
+        `tokens` has shape (batch,); the result has shape (batch, vocab_size).
+        """
+        tokens = np.asarray(tokens).reshape(-1)
+        if self.state is None or len(self.state) != len(tokens):
+            self.reset(len(tokens))
+
+        x = self.input_proj[tokens]
+        h = self.state
+
+        if self.kind == "simple_rnn":
+            h = self.activation(x + h @ self.recurrent_kernel)
+        else:
+            units = self.units
+            x_z, x_r, x_h = x[:, :units], x[:, units:2 * units], x[:, 2 * units:]
+            U = self.recurrent_kernel
+
+            if self.reset_after:
+                # Keras default: the reset gate is applied after the recurrent matmul
+                rec = h @ U
+                if self.bias is not None:
+                    rec = rec + self.bias[1]
+                z = self.recurrent_activation(x_z + rec[:, :units])
+                r = self.recurrent_activation(x_r + rec[:, units:2 * units])
+                hh = self.activation(x_h + r * rec[:, 2 * units:])
+            else:
+                z = self.recurrent_activation(x_z + h @ U[:, :units])
+                r = self.recurrent_activation(x_r + h @ U[:, units:2 * units])
+                hh = self.activation(x_h + (r * h) @ U[:, 2 * units:])
+
+            h = z * h + (1.0 - z) * hh
+
+        self.state = h
+        return self.output_activation(h @ self.dense_kernel + self.dense_bias)
+
+    def prime(self, sequences):
+        """Reset the state and feed whole seed sequences, shape (batch, length).
+
+        Returns the next-token probabilities after the last seed token, which
+        equal model.predict(sequences) for a seed of the training window size.
+        After that the hidden state runs over the whole history rather than a
+        sliding SEQLEN window, so each new token is a single recurrent step.
+        """
+        sequences = np.atleast_2d(np.asarray(sequences))
+        self.reset(len(sequences))
+        probs = None
+        for t in range(sequences.shape[1]):
+            probs = self.step(sequences[:, t])
+        return probs
+
+
+def _layer_norm(x, gamma, beta, epsilon):
+    mean = x.mean(axis=-1, keepdims=True)
+    var = x.var(axis=-1, keepdims=True)
+    return (x - mean) / np.sqrt(var + epsilon) * gamma + beta
+
+
+class TransformerDecoder:
+    """Key/value-cached autoregressive decoding for the Transformer model.
+
+    Expects the layout built by build_transformer_model in rnn_nlp.py:
+    TokenAndPositionEmbedding -> TransformerBlock -> Dense(softmax) applied to
+    the last position only. Because only the last position is read out and the
+    block's keys and values are linear in token + position embeddings, every
+    key/value splits into a token part (cached once per window entry) and a
+    position part (precomputed once per window slot). Each new character then
+    costs one query/key/value projection, one attention row over the cached
+    window and one feed-forward pass, instead of the full block over the window.
+    When the window slides, the cached token parts shift down one slot and pick
+    up the position parts of their new slots, exactly like re-embedding the
+    shifted window with TokenAndPositionEmbedding.
+    """
+
+    def __init__(self, model):
+        embedding = None
+        blocks = []
+        dense = None
+        for layer in model.layers:
+            if hasattr(layer, "token_emb") and hasattr(layer, "pos_emb"):
+                embedding = layer
+            elif hasattr(layer, "att") and hasattr(layer, "ffn"):
+                blocks.append(layer)
+            elif isinstance(layer, Dense):
+                dense = layer
+
+        if embedding is None or dense is None or len(blocks) != 1:
+            raise ValueError("Model must be TokenAndPositionEmbedding -> one TransformerBlock -> Dense")
+        block = blocks[0]
+
+        token_table = embedding.token_emb.get_weights()[0]
+        pos_table = embedding.pos_emb.get_weights()[0]
+        self.maxlen = pos_table.shape[0]
+
+        # MultiHeadAttention weights: query/key/value kernels are (embed, heads, key_dim)
+        wq, bq, wk, bk, wv, bv, wo, bo = block.att.get_weights()
+        self.scale = 1.0 / np.sqrt(wq.shape[-1])
+        self.wo, self.bo = wo, bo
+
+        # Sliding-window attention (attention.EfficientAttention "local")
+        # only looks at the newest `window` positions
+        self.window = getattr(block.att, "window", None) or self.maxlen
+
+        # Token parts of the projections, one row per vocabulary entry
+        self.token_embed = token_table
+        self.token_q = np.einsum("ve,ehd->vhd", token_table, wq)
+        self.token_k = np.einsum("ve,ehd->vhd", token_table, wk)
+        self.token_v = np.einsum("ve,ehd->vhd", token_table, wv)
+
+        # Position parts of the projections (biases folded in), one row per slot
+        self.pos_embed = pos_table
+        self.pos_q = np.einsum("le,ehd->lhd", pos_table, wq) + bq
+        self.pos_k = np.einsum("le,ehd->lhd", pos_table, wk) + bk
+        self.pos_v = np.einsum("le,ehd->lhd", pos_table, wv) + bv
+
+        self.ln1 = block.layernorm1.get_weights() + [block.layernorm1.epsilon]
+        self.ln2 = block.layernorm2.get_weights() + [block.layernorm2.epsilon]
+        ff1, ff2 = [l for l in block.ffn.layers if isinstance(l, Dense)]
+        self.ff1_kernel, self.ff1_bias = ff1.get_weights()
+        self.ff1_activation = _activation(ff1.activation)
+        self.ff2_kernel, self.ff2_bias = ff2.get_weights()
+
+        self.dense_kernel, self.dense_bias = dense.get_weights()
+        self.output_activation = _activation(dense.activation)
+
+        self.reset()
+
+    def reset(self, batch_size=1):
+        """Empty the key/value cache for `batch_size` sequences."""
+        heads, key_dim = self.token_k.shape[1:]
+        shape = (batch_size, self.maxlen, heads, key_dim)
+        self.k_cache = np.zeros(shape, dtype=self.token_k.dtype)
+        self.v_cache = np.zeros(shape, dtype=self.token_v.dtype)
+        self.length = 0
+
+    def step(self, tokens, rows=None):
+        """Append one token per sequence and return next-token probabilities.
+
+        `tokens` has shape (batch,); the result has shape (batch, vocab_size).
+        With `rows` (an index array) every sequence still advances, but only
+        those rows are scored and returned, shape (len(rows), vocab_size); the
+        key/value cache update itself is only table lookups.
+        """
+        tokens = np.asarray(tokens).reshape(-1)
+        if self.length == 0 and len(tokens) != len(self.k_cache):
+            self.reset(len(tokens))
+
+        # Slide the window once it is full: drop the oldest cached entry
+        if self.length == self.maxlen:
+            self.k_cache[:, :-1] = self.k_cache[:, 1:]
+            self.v_cache[:, :-1] = self.v_cache[:, 1:]
+            self.length -= 1
+
+        n = self.length
+        self.k_cache[:, n] = self.token_k[tokens]
+        self.v_cache[:, n] = self.token_v[tokens]
+        self.length = n = n + 1
+        if rows is None:
+            rows = slice(None)
+        tokens = tokens[rows]
+
+        # The newest token sits in the last slot of the current window
+        x = self.token_embed[tokens] + self.pos_embed[n - 1]
+        q = self.token_q[tokens] + self.pos_q[n - 1]
+
+        # Cached token parts + position parts of the slots they now occupy
+        lo = max(0, n - self.window)
+        k = self.k_cache[rows, lo:n] + self.pos_k[lo:n]
+        v = self.v_cache[rows, lo:n] + self.pos_v[lo:n]
+
+        # One attention row per head: (batch, heads, window)
+        scores = np.einsum("bhd,bnhd->bhn", q, k) * self.scale
+        weights = _softmax(scores)
+        attn = np.einsum("bhn,bnhd->bhd", weights, v)
+        attn = np.einsum("bhd,hde->be", attn, self.wo) + self.bo
+
+        out1 = _layer_norm(x + attn, *self.ln1)
+        ffn = self.ff1_activation(out1 @ self.ff1_kernel + self.ff1_bias)
+        ffn = ffn @ self.ff2_kernel + self.ff2_bias
+        out2 = _layer_norm(out1 + ffn, *self.ln2)
+
+        return self.output_activation(out2 @ self.dense_kernel + self.dense_bias)
+
+    def prime(self, sequences, rows=None):
+        """Reset the cache and feed whole seed sequences, shape (batch, length).
+
+        For a seed of the model's window size the returned probabilities equal
+        model.predict(sequences). Only the last seed token is scored; the
+        earlier ones just fill the cache. `rows` is as for step().
+        """
+        sequences = np.atleast_2d(np.asarray(sequences))
+        self.reset(len(sequences))
+        none = np.arange(0)
+        for t in range(sequences.shape[1] - 1):
+            self.step(sequences[:, t], rows=none)
+        return self.step(sequences[:, -1], rows=rows)
+
+
+def make_decoder(model, backend="numpy"):
+    """Return the incremental decoder matching a trained model's architecture.
+
+    backend="numpy" uses the NumPy decoders above; backend="compiled" uses the
+    tf.function / XLA graphs from inference.py.
+    """
+    if backend == "compiled":
+        return inference.compiled_decoder(model)
+    if backend != "numpy":
+        raise ValueError(f"Unknown generation backend: {backend}")
+    if any(hasattr(layer, "token_emb") for layer in model.layers):
+        return TransformerDecoder(model)
+    return RecurrentStepper(model)
+
+
+def sampling_probs(probs, temperature=1.0, top_k=None, top_p=None):
+    """The distribution sample() draws from: each row of `probs` (batch, vocab)
+    after temperature, top_k and top_p, renormalized.
+
+    temperature=0 gives a one-hot row at the most probable token.
+    """
+    probs = np.asarray(probs, dtype=np.float64)
+    if temperature == 0:
+        one_hot = np.zeros_like(probs)
+        np.put_along_axis(one_hot, np.argmax(probs, axis=-1)[:, None], 1.0, axis=-1)
+        return one_hot
+
+    # Rescale in log space; temperature < 1 sharpens, > 1 flattens
+    logits = np.log(np.maximum(probs, 1e-30)) / temperature
+    logits -= logits.max(axis=-1, keepdims=True)
+
+    if top_k is not None and top_k < logits.shape[-1]:
+        # Keep exactly the k largest logits in each row (ties at the k-th
+        # value are broken by argpartition, not all kept)
+        top = np.argpartition(logits, -top_k, axis=-1)[:, -top_k:]
+        keep = np.zeros(logits.shape, dtype=bool)
+        np.put_along_axis(keep, top, True, axis=-1)
+        logits = np.where(keep, logits, -np.inf)
+
+    probs = np.exp(logits)
+    probs /= probs.sum(axis=-1, keepdims=True)
+
+    if top_p is not None and top_p < 1.0:
+        # Sort descending and keep tokens until the cumulative mass reaches top_p
+        order = np.argsort(-probs, axis=-1)
+        sorted_probs = np.take_along_axis(probs, order, axis=-1)
+        # Mass of the tokens strictly before each one (an exclusive cumsum,
+        # built directly so rounding cannot keep an extra boundary token)
+        before = np.cumsum(sorted_probs, axis=-1)[:, :-1]
+        before = np.concatenate([np.zeros_like(sorted_probs[:, :1]), before], axis=-1)
+        # The first token is always kept, even when it alone exceeds top_p
+        keep_sorted = before < top_p
+        keep = np.zeros_like(keep_sorted)
+        np.put_along_axis(keep, order, keep_sorted, axis=-1)
+        probs = np.where(keep, probs, 0.0)
+        probs /= probs.sum(axis=-1, keepdims=True)
+    return probs
+
+
+def draw(probs, rng):
+    """Draw one token per row of a (batch, vocab) distribution, e.g. from sampling_probs."""
+    # Inverse-CDF sampling: one uniform draw per row
+    cdf = np.cumsum(probs, axis=-1)
+    draws = rng.random((len(cdf), 1)) * cdf[:, -1:]
+    tokens = (cdf < draws).sum(axis=-1)
+    return np.minimum(tokens, probs.shape[-1] - 1).astype(np.int32)
+
+
+def sample(probs, temperature=1.0, top_k=None, top_p=None, rng=None):
+    """Draw one token per row of `probs` (batch, vocab), fully vectorized.
+
+    temperature=0 picks the most probable token (the original greedy argmax).
+    top_k keeps only the k most probable tokens and top_p keeps the smallest
+    set whose cumulative probability reaches p; both can be combined.
+    """
+    if temperature == 0:
+        return np.argmax(probs, axis=-1).astype(np.int32)
+    rng = np.random.default_rng() if rng is None else rng
+    return draw(sampling_probs(probs, temperature, top_k, top_p), rng)
+
+
+def generate(model, seeds, n_tokens, temperature=1.0, top_k=None, top_p=None,
+             seed=None, decoder=None, backend="numpy", cache=None):
+    """Generate `n_tokens` indices for every encoded seed in one batch.
+
+    `seeds` is an integer array of shape (batch, length) (or a single 1-D seed)
+    and all rows advance together, one batched step per generated token.
+    Returns an int32 array of shape (batch, n_tokens) (or (n_tokens,) for a
+    single seed). `seed` seeds the sampling RNG; pass a prebuilt `decoder` to
+    skip re-extracting the model weights, or choose one with `backend`. A
+    prediction_cache.PredictionCache `cache` memoizes the next-token
+    distributions of repeated contexts (the output is unchanged).
+    """
+    decoder = make_decoder(model, backend) if decoder is None else decoder
+    if cache is not None and not isinstance(decoder, prediction_cache.CachedDecoder):
+        decoder = prediction_cache.CachedDecoder(decoder, cache)
+    rng = np.random.default_rng(seed)
+
+    seeds = np.asarray(seeds)
+    with instrumentation.timer("generate/prime"):
+        probs = decoder.prime(np.atleast_2d(seeds))
+    out = np.zeros((len(probs), n_tokens), dtype=np.int32)
+    for i in range(n_tokens):
+        out[:, i] = sample(probs, temperature, top_k, top_p, rng)
+        if i + 1 < n_tokens:
+            with instrumentation.timer("generate/step"):
+                probs = decoder.step(out[:, i])
+    instrumentation.count("generate/tokens", out.size)
+    return out if seeds.ndim > 1 else out[0]
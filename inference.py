@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""Compiled inference functions that bypass Keras model.predict.
+
+model.predict builds a data adapter and runs the callback machinery on every
+call, which dwarfs the compute of these small character models when it is
+called once per generated character. The functions here are traced once as
+tf.function graphs with a fixed input signature (optionally XLA-compiled with
+jit_compile) and are called directly on tensors.
+"""
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.layers import GRU, Activation, Dense, Embedding, SimpleRNN
+
+
+def export_window_fn(model, jit_compile=True):
+    """Compile a full forward pass over a (batch, SEQLEN) window of indices.
+
+    Works for all three architectures; the batch dimension stays dynamic so a
+    single trace serves every batch size. Always returns the next-character
+    probabilities after the last position, also for full-sequence models.
+    """
+    seq_len = model.input_shape[-1]
+    full_sequence = len(model.output_shape) == 3
+
+    @tf.function(input_signature=[tf.TensorSpec([None, seq_len], tf.int32)],
+                 jit_compile=jit_compile)
+    def window_fn(x):
+        probs = model(x, training=False)
+        return probs[:, -1] if full_sequence else probs
+
+    return window_fn
+
+
+def export_step_fn(model, jit_compile=True):
+    """Compile one recurrent step of a SimpleRNN / GRU model.
+
+    The returned function maps (tokens (batch,), state (batch, units)) to
+    (probs (batch, vocab), new_state) using the model's own layers and cell.
+    """
+    embedding = rnn = None
+    head = []
+    for layer in model.layers:
+        if isinstance(layer, Embedding):
+            embedding = layer
+        elif isinstance(layer, (SimpleRNN, GRU)):
+            rnn = layer
+        elif isinstance(layer, (Dense, Activation)):
+            head.append(layer)
+
+    if embedding is None or rnn is None or not head:
+        raise ValueError("Model must contain Embedding, SimpleRNN/GRU and Dense layers")
+
+    @tf.function(input_signature=[tf.TensorSpec([None], tf.int32),
+                                  tf.TensorSpec([None, rnn.units], tf.float32)],
+                 jit_compile=jit_compile)
+    def step_fn(tokens, state):
+        x = embedding(tokens)
+        h, _ = rnn.cell(x, [state], training=False)
+        probs = h
+        for layer in head:
+            probs = layer(probs)
+        # Keep the carried state in float32 under mixed-precision policies
+        return tf.cast(probs, tf.float32), tf.cast(h, tf.float32)
+
+    step_fn.units = rnn.units
+    return step_fn
+
+
+class CompiledRecurrentDecoder:
+    """prime/step decoder for SimpleRNN / GRU models backed by export_step_fn."""
+
+    def __init__(self, model, jit_compile=True):
+        self.step_fn = export_step_fn(model, jit_compile)
+        self.units = self.step_fn.units
+        self.state = None
+
+    def reset(self, batch_size=1):
+        self.state = tf.zeros((batch_size, self.units), dtype=tf.float32)
+
+    def step(self, tokens):
+        tokens = np.asarray(tokens, dtype=np.int32).reshape(-1)
+        if self.state is None or self.state.shape[0] != len(tokens):
+            self.reset(len(tokens))
+        probs, self.state = self.step_fn(tokens, self.state)
+        return probs.numpy()
+
+    def prime(self, sequences):
+        sequences = np.atleast_2d(np.asarray(sequences, dtype=np.int32))
+        self.reset(len(sequences))
+        probs = None
+        for t in range(sequences.shape[1]):
+            probs = self.step(sequences[:, t])
+        return probs
+
+
+class WindowDecoder:
+    """prime/step decoder that re-scores a sliding SEQLEN window with `predict_fn`.
+
+    `predict_fn` maps a (batch, seq_len) int32 window array to (batch,
+    vocab_size) next-character probabilities. prime / step take an optional
+    `rows` argument that scores only those rows (see
+    prediction_cache.CachedDecoder); the subset is padded to a power-of-two
+    batch, since both XLA and the TFLite interpreter re-plan for every new
+    batch size and arbitrary subset sizes would keep recompiling.
+    """
+
+    def __init__(self, predict_fn, seq_len, vocab_size):
+        self.predict_fn = predict_fn
+        self.seq_len = seq_len
+        self.vocab_size = vocab_size
+        self.window = None
+
+    def prime(self, sequences, rows=None):
+        sequences = np.atleast_2d(np.asarray(sequences, dtype=np.int32))
+        if sequences.shape[1] < self.seq_len:
+            raise ValueError(f"Seeds must be at least {self.seq_len} tokens long")
+        # A copy: step() slides the window in place, which must not touch the caller's seeds
+        self.window = np.array(sequences[:, -self.seq_len:])
+        return self._predict(rows)
+
+    def step(self, tokens, rows=None):
+        # Slide the window: drop the oldest index and append the new one
+        self.window[:, :-1] = self.window[:, 1:]
+        self.window[:, -1] = np.asarray(tokens).reshape(-1)
+        return self._predict(rows)
+
+    def _predict(self, rows):
+        # Score every window, or only `rows` of them (the rest are known already)
+        if rows is None:
+            return self.predict_fn(self.window)
+        n = len(rows)
+        if not n:
+            return np.zeros((0, self.vocab_size), dtype=np.float32)
+        padded = np.resize(rows, 1 << (n - 1).bit_length())
+        return self.predict_fn(self.window[padded])[:n]
+
+
+class CompiledWindowDecoder(WindowDecoder):
+    """WindowDecoder backed by a compiled window_fn.
+
+    Keeps the original sliding-SEQLEN semantics for any model, but each call
+    is one direct graph execution instead of model.predict.
+    """
+
+    def __init__(self, model, jit_compile=True):
+        self.window_fn = export_window_fn(model, jit_compile)
+        super().__init__(lambda window: self.window_fn(window).numpy(),
+                         model.input_shape[-1], model.output_shape[-1])
+
+
+def compiled_decoder(model, jit_compile=True):
+    """Return the compiled decoder matching a model's architecture."""
+    if any(isinstance(layer, (SimpleRNN, GRU)) for layer in model.layers):
+        return CompiledRecurrentDecoder(model, jit_compile)
+    return CompiledWindowDecoder(model, jit_compile)
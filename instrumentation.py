@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""Lightweight named timers, counters and gauges for every pipeline stage.
+
+The stages of the pipeline report into one process-wide registry, `default`:
+
+  - corpus/load, corpus/encode    reading, cleaning and caching the corpus
+  - tokenizer/bpe_train           learning BPE merges
+  - dataset/gather                building training windows (tf.data workers)
+  - <name>/fit, <name>/generate   the training loop (trainer.training_loop)
+  - generate/prime, generate/step incremental decoding, per token
+  - eval/windows, eval/stream     held-out scoring
+  - <prefix>/step, <prefix>/epoch Keras train steps (callbacks.InstrumentationCallback)
+
+Timers keep count, total, min and max plus a bounded window of recent
+samples for percentiles; all updates take a lock, so tf.data worker threads
+can report too. summary() returns plain dicts and save() writes them as JSON
+or CSV (picked by file extension), so runs can be diffed for regressions.
+profile() wraps a TensorFlow profiler trace for code outside model.fit
+(see callbacks.ProfilerTraceCallback for a window of train steps).
+"""
+
+import collections
+import contextlib
+import csv
+import functools
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+# Recent samples kept per timer for percentiles
+MAX_SAMPLES = 10000
+
+CSV_FIELDS = ["run", "kind", "name", "count", "total_s", "mean_ms", "p50_ms", "p99_ms", "min_ms",
+              "max_ms", "value"]
+
+
+class Instrumentation:
+    """Registry of named timers, counters and gauges."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.timers = {}
+            self.counters = collections.Counter()
+            self.gauges = {}
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        """Time the body of a `with` block under `name`."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self.timers.get(name)
+            if stats is None:
+                stats = self.timers[name] = {"count": 0, "total": 0.0, "min": seconds, "max": seconds,
+                                             "samples": collections.deque(maxlen=MAX_SAMPLES)}
+            stats["count"] += 1
+            stats["total"] += seconds
+            stats["min"] = min(stats["min"], seconds)
+            stats["max"] = max(stats["max"], seconds)
+            stats["samples"].append(seconds)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] += n
+
+    def gauge(self, name, value):
+        """Record the latest value of a measurement such as samples/sec."""
+        if self.enabled:
+            with self._lock:
+                self.gauges[name] = float(value)
+
+    def summary(self):
+        """Plain-dict snapshot: {"timers": {...}, "counters": {...}, "gauges": {...}}."""
+        with self._lock:
+            timers = {}
+            for name, stats in sorted(self.timers.items()):
+                samples = np.asarray(stats["samples"]) * 1000
+                timers[name] = {
+                    "count": stats["count"],
+                    "total_s": stats["total"],
+                    "mean_ms": 1000 * stats["total"] / stats["count"],
+                    "p50_ms": float(np.percentile(samples, 50)),
+                    "p99_ms": float(np.percentile(samples, 99)),
+                    "min_ms": 1000 * stats["min"],
+                    "max_ms": 1000 * stats["max"],
+                }
+            return {"timers": timers, "counters": dict(sorted(self.counters.items())),
+                    "gauges": dict(sorted(self.gauges.items()))}
+
+    def report(self):
+        """Human-readable table of the current summary."""
+        summary = self.summary()
+        lines = [f"{'timer':36s} {'count':>8s} {'total s':>9s} {'mean ms':>9s} {'p50 ms':>9s} {'p99 ms':>9s}"]
+        for name, t in summary["timers"].items():
+            lines.append(f"{name:36s} {t['count']:8d} {t['total_s']:9.3f} {t['mean_ms']:9.3f} "
+                         f"{t['p50_ms']:9.3f} {t['p99_ms']:9.3f}")
+        for kind in ("counters", "gauges"):
+            for name, value in summary[kind].items():
+                lines.append(f"{name:36s} {value:,.6g}")
+        return "\n".join(lines)
+
+    def save(self, path, run="", **metadata):
+        """Write the summary to a .json or .csv file (see save)."""
+        save(path, {run: self.summary()}, **metadata)
+
+
+def summary_rows(run, summary):
+    """Flatten one summary into CSV rows."""
+    rows = [{"run": run, "kind": "timer", "name": name, **stats} for name, stats in summary["timers"].items()]
+    for kind in ("counters", "gauges"):
+        rows += [{"run": run, "kind": kind[:-1], "name": name, "value": value}
+                 for name, value in summary[kind].items()]
+    return rows
+
+
+def save(path, summaries, **metadata):
+    """Write {run name: summary} to `path` as JSON or, for a .csv path, one row per metric.
+
+    JSON output also records `metadata` (config, versions, ...) and the time.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if path.endswith(".csv"):
+        with open(path, "w", newline="") as fout:
+            writer = csv.DictWriter(fout, CSV_FIELDS)
+            writer.writeheader()
+            for run, summary in summaries.items():
+                writer.writerows(summary_rows(run, summary))
+    else:
+        with open(path, "w") as fout:
+            json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "metadata": metadata,
+                       "runs": summaries}, fout, indent=2)
+
+
+def timed(name):
+    """Decorator timing every call of a function under `name` in the default registry."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with default.timer(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+@contextlib.contextmanager
+def profile(logdir):
+    """Capture a TensorFlow profiler trace of the `with` block into `logdir` (for TensorBoard)."""
+    import tensorflow as tf
+
+    tf.profiler.experimental.start(logdir)
+    try:
+        yield
+    finally:
+        tf.profiler.experimental.stop()
+
+
+# Process-wide registry the pipeline stages report into
+default = Instrumentation()
+timer = default.timer
+count = default.count
+gauge = default.gauge
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""Model builders for the three character-level language models.
+
+Every builder takes (seq_len, vocab_size, **hyperparameters) and returns a
+compiled Keras model, so training code can pick an architecture by name.
+
+With full_sequence=True the models are many-to-many: the recurrent layers
+return every timestep and the Transformer uses a causal attention mask, so a
+window of SEQLEN characters yields SEQLEN next-character predictions instead
+of one. Train them on (batch, SEQLEN) labels from
+dataset.make_dataset(..., full_sequence=True), ideally with step=SEQLEN.
+
+The recurrent builders also take stateful=True (with a fixed batch_size) for
+truncated backpropagation through time: the hidden state is carried across
+batches of dataset.make_stream_dataset, SEQLEN only sets the truncation
+length, and the layers run as a loop instead of being unrolled, so long
+truncation lengths do not grow the graph.
+"""
+
+import json
+import os
+
+import numpy as np
+from tensorflow.keras.layers import GRU, Activation, Dense, Embedding, Input, SimpleRNN
+from tensorflow.keras.models import Sequential
+
+import tokenizer as tokenizers
+from transformer import build_transformer_model
+
+
+def _build_recurrent_model(layer_cls, seq_len, vocab_size, hidden_size=128, embed_dim=64,
+                           jit_compile="auto", full_sequence=False, stateful=False, batch_size=None):
+    if stateful and batch_size is None:
+        raise ValueError("stateful models need a fixed batch_size")
+    model = Sequential()
+
+    # Fixed-length integer input: SEQLEN character indices per sample.
+    # Stateful models keep one hidden state per batch row, so the batch size is fixed too
+    model.add(Input(batch_shape=(batch_size, seq_len)) if stateful else Input(shape=(seq_len,)))
+
+    # Embedding layer: maps character indices to dense vectors
+    model.add(Embedding(input_dim=vocab_size, output_dim=embed_dim))
+
+    # Recurrent layer; only the final output is needed for next-character
+    # prediction, or every timestep's output in full-sequence mode.
+    # Unroll the loop for speed which is useful for small sequences.
+    # Stateful layers always predict every position, carry their state across
+    # batches and keep the loop rolled so long truncation lengths stay cheap
+    model.add(layer_cls(hidden_size, return_sequences=full_sequence or stateful,
+                        unroll=not stateful, stateful=stateful))
+
+    # Fully connected output layer followed by softmax over characters
+    # (applied at every timestep in full-sequence mode).
+    # The softmax stays in float32 even under a mixed-precision policy
+    model.add(Dense(vocab_size))
+    model.add(Activation("softmax", dtype="float32"))
+
+    # Sparse categorical crossentropy because the labels are integer-encoded;
+    # jit_compile=True forces XLA compilation of the train step
+    model.compile(loss="sparse_categorical_crossentropy", optimizer="rmsprop", jit_compile=jit_compile)
+    return model
+
+
+def build_simple_rnn_model(seq_len, vocab_size, hidden_size=128, embed_dim=64, jit_compile="auto",
+                           full_sequence=False, stateful=False, batch_size=None):
+    """Embedding -> SimpleRNN -> Dense -> softmax."""
+    return _build_recurrent_model(SimpleRNN, seq_len, vocab_size, hidden_size, embed_dim,
+                                  jit_compile, full_sequence, stateful, batch_size)
+
+
+def build_gru_model(seq_len, vocab_size, hidden_size=128, embed_dim=64, jit_compile="auto",
+                    full_sequence=False, stateful=False, batch_size=None):
+    """Embedding -> GRU -> Dense -> softmax."""
+    return _build_recurrent_model(GRU, seq_len, vocab_size, hidden_size, embed_dim,
+                                  jit_compile, full_sequence, stateful, batch_size)
+
+
+# Architectures selectable by name in training configs
+MODEL_BUILDERS = {
+    "simple_rnn": build_simple_rnn_model,
+    "gru": build_gru_model,
+    "transformer": build_transformer_model,
+}
+
+
+def build_model(name, seq_len, vocab_size, **kwargs):
+    """Build a compiled model by architecture name (see MODEL_BUILDERS)."""
+    if name not in MODEL_BUILDERS:
+        raise ValueError(f"Unknown model {name!r}, expected one of {sorted(MODEL_BUILDERS)}")
+    return MODEL_BUILDERS[name](seq_len, vocab_size, **kwargs)
+
+
+def save_trained_model(directory, model, name, tokenizer, **kwargs):
+    """Save a trained model with its tokenizer so it can be reloaded elsewhere.
+
+    Writes model.json (builder name, sequence length and hyperparameters),
+    weights.npz and tokenizer.json to `directory`. `name` and `kwargs` are
+    what the model was built with through build_model.
+    """
+    os.makedirs(directory, exist_ok=True)
+    spec = {"model": name, "seq_len": model.input_shape[-1], "model_kwargs": kwargs}
+    with open(os.path.join(directory, "model.json"), "w") as fout:
+        json.dump(spec, fout, indent=2)
+    np.savez(os.path.join(directory, "weights.npz"),
+             **{f"w_{i}": w for i, w in enumerate(model.get_weights())})
+    tokenizer.save(os.path.join(directory, "tokenizer.json"))
+
+
+def load_trained_model(directory):
+    """Rebuild a model saved by save_trained_model; returns (model, tokenizer).
+
+    Stateful models come back as ordinary full-sequence models with the same
+    weights, since a fixed training batch size makes no sense for inference.
+    """
+    with open(os.path.join(directory, "model.json")) as fin:
+        spec = json.load(fin)
+    tokenizer = tokenizers.load_tokenizer(os.path.join(directory, "tokenizer.json"))
+
+    kwargs = dict(spec["model_kwargs"])
+    if kwargs.pop("stateful", False):
+        kwargs.pop("batch_size", None)
+        kwargs["full_sequence"] = True
+    model = build_model(spec["model"], spec["seq_len"], len(tokenizer), **kwargs)
+    with np.load(os.path.join(directory, "weights.npz")) as weights:
+        model.set_weights([weights[f"w_{i}"] for i in range(len(weights.files))])
+    return model, tokenizer
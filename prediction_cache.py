@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""Memoized next-token distributions for repeated generation contexts.
+
+Greedy decoding over a short window keeps revisiting the same contexts (the
+looping output noted in the README), and production prompts share prefixes.
+PredictionCache is a bounded, thread-safe LRU map from a context key to the
+model's prediction for it; CachedDecoder wraps any prime/step decoder from
+generation.make_decoder and only runs the model for the rows of a batch
+whose key is not cached. The key depends on what the decoder's prediction
+depends on:
+
+  - window decoders (TransformerDecoder, inference.CompiledWindowDecoder)
+    see at most the last SEQLEN tokens, so the key is those tokens and the
+    cached value the next-token probabilities
+  - recurrent decoders (RecurrentStepper, inference.CompiledRecurrentDecoder)
+    see their whole history through the hidden state, so the key is a hash
+    of (state, input token) and the value the probabilities plus the next
+    state; hits come from shared prompt prefixes rather than loops
+
+Keys are 128-bit BLAKE2 digests. A cached prediction is the one the model
+computed for that context (up to float rounding between batch sizes), so
+cached and uncached generation agree. One cache must only ever be shared by
+decoders of the same model; clear() it when the weights change.
+
+A lookup costs a hash and a dict access per row, about as much as one step
+of the small NumPy recurrent models, so the cache pays off for the window
+decoders (above all the XLA-compiled ones) and for long shared prompts, not
+for short sampled continuations of the SimpleRNN / GRU
+(benchmarks/bench_prediction_cache.py).
+"""
+
+import collections
+import copy
+import hashlib
+import threading
+
+import numpy as np
+
+
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def _nbytes(value):
+    if isinstance(value, tuple):
+        return sum(v.nbytes for v in value)
+    return value.nbytes
+
+
+class PredictionCache:
+    """Bounded LRU cache of next-token predictions with hit-rate and memory statistics.
+
+    At most `max_entries` entries are kept and, with `max_bytes`, at most that
+    many bytes of keys and arrays (Python object overhead not counted); the
+    least recently used entries are evicted first.
+    """
+
+    def __init__(self, max_entries=65536, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """Drop every entry and reset the statistics."""
+        with self._lock:
+            self._entries = collections.OrderedDict()
+            self.bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_many(self, keys):
+        """Look up a batch of keys; returns one value (or None for a miss) per key."""
+        values = []
+        with self._lock:
+            for key in keys:
+                value = self._entries.get(key)
+                if value is None:
+                    self.misses += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                values.append(value)
+        return values
+
+    def put_many(self, items):
+        """Store (key, value) pairs; a value is an array or a tuple of arrays."""
+        with self._lock:
+            for key, value in items:
+                old = self._entries.pop(key, None)
+                if old is not None:
+                    self.bytes -= len(key) + _nbytes(old)
+                self._entries[key] = value
+                self.bytes += len(key) + _nbytes(value)
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or (self.max_bytes is not None and self.bytes > self.max_bytes)):
+                key, old = self._entries.popitem(last=False)
+                self.bytes -= len(key) + _nbytes(old)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self._entries), "max_entries": self.max_entries, "bytes": self.bytes,
+                    "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / lookups if lookups else 0.0, "evictions": self.evictions}
+
+
+class CachedDecoder:
+    """prime/step decoder that answers cached contexts without running the model.
+
+    Wraps `decoder` (see the module docstring for the supported kinds) and
+    returns exactly what it would. Window decoders must accept a `rows`
+    argument to prime/step that scores only those rows.
+    """
+
+    def __init__(self, decoder, cache):
+        self.decoder = decoder
+        self.cache = cache
+        self.recurrent = hasattr(decoder, "state")
+        # Window decoders: the last seq_len tokens of every row
+        self.seq_len = getattr(decoder, "maxlen", None) or getattr(decoder, "seq_len", None)
+        self.context = None
+
+    def __copy__(self):
+        # Copies (e.g. one per server batch) get their own decoder state but share the cache
+        clone = CachedDecoder(copy.copy(self.decoder), self.cache)
+        clone.context = self.context
+        return clone
+
+    def prime(self, sequences):
+        sequences = np.atleast_2d(np.asarray(sequences, dtype=np.int32))
+        if self.recurrent:
+            # Each seed token is one cached transition, so shared prompt prefixes are skipped
+            self.decoder.reset(len(sequences))
+            probs = None
+            for t in range(sequences.shape[1]):
+                probs = self.step(sequences[:, t])
+            return probs
+
+        self.context = np.array(sequences[:, -self.seq_len:])
+        return self._window_lookup(lambda rows: self.decoder.prime(sequences, rows=rows))
+
+    def step(self, tokens):
+        tokens = np.asarray(tokens, dtype=np.int32).reshape(-1)
+        if self.recurrent:
+            return self._recurrent_step(tokens)
+
+        if self.context is None or len(self.context) != len(tokens):
+            self.context = np.zeros((len(tokens), 0), dtype=np.int32)
+        self.context = np.concatenate([self.context, tokens[:, None]], axis=1)[:, -self.seq_len:]
+        return self._window_lookup(lambda rows: self.decoder.step(tokens, rows=rows))
+
+    def _window_lookup(self, predict):
+        # The decoder always advances (its window / KV cache must stay in step),
+        # but only the rows that miss are scored
+        keys = [_digest(row.tobytes()) for row in self.context]
+        values = self.cache.get_many(keys)
+        miss = np.array([i for i, value in enumerate(values) if value is None], dtype=np.intp)
+        computed = predict(miss)
+        for i, probs in zip(miss, computed):
+            values[i] = probs.copy()
+        self.cache.put_many((keys[i], values[i]) for i in miss)
+        return np.stack(values)
+
+    def _recurrent_step(self, tokens):
+        state = self.decoder.state
+        if state is None or len(state) != len(tokens):
+            self.decoder.reset(len(tokens))
+            state = self.decoder.state
+        state = np.asarray(state)
+
+        keys = [_digest(h.tobytes() + t.tobytes()) for h, t in zip(state, tokens)]
+        values = self.cache.get_many(keys)
+        miss = np.array([i for i, value in enumerate(values) if value is None], dtype=np.intp)
+        if len(miss):
+            # Step only the rows that missed, from their own states
+            self.decoder.state = state[miss]
+            probs = self.decoder.step(tokens[miss])
+            new_state = np.asarray(self.decoder.state)
+            for j, i in enumerate(miss):
+                values[i] = (probs[j].copy(), new_state[j].astype(state.dtype))
+            self.cache.put_many((keys[i], values[i]) for i in miss)
+
+        self.decoder.state = np.stack([value[1] for value in values])
+        return np.stack([value[0] for value in values])
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""Post-training quantized export of the trained models to TensorFlow Lite.
+
+Every model is exported once as a SavedModel and converted to a TFLite
+flatbuffer in one of four modes:
+  - "float32":      plain conversion, the size / accuracy reference
+  - "float16":      weights stored as float16
+  - "dynamic_int8": weights stored as int8, activations stay float
+  - "int8":         int8 weights and activations, calibrated on a
+                    representative sample of the training windows
+The resulting files can be evaluated and used for generation on CPU-only hosts
+through TFLiteModel / TFLiteDecoder.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+import tensorflow as tf
+
+import inference
+
+try:
+    # LiteRT is the maintained home of the TFLite interpreter
+    from ai_edge_litert.interpreter import Interpreter
+except ImportError:
+    Interpreter = tf.lite.Interpreter
+
+QUANT_MODES = ("float32", "float16", "dynamic_int8", "int8")
+
+
+def representative_windows(X, num_samples=200, seed=0):
+    """Sample calibration windows from the (n, SEQLEN) training window array."""
+    rng = np.random.default_rng(seed)
+    idx = rng.choice(len(X), size=min(num_samples, len(X)), replace=False)
+    return np.asarray(X[np.sort(idx)])
+
+
+def export_tflite(model, mode="int8", representative=None, path=None):
+    """Convert a Keras model to a TFLite flatbuffer and return its bytes.
+
+    `representative` is an array of input windows, required for mode="int8".
+    When `path` is given the flatbuffer is also written there.
+    """
+    if mode not in QUANT_MODES:
+        raise ValueError(f"Unknown quantization mode {mode!r}, expected one of {QUANT_MODES}")
+    if mode == "int8" and representative is None:
+        raise ValueError("int8 quantization needs representative input windows")
+
+    with tempfile.TemporaryDirectory() as saved_model_dir:
+        # Going through a SavedModel freezes the variables into constants
+        model.export(saved_model_dir, verbose=False)
+        converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_dir)
+
+        if mode != "float32":
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if mode == "float16":
+            converter.target_spec.supported_types = [tf.float16]
+        if mode == "int8":
+            input_dtype = model.inputs[0].dtype
+
+            # Calibration: one window at a time, cast to the model's input dtype
+            def representative_dataset():
+                for window in representative:
+                    yield [np.asarray(window, dtype=input_dtype)[None, :]]
+
+            converter.representative_dataset = representative_dataset
+
+        flatbuffer = converter.convert()
+
+    if path is not None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "wb") as fout:
+            fout.write(flatbuffer)
+    return flatbuffer
+
+
+class TFLiteModel:
+    """Batched next-character prediction with a TFLite flatbuffer."""
+
+    def __init__(self, flatbuffer, num_threads=None):
+        if isinstance(flatbuffer, str):
+            with open(flatbuffer, "rb") as fin:
+                flatbuffer = fin.read()
+        self.size_bytes = len(flatbuffer)
+        self.interpreter = Interpreter(model_content=flatbuffer, num_threads=num_threads)
+        self.input = self.interpreter.get_input_details()[0]
+        self.output_index = self.interpreter.get_output_details()[0]["index"]
+        self.seq_len = int(self.input["shape_signature"][-1])
+        self.vocab_size = int(self.interpreter.get_output_details()[0]["shape_signature"][-1])
+        self.batch_size = None
+
+    def predict(self, x):
+        """Return next-character probabilities for a (batch, SEQLEN) window array."""
+        x = np.asarray(x, dtype=self.input["dtype"])
+        if x.shape[0] != self.batch_size:
+            # Re-plan the interpreter's buffers only when the batch size changes
+            self.interpreter.resize_tensor_input(self.input["index"], list(x.shape))
+            self.interpreter.allocate_tensors()
+            self.batch_size = x.shape[0]
+        self.interpreter.set_tensor(self.input["index"], x)
+        self.interpreter.invoke()
+        probs = self.interpreter.get_tensor(self.output_index)
+        # Full-sequence models predict every position; keep the last one
+        return probs[:, -1] if probs.ndim == 3 else probs
+
+
+class TFLiteDecoder(inference.WindowDecoder):
+    """prime/step decoder for generation.generate backed by a TFLiteModel."""
+
+    def __init__(self, tflite_model):
+        self.model = tflite_model
+        super().__init__(tflite_model.predict, tflite_model.seq_len, tflite_model.vocab_size)
+
+
+def evaluate(predict_fn, X, y, batch_size=1024):
+    """Mean per-character cross-entropy (nats) and accuracy of predict_fn on (X, y)."""
+    total_loss = 0.0
+    correct = 0
+    for start in range(0, len(X), batch_size):
+        probs = np.asarray(predict_fn(np.asarray(X[start:start + batch_size])), dtype=np.float64)
+        labels = np.asarray(y[start:start + batch_size])
+        picked = probs[np.arange(len(labels)), labels]
+        total_loss -= np.log(np.maximum(picked, 1e-12)).sum()
+        correct += int((probs.argmax(axis=-1) == labels).sum())
+    return {"loss": total_loss / len(X), "accuracy": correct / len(X)}
@@ -26,48 +26,32 @@ import tensorflow as tf
 print("TensorFlow version:", tf.__version__)
 print("GPU available:", tf.config.list_physical_devices('GPU'))
 
-# Import compatibility feature for consistent print
-from __future__ import print_function
-
-# Import layers and model building tools from TensorFlow
-from tensorflow.keras.layers import Dense, Activation, SimpleRNN, Embedding  # Layers for the model
-from tensorflow.keras.models import Sequential  # Used to build a sequential stack of layers (our RNN model)
-
 # Commented out IPython magic to ensure Python compatibility.
 # %ls
 
-# Open the Alice in Wonderland text file in binary mode ('rb') from the Kaggle input directory
-fin = open("sample_data/alice.txt", 'rb')
-
-lines = []
-for line in fin:
-    # Remove leading/trailing whitespace and convert to lowercase
-    line = line.strip().lower()
-
-    # Decode binary to ASCII, ignoring characters that can't be decoded
-    line = line.decode("ascii", "ignore")
-
-    # Skip empty lines
-    if len(line) == 0:
-        continue
-
-    # Add the cleaned line to our list
-    lines.append(line)
-
-# Close the file after reading
-fin.close()
-
-# Combine all lines into a single text string
-text = " ".join(lines)
-
-# Step 1: Extract the unique set of characters in the text
-chars = set(text)  # All unique characters that appear in the dataset
-
-# Step 2: Count the total number of unique characters (vocabulary size)
+# Vectorized corpus encoder (see corpus.py): reads, cleans and integer-encodes
+# the text in one pass instead of building Python strings per window
+import corpus
+
+# Read the Alice in Wonderland text, clean it exactly like the original
+# line-by-line loop (strip, lowercase, ASCII only, skip empty lines) and encode
+# every character to its vocabulary index with a NumPy lookup table.
+# The encoded corpus is cached on disk under its content hash, so later runs
+# just memory-map it instead of re-reading and re-encoding the text.
+# The tokenizer (see tokenizer.py) is pluggable: "char" keeps one token per
+# character with a sorted, saveable vocabulary; "bpe" learns BPE_VOCAB_SIZE
+# subword tokens on the corpus, so every model step covers several characters
+import tokenizer
+TOKENIZER = "char"
+BPE_VOCAB_SIZE = 512
+encoded, tok = tokenizer.load_tokenized_corpus("sample_data/alice.txt", TOKENIZER, BPE_VOCAB_SIZE)
+chars = tok.vocab
+
+# Count the total number of unique tokens (vocabulary size)
 nb_chars = len(chars)
-print(f"Total unique characters (vocab size): {nb_chars}")
+print(f"Total unique tokens (vocab size): {nb_chars}")
 
-# Step 3: Create lookup dictionaries similar to tokenizing the data per character
+# Lookup dictionaries similar to tokenizing the data per character
 # char2index: maps each character to a unique index
 # index2char: maps each index back to its character
 char2index = {c: i for i, c in enumerate(chars)}
@@ -79,35 +63,18 @@ SEQLEN = 10
 # Step size — how much to shift the window to get the next training example
 STEP = 1
 
-# Lists to hold input sequences and their corresponding next characters
-input_chars = []
-label_chars = []
-
-# Slide a window of length SEQLEN across the text
-for i in range(0, len(text) - SEQLEN, STEP):
-    # Input: sequence of SEQLEN characters
-    input_chars.append(text[i:i + SEQLEN])
-
-    # Label: the character immediately following the sequence
-    label_chars.append(text[i + SEQLEN])
-
-# Initialize input array X:
-# - Shape: (number of sequences, sequence length)
-# - Each element will hold an integer index corresponding to a character
-X = np.zeros((len(input_chars), SEQLEN), dtype=np.int32)
-
-# Initialize output array y:
-# - Shape: (number of sequences,)
-# - Each element is the index of the next character to be predicted
-y = np.zeros(len(input_chars), dtype=np.int32)
+# Held-out evaluation (see evaluation.py): cut the encoded text into three
+# contiguous blocks - training (first 90%), validation (next 5%) and test
+# (last 5%) - so no validation or test window overlaps the training text
+import evaluation
+VAL_FRACTION = 0.05
+TEST_FRACTION = 0.05
+splits = evaluation.split_corpus(encoded, VAL_FRACTION, TEST_FRACTION)
 
-# Convert each character in the input sequences to its corresponding index
-for i, input_seq in enumerate(input_chars):
-    for j, ch in enumerate(input_seq):
-        X[i, j] = char2index[ch]  # Fill in character index at position j
-
-    # Set the target label as the index of the next character after the sequence
-    y[i] = char2index[label_chars[i]]
+# Slide a window of length SEQLEN across the training block:
+# - X has shape (number of sequences, SEQLEN) and is a strided view, not a copy
+# - y holds the index of the character immediately following each window
+X, y = corpus.make_windows(splits["train"], SEQLEN, STEP)
 
 
 
@@ -116,80 +83,115 @@ HIDDEN_SIZE = 128                # Number of units in the RNN hidden layer
 BATCH_SIZE = 128                 # Number of samples per training batch
 NUM_ITERATIONS = 25              # Total training iterations (outer loop)
 NUM_EPOCHS_PER_ITERATION = 1     # Number of epochs per iteration
-NUM_PREDS_PER_EPOCH = 100        # Number of characters to generate after each iteration
-
-# Define a simple RNN model
-model = Sequential()
-
-# Embedding layer: maps input character indices to dense vectors
-# input_dim = vocabulary size (number of unique characters)
-# output_dim = embedding dimension (can be tuned)
-# input_length = number of characters in each input sequence
-model.add(Embedding(input_dim=nb_chars, output_dim=64, input_length=SEQLEN))
-
-# Add the SimpleRNN layer
-model.add(SimpleRNN(
-    HIDDEN_SIZE,
-    return_sequences=False,          # We only want the final output for prediction
-    input_shape=(SEQLEN, nb_chars),  # Input shape: (sequence length, vocab size)
-    unroll=True                      # Unroll the loop for speed which is useful for small sequences
-))
-
-# Fully connected output layer that predicts the next character
-model.add(Dense(nb_chars))
-
-# Softmax activation to output probability distribution over characters
-model.add(Activation("softmax"))
-
-# Compile the model with sparse categorical crossentropy loss and RMSprop optimizer
-model.compile(
-    loss="sparse_categorical_crossentropy",
-    optimizer="rmsprop"
-)
-
-# Initialize an empty list to store training loss values after each epoch
-losses = []
-
-# Training and generation loop
-for iteration in range(NUM_ITERATIONS):
-    print("=" * 50)
-    print(f"Iteration #: {iteration}")
-
-    # Train and save loss in history
-    history = model.fit(X, y, batch_size=BATCH_SIZE, epochs=NUM_EPOCHS_PER_ITERATION)
-
-    # Append the training loss for this epoch to loss history list
-    losses.extend(history.history["loss"])
-
-    # Select a random seed sequence from training data
-    test_idx = np.random.randint(len(input_chars))
-    test_chars = input_chars[test_idx]
-
-    print(f"\nGenerating from seed: \"{test_chars}\"")
-    print(test_chars, end="")
-
-    # Generate NUM_PREDS_PER_EPOCH characters from the seed
-    for i in range(NUM_PREDS_PER_EPOCH):
-        # Create a new test input array with shape (1, SEQLEN), containing integer indices
-        Xtest = np.zeros((1, SEQLEN), dtype=np.int32)
-
-        for j, ch in enumerate(test_chars):
-            Xtest[0, j] = char2index[ch]  # Integer encode each character
-
-
-        # Predict next character probabilities
-        pred = model.predict(Xtest, verbose=0)[0]
-
-        # Pick the most probable next character
-        ypred = index2char[np.argmax(pred)]
-
-        # Print the predicted character
-        print(ypred, end="")
-
-        # Slide the window: remove first char and append the predicted one
-        test_chars = test_chars[1:] + ypred
-
-print()  # Print newline after final output
+NUM_PREDS_PER_EPOCH = 100        # Number of tokens (characters in "char" mode) to generate after each iteration
+GENERATION_BACKEND = "numpy"     # "numpy" decoders or "compiled" tf.function/XLA graphs (inference.py)
+MIXED_PRECISION = False          # bfloat16 compute (float32 softmax) on CPUs that support it
+XLA = False                      # jit_compile the train step with XLA
+SEED = None                      # Set an integer for reproducible runs (resumes are exact either way)
+CHECKPOINT_DIR = "checkpoints"   # Per-model checkpoints are written under this directory
+RESUME = False                   # Continue each model from its latest checkpoint
+OVERWRITE = False                # Let a fresh run (RESUME = False) delete existing checkpoints instead of stopping
+EVAL_MAX_WINDOWS = 20000         # Validation windows scored after every epoch (None = all)
+FULL_SEQUENCE = False            # Predict the next character at every position of each window
+STATEFUL = False                 # Truncated BPTT over BATCH_SIZE contiguous streams for SimpleRNN / GRU
+ATTENTION = "mha"                # Transformer attention: "mha", "chunked" (exact, low memory) or "local"
+ATTENTION_WINDOW = 128           # Positions each token attends to with ATTENTION = "local"
+KEY_DIM = None                   # Width of each attention head (None = embed_dim, as originally trained)
+INSTRUMENTATION_PATH = "instrumentation.json"  # Stage timings of this run (.json or .csv)
+PROFILE_DIR = None               # Set a directory to capture a TensorFlow profiler trace of each model
+SPECULATIVE_K = 4                # Characters the SimpleRNN drafts per verification call (speculative.py)
+
+# tf.data input pipeline shared by all three models: shuffles window offsets,
+# gathers each batch from the memory-mapped corpus in a parallel map and
+# prefetches, so the dense X matrix is never materialized. Only the
+# training block is fed to the models.
+# The factory builds the dataset for each iteration with a fixed shuffle
+# order; its base seed (SEED, or a random one) is saved in every checkpoint,
+# so a resumed run sees the same batches
+# In full-sequence mode every window is supervised at all SEQLEN positions,
+# so the windows no longer need to overlap: step by SEQLEN instead of STEP
+import dataset
+TRAIN_STEP = SEQLEN if FULL_SEQUENCE else STEP
+train_ds = dataset.make_dataset_factory(splits["train"], SEQLEN, TRAIN_STEP, batch_size=BATCH_SIZE,
+                                        seed=SEED, full_sequence=FULL_SEQUENCE)
+num_train_windows = corpus.num_windows(len(splits["train"]), SEQLEN, TRAIN_STEP)
+
+# Stateful truncated BPTT for the two recurrent models: the training text is
+# cut into BATCH_SIZE parallel streams read SEQLEN characters at a time, and
+# the hidden state carries over from batch to batch, so the context is no
+# longer limited to SEQLEN characters. The Transformer keeps train_ds
+if STATEFUL:
+    rnn_train_ds = dataset.make_stream_dataset(splits["train"], SEQLEN, BATCH_SIZE)
+    rnn_kwargs = dict(stateful=True, batch_size=BATCH_SIZE)
+else:
+    rnn_train_ds = train_ds
+    rnn_kwargs = {}
+
+if SEED is not None:
+    tf.keras.utils.set_random_seed(SEED)
+
+# Model builders for the three architectures (see models.py)
+import models
+
+# Single training loop shared by all three models (see trainer.py): fit on the
+# tf.data pipeline, record the loss, then greedily generate NUM_PREDS_PER_EPOCH
+# characters from a random seed window after every iteration
+import trainer
+
+# Set the dtype policy before any model is built
+trainer.configure_precision(MIXED_PRECISION)
+
+# Records samples/sec and step time for every epoch of a model's training
+from callbacks import ThroughputCallback
+
+# Named timers and counters around every stage (corpus loading, window
+# gathering, fit, generation, evaluation) plus per-step train timings;
+# PROFILE_DIR adds a TensorFlow profiler trace of ten steps per model
+import instrumentation
+from callbacks import InstrumentationCallback, ProfilerTraceCallback
+
+
+def instrument_callbacks(label):
+    callbacks = [InstrumentationCallback(BATCH_SIZE, prefix=f"{label}/train")]
+    if PROFILE_DIR is not None:
+        callbacks.append(ProfilerTraceCallback(os.path.join(PROFILE_DIR, label)))
+    return callbacks
+
+# Scores the validation block after every epoch and prints its
+# bits-per-character and perplexity; the values land in each model's metrics
+from callbacks import EvaluationCallback
+
+# Stateful models start every epoch from a zero hidden state; their held-out
+# text is scored as 16 continuous streams instead of separate SEQLEN windows
+from callbacks import ResetStatesCallback
+rnn_callbacks = [ResetStatesCallback()] if STATEFUL else []
+EVAL_STREAMS = 16 if STATEFUL else None
+
+# Saves weights, optimizer state, loss history and RNG state every iteration
+# (written in the background) so an interrupted run can be resumed
+from checkpoint import TrainingCheckpointer
+
+# Define a simple RNN model:
+# Embedding (64-dim character vectors) -> SimpleRNN (unrolled, final output only)
+# -> Dense -> softmax over characters, compiled with sparse categorical
+# crossentropy and RMSprop. With FULL_SEQUENCE the SimpleRNN returns every
+# timestep and the Dense + softmax runs on each of them
+model = models.build_simple_rnn_model(SEQLEN, nb_chars, hidden_size=HIDDEN_SIZE, jit_compile=XLA,
+                                      full_sequence=FULL_SEQUENCE, **rnn_kwargs)
+
+# Training and generation loop; returns the training loss after each epoch
+rnn_throughput = ThroughputCallback(BATCH_SIZE, num_train_windows, name="SimpleRNN")
+rnn_eval = EvaluationCallback(splits["val"], SEQLEN, EVAL_MAX_WINDOWS, name="SimpleRNN",
+                              streams=EVAL_STREAMS, token_lengths=tok.token_lengths)
+rnn_metrics = {}
+losses = trainer.training_loop(model, rnn_train_ds, X, chars, NUM_ITERATIONS,
+                               NUM_EPOCHS_PER_ITERATION, NUM_PREDS_PER_EPOCH, name="SimpleRNN",
+                               generation_backend=GENERATION_BACKEND,
+                               rng=np.random.default_rng(SEED),
+                               callbacks=[rnn_throughput, rnn_eval, *rnn_callbacks,
+                                          *instrument_callbacks("SimpleRNN")],
+                               checkpointer=TrainingCheckpointer(os.path.join(CHECKPOINT_DIR, "simple_rnn"), model),
+                               resume=RESUME, overwrite=OVERWRITE, metrics=rnn_metrics)
 
 # Import the plotting library for visualizing training progress
 import matplotlib.pyplot as plt
@@ -223,78 +225,26 @@ This souce helped me switch from one-hot encoding input to a more efficent repre
 #GRU GENERATION
 """
 
-# Import GRU layer from Keras
-# GRU (Gated Recurrent Unit) is a more advanced RNN variant that helps retain long-term dependencies
-from tensorflow.keras.layers import GRU
-
 # Define a character-level language model using a GRU layer
-gru_model = Sequential()
-
-# Embedding layer: maps character indices to dense 64-dimensional vectors
-# This allows the model to learn a continuous representation of characters
-gru_model.add(Embedding(input_dim=nb_chars, output_dim=64, input_length=SEQLEN))
-
-# GRU layer: processes the input sequence and captures temporal dependencies
-# HIDDEN_SIZE controls the number of units in the GRU cell
-# unroll=True can improve speed for small sequences
-gru_model.add(GRU(HIDDEN_SIZE, unroll=True))
-
-# Output layer: maps GRU output to vocabulary size for next character prediction
-gru_model.add(Dense(nb_chars))
-
-# Softmax activation: converts output to probability distribution over characters
-gru_model.add(Activation("softmax"))
-
-# Compile the model with loss and optimizer
-# 'sparse_categorical_crossentropy' is used because the target labels are integer-encoded
-gru_model.compile(
-    loss="sparse_categorical_crossentropy",
-    optimizer="rmsprop"
-)
-
-# Initialize a list to store loss values from GRU model
-gru_losses = []
-
-# Train the GRU model over multiple iterations
-for iteration in range(NUM_ITERATIONS):
-    print("=" * 50)
-    print(f"GRU Iteration #: {iteration}")
-
-    # Train the model for 1 epoch and record loss
-    history = gru_model.fit(X, y, batch_size=BATCH_SIZE, epochs=NUM_EPOCHS_PER_ITERATION)
-
-    # Store training loss to compare with other models
-    gru_losses.extend(history.history["loss"])
-
-     # Select a random seed sequence from training data
-    test_idx = np.random.randint(len(input_chars))
-    test_chars = input_chars[test_idx]
-
-    print(f"\nGenerating from seed: \"{test_chars}\"")
-    print(test_chars, end="")
-
-    # Generate NUM_PREDS_PER_EPOCH characters from the seed
-    for i in range(NUM_PREDS_PER_EPOCH):
-        # Create a new test input array with shape (1, SEQLEN), containing integer indices
-        Xtest = np.zeros((1, SEQLEN), dtype=np.int32)
-
-        for j, ch in enumerate(test_chars):
-            Xtest[0, j] = char2index[ch]  # Integer encode each character
-
-
-        # Predict next character probabilities
-        pred = model.predict(Xtest, verbose=0)[0]
-
-        # Pick the most probable next character
-        ypred = index2char[np.argmax(pred)]
-
-        # Print the predicted character
-        print(ypred, end="")
-
-        # Slide the window: remove first char and append the predicted one
-        test_chars = test_chars[1:] + ypred
-
-print()  # Print newline after final output
+# GRU (Gated Recurrent Unit) is a more advanced RNN variant that helps retain long-term dependencies
+# Same Embedding -> recurrent -> Dense -> softmax layout as the SimpleRNN model
+gru_model = models.build_gru_model(SEQLEN, nb_chars, hidden_size=HIDDEN_SIZE, jit_compile=XLA,
+                                   full_sequence=FULL_SEQUENCE, **rnn_kwargs)
+
+# Train the GRU model over multiple iterations with the shared loop,
+# storing the training loss to compare with other models
+gru_throughput = ThroughputCallback(BATCH_SIZE, num_train_windows, name="GRU")
+gru_eval = EvaluationCallback(splits["val"], SEQLEN, EVAL_MAX_WINDOWS, name="GRU",
+                              streams=EVAL_STREAMS, token_lengths=tok.token_lengths)
+gru_metrics = {}
+gru_losses = trainer.training_loop(gru_model, rnn_train_ds, X, chars, NUM_ITERATIONS,
+                                   NUM_EPOCHS_PER_ITERATION, NUM_PREDS_PER_EPOCH, name="GRU",
+                                   generation_backend=GENERATION_BACKEND,
+                                   rng=np.random.default_rng(SEED),
+                                   callbacks=[gru_throughput, gru_eval, *rnn_callbacks,
+                                              *instrument_callbacks("GRU")],
+                                   checkpointer=TrainingCheckpointer(os.path.join(CHECKPOINT_DIR, "gru"), gru_model),
+                                   resume=RESUME, overwrite=OVERWRITE, metrics=gru_metrics)
 
 # Plot loss curves for both SimpleRNN and GRU models
 
@@ -326,171 +276,33 @@ This source helped me understand how to implement a GRU-based models. While the
 # TRANSFORMER
 """
 
-import numpy as np
-import tensorflow.keras as keras
-import tensorflow as tf
-from tensorflow.keras.layers import Layer
-from tensorflow.keras import layers, ops  # `ops` is used for TensorFlow operations
-
-from tensorflow.keras.layers import MultiHeadAttention, Dense, Dropout, LayerNormalization
-
-# Defines a single Transformer encoder block with self-attention and feed-forward layers
-class TransformerBlock(layers.Layer):
-    def __init__(self, embed_dim, num_heads, ff_dim, rate=0.1):
-        super().__init__()
-
-        # Multi-head self-attention layer
-        self.att = layers.MultiHeadAttention(num_heads=num_heads, key_dim=embed_dim)
-
-        # Feed-forward network: two dense layers
-        self.ffn = keras.Sequential([
-            layers.Dense(ff_dim, activation="relu"),  # Project to a higher dimension
-            layers.Dense(embed_dim)                   # Return to original dimension
-        ])
-
-        # Layer normalizations for residual connections
-        self.layernorm1 = layers.LayerNormalization(epsilon=1e-6)
-        self.layernorm2 = layers.LayerNormalization(epsilon=1e-6)
-
-        # Dropout for regularization
-        self.dropout1 = layers.Dropout(rate)
-        self.dropout2 = layers.Dropout(rate)
-
-    def call(self, inputs):
-        # Self-attention + residual + normalization
-        attn_output = self.att(inputs, inputs)
-        attn_output = self.dropout1(attn_output)
-        out1 = self.layernorm1(inputs + attn_output)
-
-        # Feed-forward + residual + normalization
-        ffn_output = self.ffn(out1)
-        ffn_output = self.dropout2(ffn_output)
-        return self.layernorm2(out1 + ffn_output)
-
-# This layer combines both token embedding and position embedding
-class TokenAndPositionEmbedding(layers.Layer):
-    def __init__(self, maxlen, vocab_size, embed_dim):
-        super().__init__()
-
-        # Embedding layer to learn vector representations of tokens (characters in your case)
-        self.token_emb = layers.Embedding(input_dim=vocab_size, output_dim=embed_dim)
-
-        # Embedding layer to learn positional encodings (instead of fixed sinusoids)
-        self.pos_emb = layers.Embedding(input_dim=maxlen, output_dim=embed_dim)
-
-    def call(self, x):
-        # Get the actual sequence length from input tensor
-        maxlen = ops.shape(x)[-1]
-
-        # Create position indices [0, 1, 2, ..., maxlen - 1]
-        positions = ops.arange(start=0, stop=maxlen, step=1)
-
-        # Embed the positions and tokens separately
-        positions = self.pos_emb(positions)
-        x = self.token_emb(x)
-
-        # Add token and position embeddings (element-wise addition)
-        return x + positions
-
-from tensorflow.keras.models import Model
-from tensorflow.keras.layers import Input, Embedding, Dense
-
-# Builds a full Transformer model using the functional Keras API
-def build_transformer_model(seq_len, vocab_size, embed_dim=64, num_heads=2, ff_dim=128):
-    # Define input shape (batch, sequence length)
-    inputs = Input(shape=(seq_len,))
-
-    # Step 1: Embedding layer to map character indices to vectors
-    x = Embedding(input_dim=vocab_size, output_dim=embed_dim)(inputs)
-
-    # Step 2: Add fixed positional encodings
-    x = PositionalEncoding(seq_len, embed_dim)(x)
-
-    # Step 3: Apply Transformer encoder block (can be repeated)
-    x = TransformerBlock(embed_dim, num_heads, ff_dim)(x)
-
-    # Step 4: Predict the next character using the last timestep only
-    x = Dense(vocab_size, activation='softmax')(x[:, -1, :])  # Output shape: (batch_size, vocab_size)
-
-    # Final model: input -> Transformer -> prediction
-    model = Model(inputs, x)
-
-    # Compile the model for training
-    model.compile(loss='sparse_categorical_crossentropy', optimizer='adam')
-    return model
-
-from tensorflow.keras import layers, models
-
-# Function to build the Transformer model using your custom layers
-def build_transformer_model(seq_len, vocab_size, embed_dim=64, num_heads=2, ff_dim=128, dropout_rate=0.1):
-    # Input is a sequence of integers (character indices)
-    inputs = layers.Input(shape=(seq_len,))
-
-    # Token + position embedding layer
-    embedding_layer = TokenAndPositionEmbedding(seq_len, vocab_size, embed_dim)
-    x = embedding_layer(inputs)
-
-    # Transformer block (you can stack more later if desired)
-    transformer_block = TransformerBlock(embed_dim, num_heads, ff_dim, dropout_rate)
-    x = transformer_block(x)
-
-    # Only keep the final time step’s output (predict next character)
-    x = layers.Dense(vocab_size, activation="softmax")(x[:, -1, :])
-
-    # Define model and compile with sparse categorical loss (for integer labels)
-    model = models.Model(inputs=inputs, outputs=x)
-    model.compile(loss="sparse_categorical_crossentropy", optimizer="adam")
-    return model
+# The TransformerBlock and TokenAndPositionEmbedding layers and the model
+# builder live in transformer.py so they can be reused by the generation code
+from transformer import build_transformer_model
 
 # Build the Transformer model using defined sequence length and vocabulary size
-# The model uses an embedding layer, positional encoding, transformer block, and output layer
-transformer_model = build_transformer_model(SEQLEN, nb_chars)
-
-
-# Initialize a list to store the training loss values at each iteration
-transformer_losses = []
-
-# Train the Transformer model for a specified number of outer iterations
-for iteration in range(NUM_ITERATIONS):
-    print("=" * 50)
-    print(f"Transformer Iteration #: {iteration}")
-
-    # Train the model for a single epoch on the training data
-    # We use batch training with BATCH_SIZE samples per gradient update
-    history = transformer_model.fit(X, y, batch_size=BATCH_SIZE, epochs=NUM_EPOCHS_PER_ITERATION)
-
-    # Append the loss from this epoch to the loss list for plotting/comparison later
-    transformer_losses.extend(history.history["loss"])
-
-     # Select a random seed sequence from training data
-    test_idx = np.random.randint(len(input_chars))
-    test_chars = input_chars[test_idx]
-
-    print(f"\nGenerating from seed: \"{test_chars}\"")
-    print(test_chars, end="")
-
-    # Generate NUM_PREDS_PER_EPOCH characters from the seed
-    for i in range(NUM_PREDS_PER_EPOCH):
-        # Create a new test input array with shape (1, SEQLEN), containing integer indices
-        Xtest = np.zeros((1, SEQLEN), dtype=np.int32)
-
-        for j, ch in enumerate(test_chars):
-            Xtest[0, j] = char2index[ch]  # Integer encode each character
-
-
-        # Predict next character probabilities
-        pred = transformer_model.predict(Xtest, verbose=0)[0]
-
-        # Pick the most probable next character
-        ypred = index2char[np.argmax(pred)]
-
-        # Print the predicted character
-        print(ypred, end="")
-
-        # Slide the window: remove first char and append the predicted one
-        test_chars = test_chars[1:] + ypred
-
-print()  # Print newline after final output
+# The model uses an embedding layer, positional encoding, transformer block, and output layer.
+# With FULL_SEQUENCE the attention is causally masked and every position is predicted.
+# ATTENTION / KEY_DIM pick the attention backend and head width for long SEQLEN
+transformer_kwargs = dict(attention=ATTENTION, window=ATTENTION_WINDOW, key_dim=KEY_DIM)
+transformer_model = build_transformer_model(SEQLEN, nb_chars, jit_compile=XLA, full_sequence=FULL_SEQUENCE,
+                                            **transformer_kwargs)
+
+# Train the Transformer model for a specified number of outer iterations with
+# the shared loop; generation uses the KV-cached decoder from generation.py
+transformer_throughput = ThroughputCallback(BATCH_SIZE, num_train_windows, name="Transformer")
+transformer_eval = EvaluationCallback(splits["val"], SEQLEN, EVAL_MAX_WINDOWS, name="Transformer",
+                                      token_lengths=tok.token_lengths)
+transformer_metrics = {}
+transformer_losses = trainer.training_loop(transformer_model, train_ds, X, chars, NUM_ITERATIONS,
+                                           NUM_EPOCHS_PER_ITERATION, NUM_PREDS_PER_EPOCH,
+                                           name="Transformer",
+                                           generation_backend=GENERATION_BACKEND,
+                                           rng=np.random.default_rng(SEED),
+                                           callbacks=[transformer_throughput, transformer_eval,
+                                                      *instrument_callbacks("Transformer")],
+                                           checkpointer=TrainingCheckpointer(os.path.join(CHECKPOINT_DIR, "transformer"), transformer_model),
+                                           resume=RESUME, overwrite=OVERWRITE, metrics=transformer_metrics)
 
 # Plot loss curves for all three, SimpleRNN and GRU and Transformer models
 # This visual comparison helps evaluate which model learns more effectively
@@ -517,6 +329,72 @@ plt.grid(True)
 # Display the plot
 plt.show()
 
+# Training loss alone says little about how well a model generalizes, so
+# compare the three on held-out text too: validation bits-per-character after
+# every epoch, and a final score on the untouched test block
+plt.figure(figsize=(10, 5))
+plt.plot(rnn_metrics["val_bpc"], label="SimpleRNN", linestyle='--')
+plt.plot(gru_metrics["val_bpc"], label="GRU", linestyle='-.')
+plt.plot(transformer_metrics["val_bpc"], label="Transformer", linestyle='-')
+plt.title("Validation Bits-per-Character: SimpleRNN vs GRU vs Transformer")
+plt.xlabel("Epoch")
+plt.ylabel("Bits per character")
+plt.legend()
+plt.grid(True)
+plt.show()
+
+# Test-set bits-per-character and perplexity, one large batched pass per model
+print(f"{'Model':12s} {'Train loss':>10s} {'Test bpc':>9s} {'Perplexity':>10s} {'Accuracy':>9s}")
+for label, trained, train_losses in [("SimpleRNN", model, losses), ("GRU", gru_model, gru_losses),
+                                     ("Transformer", transformer_model, transformer_losses)]:
+    if STATEFUL and trained is not transformer_model:
+        test = evaluation.evaluate_stream(trained, splits["test"], EVAL_STREAMS,
+                                          token_lengths=tok.token_lengths)
+    else:
+        test = evaluation.evaluate(trained, splits["test"], SEQLEN, token_lengths=tok.token_lengths)
+    print(f"{label:12s} {train_losses[-1]:10.4f} {test['bpc']:9.4f} "
+          f"{test['perplexity']:10.3f} {test['accuracy']:9.4f}")
+
+# Save every trained model with its tokenizer, so it can be reloaded
+# (models.load_trained_model) for generation or serving without retraining
+SAVE_DIR = "saved_models"
+models.save_trained_model(os.path.join(SAVE_DIR, "simple_rnn"), model, "simple_rnn", tok,
+                          hidden_size=HIDDEN_SIZE, full_sequence=FULL_SEQUENCE, **rnn_kwargs)
+models.save_trained_model(os.path.join(SAVE_DIR, "gru"), gru_model, "gru", tok,
+                          hidden_size=HIDDEN_SIZE, full_sequence=FULL_SEQUENCE, **rnn_kwargs)
+models.save_trained_model(os.path.join(SAVE_DIR, "transformer"), transformer_model, "transformer", tok,
+                          full_sequence=FULL_SEQUENCE, **transformer_kwargs)
+
+# Speculative decoding (see speculative.py): the cheap SimpleRNN drafts
+# SPECULATIVE_K characters and the GRU / Transformer checks them all in one
+# batched call, so one call of the large model yields several characters
+# while the text stays distributed exactly as the large model's own samples.
+# Compared with plain sampling from the same model, one call per character
+if not STATEFUL:
+    import time
+    import generation
+    import inference
+    import speculative
+    spec_seed = np.asarray(corpus.make_windows(splits["test"], SEQLEN)[0][0])
+    print(f"{'Target':12s} {'Plain chars/s':>13s} {'Speculative':>11s} {'Speedup':>8s} {'Accepted':>9s}")
+    for label, target in [("GRU", gru_model), ("Transformer", transformer_model)]:
+        plain_decoder = inference.CompiledWindowDecoder(target)
+        spec_generator = speculative.SpeculativeGenerator(target, model, SPECULATIVE_K)
+        timings = []
+        for run in (lambda n: generation.generate(target, spec_seed, n, decoder=plain_decoder),
+                    lambda n: spec_generator.generate(spec_seed, n)):
+            run(2)  # warm-up: tracing and XLA compilation
+            start = time.perf_counter()
+            run(NUM_PREDS_PER_EPOCH)
+            timings.append(time.perf_counter() - start)
+        print(f"{label:12s} {NUM_PREDS_PER_EPOCH / timings[0]:13,.0f} {NUM_PREDS_PER_EPOCH / timings[1]:11,.0f} "
+              f"{timings[0] / timings[1]:8.2f} {spec_generator.stats['acceptance_rate']:9.1%}")
+
+# Where the time went, per stage; the export can be diffed between runs
+print(instrumentation.default.report())
+instrumentation.default.save(INSTRUMENTATION_PATH, seqlen=SEQLEN, batch_size=BATCH_SIZE,
+                             tokenizer=TOKENIZER, full_sequence=FULL_SEQUENCE, stateful=STATEFUL)
+
 """#CONCLUSIONS AND COMPARISONS
 
 GRU (orange) consistently achieves the lowest loss throughout training. This is potentially due to its gating mechanism and memory efficiency.
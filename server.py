@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+"""Local generation server for a saved SimpleRNN, GRU or Transformer model.
+
+The model and its tokenizer are loaded once (models.load_trained_model) and
+served over HTTP on a TCP port or a Unix socket with nothing but asyncio.
+Concurrent requests are combined into micro-batches: a batch is formed as
+soon as --max-batch requests are waiting or the oldest one has waited
+--max-wait-ms. Every batch gets its own copy of the incremental decoder
+(generation.make_decoder), all running batches advance one token per
+scheduler round, and finished requests drop out of their batch so they stop
+costing decoder work. Tokens are streamed back as they are sampled.
+
+Endpoints:
+    POST /generate  {"prompt": "alice was", "n_tokens": 100, "temperature": 1.0,
+                     "top_k": null, "top_p": null}
+                    -> chunked application/x-ndjson: one {"token": "..."} line
+                       per generated token, then {"done": true, "text": "...",
+                       "tokens": n}, or {"error": "..."} if its batch failed
+    GET  /health    -> model description, batching and prediction-cache statistics
+
+Usage:
+    python server.py saved_models/gru --port 8000
+    python server.py saved_models/transformer --unix /tmp/rnn_nlp.sock
+    python server.py saved_models/gru --port 8000 --cache-size 100000
+"""
+
+import argparse
+import asyncio
+import copy
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import generation
+import models
+import prediction_cache
+
+
+class GenerationRequest:
+    """One generation request: its encoded seed window, sampling settings and output queue."""
+
+    def __init__(self, seeds, n_tokens, temperature, top_k, top_p, arrival):
+        self.seeds = seeds
+        self.n_tokens = n_tokens
+        self.sampling = (temperature, top_k, top_p)
+        self.arrival = arrival
+        self.produced = 0
+        # Set when the client goes away, so its row is dropped at the next step
+        self.cancelled = False
+        # Token strings as they are sampled, then None when the request is done
+        # (preceded by an {"error": ...} dict if its batch failed)
+        self.queue = asyncio.Queue()
+
+
+def _is_int(value):
+    # JSON booleans arrive as Python bools, which are ints too
+    return isinstance(value, (int, np.integer)) and not isinstance(value, bool)
+
+
+def _is_real(value):
+    return isinstance(value, (int, float, np.number)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _keep_rows(decoder, keep):
+    # Drop finished sequences from a NumPy decoder's per-row state (and from
+    # the decoder inside a prediction_cache.CachedDecoder)
+    for name in ("state", "k_cache", "v_cache", "context"):
+        if getattr(decoder, name, None) is not None:
+            setattr(decoder, name, getattr(decoder, name)[keep])
+    if hasattr(decoder, "decoder"):
+        _keep_rows(decoder.decoder, keep)
+
+
+class BatchingGenerator:
+    """Dynamic micro-batching scheduler around one model's incremental decoder.
+
+    Decoder work runs on a single worker thread, so the event loop keeps
+    accepting and streaming requests while a batch is being stepped.
+    """
+
+    def __init__(self, model, tokenizer, max_batch=32, max_wait_ms=5.0, max_tokens=1000, seed=None,
+                 cache_size=0):
+        self.decoder = generation.make_decoder(model)
+        # One prediction cache shared by every batch, so repeated prompt
+        # prefixes skip the model across requests
+        self.cache = prediction_cache.PredictionCache(cache_size) if cache_size else None
+        if self.cache is not None:
+            self.decoder = prediction_cache.CachedDecoder(self.decoder, self.cache)
+        self.tokenizer = tokenizer
+        self.seq_len = model.input_shape[-1]
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.max_tokens = max_tokens
+        self.rng = np.random.default_rng(seed)
+
+        # Short prompts are left-padded with spaces to a full training window
+        self.pad_id = tokenizer.vocab.index(" ") if " " in tokenizer.vocab else 0
+
+        self.pending = []
+        self.batches = []
+        self.wakeup = asyncio.Event()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.stats = {"requests": 0, "tokens": 0, "batches": 0, "batched_requests": 0, "steps": 0,
+                      "step_rows": 0, "failed_requests": 0}
+
+    def encode_prompt(self, prompt):
+        """Encode a prompt into exactly one training window of token ids."""
+        ids = self.tokenizer.encode(self.tokenizer.normalize(prompt))[-self.seq_len:]
+        return np.concatenate([np.full(self.seq_len - len(ids), self.pad_id, dtype=np.int32), ids])
+
+    def submit(self, prompt, n_tokens=100, temperature=1.0, top_k=None, top_p=None):
+        """Queue a request; raises ValueError for invalid settings or prompts."""
+        if not isinstance(prompt, str):
+            raise ValueError("prompt must be a string")
+        if not _is_int(n_tokens) or not 1 <= n_tokens <= self.max_tokens:
+            raise ValueError(f"n_tokens must be an integer between 1 and {self.max_tokens}")
+        if not _is_real(temperature) or temperature < 0:
+            raise ValueError("temperature must be a number >= 0")
+        if top_k is not None and (not _is_int(top_k) or top_k < 1):
+            raise ValueError("top_k must be an integer >= 1")
+        if top_p is not None and (not _is_real(top_p) or not 0 < top_p <= 1):
+            raise ValueError("top_p must be a number in (0, 1]")
+
+        request = GenerationRequest(self.encode_prompt(prompt), n_tokens, temperature, top_k, top_p,
+                                    asyncio.get_running_loop().time())
+        self.pending.append(request)
+        self.stats["requests"] += 1
+        self.wakeup.set()
+        return request
+
+    async def run(self):
+        """Scheduler loop: admit due batches, then advance every running batch by one token."""
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.pending and not self.batches:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            if self.pending:
+                waited = loop.time() - self.pending[0].arrival
+                if len(self.pending) >= self.max_batch or waited >= self.max_wait:
+                    await self._admit(loop)
+                elif not self.batches:
+                    # Nothing to step: sleep until the deadline or until more requests arrive
+                    self.wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self.wakeup.wait(), self.max_wait - waited)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+            for batch in list(self.batches):
+                await self._step(loop, batch)
+
+    async def _admit(self, loop):
+        requests = [r for r in self.pending[:self.max_batch] if not r.cancelled]
+        del self.pending[:self.max_batch]
+        if not requests:
+            return
+
+        # A shallow copy shares the precomputed weight tables; prime() gives
+        # the copy its own state for this batch
+        decoder = copy.copy(self.decoder)
+        seeds = np.stack([r.seeds for r in requests])
+        try:
+            probs = await loop.run_in_executor(self.executor, decoder.prime, seeds)
+        except Exception as exc:
+            self._fail(requests, exc)
+            return
+        self.batches.append({"decoder": decoder, "requests": requests, "probs": probs})
+        self.stats["batches"] += 1
+        self.stats["batched_requests"] += len(requests)
+
+    def _advance(self, batch):
+        # Runs on the worker thread: sample one token per row, drop the rows
+        # that are now finished, and step the rest
+        requests, decoder = batch["requests"], batch["decoder"]
+        probs = batch["probs"]
+
+        tokens = np.empty(len(requests), dtype=np.int32)
+        groups = {}
+        for row, request in enumerate(requests):
+            groups.setdefault(request.sampling, []).append(row)
+        for sampling, rows in groups.items():
+            tokens[rows] = generation.sample(probs[rows], *sampling, rng=self.rng)
+
+        keep = np.array([not r.cancelled and r.produced + 1 < r.n_tokens for r in requests])
+        if keep.any():
+            if not keep.all():
+                _keep_rows(decoder, keep)
+            probs = decoder.step(tokens[keep])
+        return tokens, keep, probs
+
+    def _fail(self, requests, exc):
+        # A failing batch only ends its own requests; the scheduler keeps serving the others
+        print(f"Generation failed for a batch of {len(requests)} requests: {exc!r}", flush=True)
+        for request in requests:
+            if not request.cancelled:
+                request.queue.put_nowait({"error": f"generation failed: {exc}"})
+                request.queue.put_nowait(None)
+        self.stats["failed_requests"] += len(requests)
+
+    async def _step(self, loop, batch):
+        try:
+            tokens, keep, probs = await loop.run_in_executor(self.executor, self._advance, batch)
+        except Exception as exc:
+            self.batches.remove(batch)
+            self._fail(batch["requests"], exc)
+            return
+        self.stats["steps"] += 1
+        self.stats["step_rows"] += len(tokens)
+
+        vocab = self.tokenizer.vocab
+        for request, token, running in zip(batch["requests"], tokens, keep):
+            if request.cancelled:
+                continue
+            request.produced += 1
+            self.stats["tokens"] += 1
+            request.queue.put_nowait(vocab[token])
+            if not running:
+                request.queue.put_nowait(None)
+
+        batch["requests"] = [r for r, running in zip(batch["requests"], keep) if running]
+        batch["probs"] = probs
+        if not batch["requests"]:
+            self.batches.remove(batch)
+
+    def describe(self):
+        stats = dict(self.stats)
+        stats["mean_batch_size"] = stats["batched_requests"] / max(stats["batches"], 1)
+        stats["mean_rows_per_step"] = stats["step_rows"] / max(stats["steps"], 1)
+        return {"seq_len": self.seq_len, "vocab_size": len(self.tokenizer), "tokenizer": self.tokenizer.kind,
+                "max_batch": self.max_batch, "max_wait_ms": self.max_wait * 1000, "pending": len(self.pending),
+                "running_batches": len(self.batches), "stats": stats,
+                "cache": self.cache.stats() if self.cache is not None else None}
+
+
+def _write_chunk(writer, obj):
+    data = (json.dumps(obj) + "\n").encode()
+    writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+
+def _write_response(writer, status, obj):
+    body = json.dumps(obj).encode()
+    writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+
+
+async def _read_request(reader):
+    # Minimal HTTP/1.1 request parsing: request line, headers, Content-Length body
+    request_line = (await reader.readline()).decode("latin-1").split()
+    if len(request_line) < 2:
+        raise ValueError("malformed request line")
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1")
+        if line in ("\r\n", "\n", ""):
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return request_line[0], request_line[1], body
+
+
+def make_handler(generator):
+    """Return the asyncio stream handler serving /generate and /health."""
+
+    async def handle(reader, writer):
+        request = None
+        try:
+            try:
+                method, path, body = await _read_request(reader)
+            except (ValueError, asyncio.IncompleteReadError):
+                _write_response(writer, "400 Bad Request", {"error": "malformed request"})
+                return
+
+            if method == "GET" and path == "/health":
+                _write_response(writer, "200 OK", generator.describe())
+                return
+            if method != "POST" or path != "/generate":
+                _write_response(writer, "404 Not Found", {"error": f"no route for {method} {path}"})
+                return
+
+            try:
+                params = json.loads(body or b"{}")
+                request = generator.submit(params.get("prompt", ""), params.get("n_tokens", 100),
+                                           params.get("temperature", 1.0), params.get("top_k"),
+                                           params.get("top_p"))
+            except (ValueError, TypeError, AttributeError) as exc:
+                _write_response(writer, "400 Bad Request", {"error": str(exc)})
+                return
+
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                         b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+            text = []
+            error = None
+            while (token := await request.queue.get()) is not None:
+                if isinstance(token, dict):
+                    # An error record from the scheduler; None follows it
+                    error = token
+                    continue
+                text.append(token)
+                _write_chunk(writer, {"token": token})
+                await writer.drain()
+            _write_chunk(writer, error or {"done": True, "text": "".join(text), "tokens": len(text)})
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        except ConnectionError:
+            if request is not None:
+                request.cancelled = True
+        finally:
+            writer.close()
+
+    return handle
+
+
+async def serve(model_dir, host="127.0.0.1", port=8000, unix_path=None, **batching):
+    """Load a saved model and serve it until cancelled."""
+    model, tokenizer = models.load_trained_model(model_dir)
+    generator = BatchingGenerator(model, tokenizer, **batching)
+    scheduler = asyncio.create_task(generator.run())
+
+    handler = make_handler(generator)
+    if unix_path:
+        if os.path.exists(unix_path):
+            os.remove(unix_path)
+        server = await asyncio.start_unix_server(handler, unix_path)
+        where = unix_path
+    else:
+        server = await asyncio.start_server(handler, host, port)
+        where = f"http://{host}:{port}"
+    print(f"Serving {model_dir} ({tokenizer.kind} tokenizer, window {generator.seq_len}) on {where}", flush=True)
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        scheduler.cancel()
+        generator.executor.shutdown(wait=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a saved model with dynamic request batching.")
+    parser.add_argument("model_dir", help="Directory written by models.save_trained_model")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--unix", help="Listen on this Unix socket path instead of a TCP port")
+    parser.add_argument("--max-batch", type=int, default=32, help="Most requests combined into one batch")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0,
+                        help="Longest a request waits for its batch to fill")
+    parser.add_argument("--max-tokens", type=int, default=1000, help="Largest n_tokens a request may ask for")
+    parser.add_argument("--seed", type=int, help="Seed the sampling RNG")
+    parser.add_argument("--cache-size", type=int, default=0,
+                        help="Entries of the shared next-token prediction cache (0 disables it)")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.model_dir, args.host, args.port, args.unix, max_batch=args.max_batch,
+                          max_wait_ms=args.max_wait_ms, max_tokens=args.max_tokens, seed=args.seed,
+                          cache_size=args.cache_size))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
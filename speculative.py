@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""Speculative decoding: a cheap draft model proposes, the large model verifies.
+
+The SimpleRNN drafts `k` characters one step at a time with its NumPy
+decoder (generation.RecurrentStepper). The GRU or Transformer then scores
+all k + 1 windows those drafts create (the current window, and the window
+after each draft) in a single batched call of its compiled window function
+(inference.export_window_fn). Draft i is accepted with probability
+min(1, p_i(x) / q_i(x)), where p is the large model's sampling distribution
+and q the draft's. At the first rejection a replacement is drawn from
+max(p_i - q_i, 0), renormalized, and the round ends. When all k drafts are
+accepted, one more token comes free from p_k. The generated text is
+therefore distributed exactly as plain per-character sampling from the large
+model, over the same sliding SEQLEN window (inference.CompiledWindowDecoder),
+with temperature / top_k / top_p applied to both models alike
+(generation.sampling_probs). Each round costs k draft steps and one target
+call and yields between 1 and k + 1 tokens.
+
+The draft must share the target's vocabulary (both trained on the same
+corpus and tokenizer) and be a SimpleRNN or GRU model, since its state is
+rolled back to the last accepted draft after every round.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import generation
+import inference
+import instrumentation
+
+
+class SpeculativeGenerator:
+    """Speculative generation from `target` with `draft` proposing `k` tokens per round.
+
+    `stats` describes the last generate() call: rounds (target calls),
+    drafted and accepted tokens, the acceptance rate and the mean number of
+    tokens a sequence gains per target call.
+    """
+
+    def __init__(self, target, draft, k=4, jit_compile=True):
+        if target.output_shape[-1] != draft.output_shape[-1]:
+            raise ValueError("The draft and target models must share one vocabulary")
+        self.draft = generation.make_decoder(draft)
+        if not hasattr(self.draft, "state"):
+            raise ValueError("The draft model must be a SimpleRNN or GRU model")
+        self.window_fn = inference.export_window_fn(target, jit_compile)
+        self.seq_len = target.input_shape[-1]
+        self.k = k
+        self.stats = {}
+
+    def generate(self, seeds, n_tokens, temperature=1.0, top_k=None, top_p=None, seed=None):
+        """Generate `n_tokens` indices for every seed, like generation.generate.
+
+        `seeds` has shape (batch, length) with length >= SEQLEN (or is one
+        1-D seed). Every row drafts and is verified together, so one target
+        call per round serves the whole batch.
+        """
+        rng = np.random.default_rng(seed)
+        seeds = np.asarray(seeds, dtype=np.int32)
+        rows = np.atleast_2d(seeds)
+        if rows.shape[1] < self.seq_len:
+            raise ValueError(f"Seeds must be at least {self.seq_len} tokens long")
+        batch, k = len(rows), self.k
+        sampling = (temperature, top_k, top_p)
+
+        window = np.array(rows[:, -self.seq_len:])
+        out = np.zeros((batch, n_tokens + k + 1), dtype=np.int32)
+        lengths = np.zeros(batch, dtype=np.int64)
+        with instrumentation.timer("speculative/prime"):
+            q = self.draft.prime(rows)
+        rounds = drafted = accepted = produced = row_rounds = 0
+
+        while lengths.min() < n_tokens:
+            rounds += 1
+            # Draft k tokens per row, keeping every state and distribution for the rollback
+            with instrumentation.timer("speculative/draft"):
+                states, dists, drafts = [self.draft.state], [], np.zeros((batch, k), dtype=np.int32)
+                for i in range(k):
+                    dists.append(generation.sampling_probs(q, *sampling))
+                    drafts[:, i] = generation.draw(dists[-1], rng)
+                    q = self.draft.step(drafts[:, i])
+                    states.append(self.draft.state)
+
+            # One target call scores the k + 1 windows ending before each draft and after the last
+            with instrumentation.timer("speculative/verify"):
+                windows = sliding_window_view(np.concatenate([window, drafts], axis=1), self.seq_len, axis=1)
+                p = self.window_fn(np.ascontiguousarray(windows.reshape(-1, self.seq_len))).numpy()
+                p = generation.sampling_probs(p, *sampling).reshape(batch, k + 1, -1)
+
+            # Accept draft i with probability min(1, p_i(x) / q_i(x)) up to the first rejection
+            draft_q = np.stack(dists, axis=1)
+            picked = np.arange(batch)[:, None], np.arange(k)[None, :], drafts
+            ratio = p[:, :k][picked] / np.maximum(draft_q[picked], 1e-30)
+            rejected = rng.random((batch, k)) >= ratio
+            n_accepted = np.where(rejected.any(axis=1), rejected.argmax(axis=1), k)
+
+            # Replacement from the residual max(p - q, 0) after a rejection, or a
+            # free token from p_k when every draft was accepted
+            index = np.arange(batch)
+            final_p = p[index, n_accepted]
+            residual = np.maximum(final_p - draft_q[index, np.minimum(n_accepted, k - 1)], 0.0)
+            residual = np.where((n_accepted < k)[:, None], residual, final_p)
+            mass = residual.sum(axis=-1, keepdims=True)
+            final_p = np.where(mass > 0, residual / np.maximum(mass, 1e-30), final_p)
+            tokens = generation.draw(final_p, rng)
+
+            active = lengths < n_tokens
+            drafted += k * int(active.sum())
+            accepted += int(n_accepted[active].sum())
+            produced += int(n_accepted[active].sum() + active.sum())
+            row_rounds += int(active.sum())
+            for row in np.flatnonzero(active):
+                new = np.append(drafts[row, :n_accepted[row]], tokens[row])
+                out[row, lengths[row]:lengths[row] + len(new)] = new
+                lengths[row] += len(new)
+                window[row] = np.concatenate([window[row], new])[-self.seq_len:]
+
+            # Roll the draft back to its last accepted state and feed it the new token
+            self.draft.state = np.stack(states, axis=0)[n_accepted, np.arange(batch)]
+            q = self.draft.step(tokens)
+
+        instrumentation.count("speculative/tokens", batch * n_tokens)
+        self.stats = {"rounds": rounds, "drafted": drafted, "accepted": accepted,
+                      "acceptance_rate": accepted / max(drafted, 1),
+                      "tokens_per_round": produced / max(row_rounds, 1)}
+        out = out[:, :n_tokens]
+        return out if seeds.ndim > 1 else out[0]
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""Pluggable tokenizers: characters or byte-pair-encoded subwords.
+
+Both tokenizers have a deterministic, JSON-serializable vocabulary, so a saved
+model can be reloaded together with the exact mapping it was trained with
+(see models.save_trained_model). `vocab` is a list of token strings and works
+with corpus.decode, so the rest of the code treats tokens like characters.
+
+  - "char": one token per character of the sorted corpus alphabet
+  - "bpe":  starts from the characters and repeatedly merges the most
+            frequent adjacent pair into a new token. Tokens never merge across
+            a word boundary: a space can only be the first character of a
+            token (" the", "and"). Each model step then covers several
+            characters, so training and generation need fewer steps per
+            unit of text.
+
+BPE training works on the encoded array with NumPy. Merges only touch the
+pairs next to merged positions, so pair counts are updated incrementally and
+the next merge comes from a lazily invalidated heap. The corpus is never
+re-counted.
+"""
+
+import heapq
+import json
+import os
+
+import numpy as np
+
+import corpus
+import instrumentation
+
+# Bump whenever the BPE training rules change so stale caches are ignored
+TOKENIZER_VERSION = 1
+
+TOKENIZER_MODES = ("char", "bpe")
+
+
+def _pair_positions(ids, a, b):
+    # Start positions of the non-overlapping (a, b) pairs, scanning left to right
+    idx = np.flatnonzero((ids[:-1] == a) & (ids[1:] == b))
+    if a == b and len(idx):
+        # In a run like "aaa" only every other pair can merge
+        run_start = np.ones(len(idx), dtype=bool)
+        run_start[1:] = np.diff(idx) != 1
+        first = np.maximum.accumulate(np.where(run_start, idx, 0))
+        idx = idx[(idx - first) % 2 == 0]
+    return idx
+
+
+def _merge_at(ids, idx, new_id):
+    # Merge the pairs starting at `idx` into new_id. Returns the new array and
+    # the positions of the merged tokens in it
+    if not len(idx):
+        return ids, idx
+
+    merged = ids.copy()
+    merged[idx] = new_id
+    keep = np.ones(len(ids), dtype=bool)
+    keep[idx + 1] = False
+    # Each earlier merge shifts later positions down by one
+    return merged[keep], idx - np.arange(len(idx))
+
+
+class CharTokenizer:
+    """One token per character; the vocabulary is the sorted corpus alphabet."""
+
+    kind = "char"
+
+    def __init__(self, chars):
+        self.chars = list(chars)
+        self.vocab = list(self.chars)
+        self.table = corpus.build_lookup_table(self.chars)
+        self.token_lengths = np.array([len(t) for t in self.vocab], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.vocab)
+
+    @staticmethod
+    def normalize(text):
+        """Clean free text like the corpus (lowercase, ASCII only, single spaces)."""
+        return " ".join(text.lower().encode("ascii", "ignore").decode("ascii").split())
+
+    def encode(self, text, dtype=np.int32):
+        """Encode cleaned text (see normalize) into token ids."""
+        return corpus.encode_text(text, self.table, dtype)
+
+    def decode(self, ids):
+        return corpus.decode(ids, self.vocab)
+
+    def to_dict(self):
+        return {"kind": self.kind, "chars": self.chars}
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as fout:
+            json.dump(self.to_dict(), fout)
+
+
+class BPETokenizer(CharTokenizer):
+    """Byte-pair encoding on top of the character vocabulary.
+
+    `merges` is the ordered list of (left_id, right_id) pairs; merge i
+    creates token id len(chars) + i.
+    """
+
+    kind = "bpe"
+
+    def __init__(self, chars, merges):
+        super().__init__(chars)
+        self.merges = [(int(a), int(b)) for a, b in merges]
+        for a, b in self.merges:
+            self.vocab.append(self.vocab[a] + self.vocab[b])
+        self.token_lengths = np.array([len(t) for t in self.vocab], dtype=np.int64)
+
+    def encode(self, text, dtype=np.int32):
+        """Encode cleaned text: characters first, then every merge in training order."""
+        ids = corpus.encode_text(text, self.table, np.int32)
+        for i, (a, b) in enumerate(self.merges):
+            if len(ids) < 2:
+                break
+            ids, _ = _merge_at(ids, _pair_positions(ids, a, b), len(self.chars) + i)
+        return ids.astype(dtype, copy=False)
+
+    def to_dict(self):
+        return {"kind": self.kind, "chars": self.chars, "merges": self.merges}
+
+    @classmethod
+    def train(cls, encoded, chars, vocab_size=512, min_count=2):
+        """Learn merges on a character-encoded corpus until vocab_size tokens exist.
+
+        Returns the tokenizer and the corpus encoded with it, which is exactly
+        what encode() produces for the same text.
+        """
+        ids = np.asarray(encoded, dtype=np.int32)
+        tokens = list(chars)
+        # Merges may not create tokens with a space anywhere but at the start
+        starts_space = [t.startswith(" ") for t in tokens]
+        width = max(vocab_size, len(tokens))
+
+        def pair_codes(array, positions):
+            # Codes of the mergeable pairs starting at `positions`
+            positions = positions[(positions >= 0) & (positions < len(array) - 1)]
+            left, right = array[positions], array[positions + 1]
+            valid = ~np.asarray(starts_space)[right]
+            return left[valid].astype(np.int64) * width + right[valid]
+
+        counts = {}
+        heap = []
+
+        def update(codes, sign):
+            values, occurrences = np.unique(codes, return_counts=True)
+            for code, n in zip(values.tolist(), occurrences.tolist()):
+                count = counts.get(code, 0) + sign * n
+                if count > 0:
+                    counts[code] = count
+                    heapq.heappush(heap, (-count, code))
+                else:
+                    counts.pop(code, None)
+
+        update(pair_codes(ids, np.arange(len(ids) - 1)), +1)
+
+        merges = []
+        while len(tokens) < vocab_size and heap:
+            # Pop stale heap entries until the top matches the live count
+            neg_count, code = heapq.heappop(heap)
+            if counts.get(code) != -neg_count:
+                continue
+            if -neg_count < min_count:
+                break
+
+            a, b = divmod(code, width)
+            new_id = len(tokens)
+            positions = _pair_positions(ids, a, b)
+            merged, new_positions = _merge_at(ids, positions, new_id)
+
+            # Only pairs touching the merged tokens change: remove them as
+            # they were, then add them as they are now
+            touched = np.unique(np.concatenate([positions - 1, positions, positions + 1]))
+            update(pair_codes(ids, touched), -1)
+            tokens.append(tokens[a] + tokens[b])
+            starts_space.append(tokens[-1].startswith(" "))
+            merges.append((a, b))
+            ids = merged
+            update(pair_codes(ids, np.unique(np.concatenate([new_positions - 1, new_positions]))), +1)
+
+        return cls(chars, merges), ids
+
+
+def tokenizer_from_dict(values):
+    """Rebuild a tokenizer from its to_dict() form."""
+    if values["kind"] == "char":
+        return CharTokenizer(values["chars"])
+    if values["kind"] == "bpe":
+        return BPETokenizer(values["chars"], values["merges"])
+    raise ValueError(f"Unknown tokenizer kind {values['kind']!r}")
+
+
+def load_tokenizer(path):
+    with open(path) as fin:
+        return tokenizer_from_dict(json.load(fin))
+
+
+def load_tokenized_corpus(path, mode="char", vocab_size=512, cache_dir=corpus.CACHE_DIR,
+                          dtype=np.int32):
+    """Return the corpus encoded with a `mode` tokenizer, plus the tokenizer.
+
+    "char" is the cached character encoding from corpus.load_encoded_corpus.
+    "bpe" trains a vocab_size tokenizer on it once and caches both the token
+    array and the tokenizer next to the character cache, keyed by the
+    source file's content hash.
+    """
+    if mode not in TOKENIZER_MODES:
+        raise ValueError(f"Unknown tokenizer {mode!r}, expected one of {TOKENIZER_MODES}")
+    # One hash of the source file keys both the character and the BPE caches
+    digest = corpus.file_digest(path)
+    encoded, chars = corpus.load_encoded_corpus(path, cache_dir, dtype, digest=digest)
+    if mode == "char":
+        return encoded, CharTokenizer(chars)
+
+    dtype = np.dtype(dtype)
+    key = f"{digest}-bpe{vocab_size}-v{TOKENIZER_VERSION}-{dtype.name}"
+    data_path = os.path.join(cache_dir, key + ".bin")
+    tokenizer_path = os.path.join(cache_dir, key + ".tokenizer.json")
+
+    if not (os.path.exists(data_path) and os.path.exists(tokenizer_path)):
+        with instrumentation.timer("tokenizer/bpe_train"):
+            tokenizer, ids = BPETokenizer.train(encoded, chars, vocab_size)
+
+        # Temporary names and a rename, like the character cache
+        tmp_data = data_path + f".{os.getpid()}.tmp"
+        ids.astype(dtype).tofile(tmp_data)
+        tmp_tokenizer = tokenizer_path + f".{os.getpid()}.tmp"
+        tokenizer.save(tmp_tokenizer)
+        os.replace(tmp_data, data_path)
+        os.replace(tmp_tokenizer, tokenizer_path)
+
+    tokenizer = load_tokenizer(tokenizer_path)
+    if os.path.getsize(data_path) == 0:
+        return np.zeros(0, dtype=dtype), tokenizer
+    return np.memmap(data_path, dtype=dtype, mode="r"), tokenizer
@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+"""Config-driven training harness shared by all three architectures.
+
+One training loop (fit, record loss, generate a sample) replaces the three
+copies that used to live in rnn_nlp.py. Several configurations can be trained
+concurrently in separate processes; they all read the same memory-mapped
+corpus cache, so the text is encoded once and shared through the page cache.
+
+Usage:
+    python trainer.py --config configs/compare.json --processes 3
+
+    # Data-parallel: CPU replicas in one process, or one process per worker
+    python trainer.py --config configs/compare.json --distribute mirrored
+    TF_CONFIG='{"cluster": {"worker": ["localhost:20000", "localhost:20001"]},
+                "task": {"type": "worker", "index": 0}}' \
+        python trainer.py --config configs/distributed.json
+"""
+
+import argparse
+import dataclasses
+import json
+import multiprocessing
+import os
+
+import numpy as np
+import tensorflow as tf
+
+import corpus
+import dataset
+import distributed
+import evaluation
+import generation
+import instrumentation
+import models
+import tokenizer as tokenizers
+from callbacks import (EvaluationCallback, InstrumentationCallback, ProfilerTraceCallback,
+                       ResetStatesCallback, ThroughputCallback)
+from checkpoint import TrainingCheckpointer
+
+
+# Parallel streams the held-out text is read as when scoring stateful models
+EVAL_STREAMS = 16
+
+
+@dataclasses.dataclass
+class TrainConfig:
+    """One training run: a model spec plus its hyperparameters."""
+
+    name: str
+    model: str                      # Key of models.MODEL_BUILDERS
+    model_kwargs: dict = dataclasses.field(default_factory=dict)
+    corpus_path: str = "sample_data/alice.txt"
+    cache_dir: str = ".corpus_cache"
+    seqlen: int = 10
+    step: int = 1
+    full_sequence: bool = False     # Many-to-many models predicting every position (use step = seqlen)
+    stateful: bool = False          # Truncated BPTT over batch_size contiguous streams (SimpleRNN / GRU)
+    tokenizer: str = "char"         # "char" or "bpe" (see tokenizer.py)
+    vocab_size: int = 512           # Target vocabulary size of the BPE tokenizer
+    save_dir: str = None            # Save the trained model and tokenizer to <save_dir>/<name>
+    batch_size: int = 128
+    num_iterations: int = 25
+    epochs_per_iteration: int = 1
+    num_preds: int = 100
+    generation_backend: str = "numpy"
+    mixed_precision: bool = False   # bfloat16 compute on CPUs that support it
+    xla: bool = False               # jit_compile the train step with XLA
+    checkpoint_dir: str = None      # Checkpoints go to <checkpoint_dir>/<name>
+    checkpoint_every: int = 1       # Iterations between checkpoints
+    resume: bool = False            # Continue from the latest checkpoint
+    overwrite: bool = False         # Let a fresh (non-resumed) run delete existing checkpoints
+    seed: int = None
+    val_fraction: float = 0.05      # Contiguous held-out blocks at the end of the corpus
+    test_fraction: float = 0.05
+    eval_max_windows: int = 20000   # Evenly spaced val windows scored per epoch (None = all)
+    eval_processes: int = 1         # Processes for the final sharded test evaluation
+    profile_dir: str = None         # TensorFlow profiler trace of some train steps to <profile_dir>/<name>
+    profile_start_step: int = 10    # First traced step (skips tracing / compilation)
+    profile_steps: int = 10         # Number of traced steps
+    distribute: str = "none"        # "none", "mirrored" (CPU replicas) or "multi_worker" (TF_CONFIG)
+    replicas: int = 2               # Logical CPU devices for "mirrored"
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls(**values)
+
+
+def cpu_supports_bfloat16():
+    """True if the host CPU has native bfloat16 instructions (AVX512-BF16 or AMX)."""
+    try:
+        with open("/proc/cpuinfo") as fin:
+            flags = fin.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def configure_precision(mixed_precision=False):
+    """Set the global Keras dtype policy and return its name.
+
+    mixed_precision=True selects "mixed_bfloat16" (bfloat16 compute, float32
+    variables) when the CPU supports bfloat16 natively and falls back to
+    float32 otherwise. Must be called before the models are built; the output
+    softmax layers always run in float32.
+    """
+    policy = "float32"
+    if mixed_precision:
+        if cpu_supports_bfloat16():
+            policy = "mixed_bfloat16"
+        else:
+            print("bfloat16 is not supported on this CPU, training in float32")
+    tf.keras.mixed_precision.set_global_policy(policy)
+    return policy
+
+
+def training_loop(model, train_ds, seeds, chars, num_iterations, epochs_per_iteration=1,
+                  num_preds=100, name="", generation_backend="numpy", rng=None, verbose="auto",
+                  callbacks=None, checkpointer=None, checkpoint_every=1, resume=False,
+                  overwrite=False, metrics=None):
+    """Train `model` for num_iterations rounds, sampling text after each round.
+
+    `train_ds` is a dataset or a callable mapping the iteration number to one
+    (see dataset.make_dataset_factory). `seeds` is the (n, SEQLEN) window
+    array to draw generation seeds from and `callbacks` are passed through to
+    model.fit. With a `checkpointer`, the state is saved every
+    `checkpoint_every` iterations and `resume` continues from the latest save.
+    A fresh run refuses to start over checkpoints already in its directory
+    unless `overwrite` allows it to delete them.
+    `metrics`, if given, is a dict that collects every other per-epoch value
+    model.fit logs (such as val_bpc from callbacks.EvaluationCallback); it is
+    checkpointed along with the losses.
+    Returns the list of per-epoch training losses.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    losses = []
+    start_iteration = 0
+    stage = f"{name}/" if name else ""
+
+    if checkpointer is not None and not resume and checkpointer.latest_checkpoint() is not None:
+        if not overwrite:
+            raise FileExistsError(f"{checkpointer.directory} already holds checkpoints; resume them "
+                                  "or allow a fresh run to overwrite them")
+        checkpointer.clear()
+    if checkpointer is not None and resume:
+        state = checkpointer.restore(rng)
+        if state is not None:
+            start_iteration, losses = state["iteration"], state["losses"]
+            # Continue the interrupted run's shuffle order, seeded or not
+            if "data_seed" in state and hasattr(train_ds, "seed"):
+                train_ds.seed = state["data_seed"]
+            if metrics is not None:
+                metrics.update(state.get("metrics", {}))
+            print(f"{name} Resuming from iteration {start_iteration}".strip())
+
+    for iteration in range(start_iteration, num_iterations):
+        print("=" * 50)
+        print(f"{name} Iteration #: {iteration}".strip())
+
+        # Train and save loss in history
+        ds = train_ds(iteration) if callable(train_ds) else train_ds
+        with instrumentation.timer(stage + "fit"):
+            history = model.fit(ds, epochs=epochs_per_iteration, verbose=verbose,
+                                steps_per_epoch=getattr(train_ds, "steps_per_epoch", None),
+                                callbacks=callbacks)
+        losses.extend(history.history["loss"])
+        if metrics is not None:
+            for key, values in history.history.items():
+                if key != "loss":
+                    metrics.setdefault(key, []).extend(float(v) for v in values)
+
+        # Select a random seed sequence from training data
+        test_idx = rng.integers(len(seeds))
+        test_chars = corpus.decode(seeds[test_idx], chars)
+
+        # Generate num_preds characters greedily from the seed
+        with instrumentation.timer(stage + "generate"):
+            generated = generation.generate(model, seeds[test_idx], num_preds, temperature=0.0,
+                                            backend=generation_backend)
+        print(f"\nGenerating from seed: \"{test_chars}\"")
+        print(test_chars + corpus.decode(generated, chars))
+
+        # Checkpoint after the sample so the saved RNG state is the one the
+        # next iteration starts from
+        done = iteration + 1
+        if checkpointer is not None and (done % checkpoint_every == 0 or done == num_iterations):
+            extra = {"data_seed": train_ds.seed} if hasattr(train_ds, "seed") else {}
+            checkpointer.save(done, losses, rng, metrics=metrics or {}, **extra)
+
+    if checkpointer is not None:
+        checkpointer.wait()
+    return losses
+
+
+def train(config):
+    """Run one TrainConfig end to end and return its loss history and summary.
+
+    Training only sees the first (1 - val - test) of the corpus. The val
+    block is scored after every epoch and the test block once at the end.
+    The result's "instrumentation" holds the stage timings of this run (see
+    instrumentation.py). With config.distribute the model trains under a
+    tf.distribute strategy (distributed.py); in a multi-worker cluster every
+    worker runs train() and restores from config.checkpoint_dir (which must be
+    shared storage across machines), and only the chief writes checkpoints
+    and the model.
+    """
+    instrumentation.default.reset()
+    # Before anything else touches the TensorFlow runtime
+    strategy = distributed.make_strategy(config.distribute, config.replicas)
+    if config.distribute != "none" and config.stateful:
+        raise ValueError("stateful training carries per-row state and does not support tf.distribute")
+    chief = distributed.is_chief()
+
+    if config.seed is not None:
+        tf.keras.utils.set_random_seed(config.seed)
+    policy = configure_precision(config.mixed_precision)
+
+    # Encoded once per corpus and tokenizer and memory-mapped by every run afterwards
+    encoded, tok = tokenizers.load_tokenized_corpus(config.corpus_path, config.tokenizer,
+                                                    config.vocab_size, config.cache_dir)
+    chars = tok.vocab
+    splits = evaluation.split_corpus(encoded, config.val_fraction, config.test_fraction)
+    X, _ = corpus.make_windows(splits["train"], config.seqlen, config.step)
+    model_kwargs = dict(config.model_kwargs)
+
+    if config.stateful:
+        # The same ordered stream batches every iteration; the state is reset per epoch
+        train_datasets = dataset.make_stream_dataset(splits["train"], config.seqlen,
+                                                     config.batch_size)
+        model_kwargs.update(stateful=True, batch_size=config.batch_size)
+    else:
+        train_datasets = dataset.make_dataset_factory(
+            splits["train"], config.seqlen, config.step, batch_size=config.batch_size, seed=config.seed,
+            strategy=strategy if config.distribute != "none" else None, full_sequence=config.full_sequence)
+
+    checkpointer = None
+    with strategy.scope():
+        model = models.build_model(config.model, config.seqlen, len(chars), jit_compile=config.xla,
+                                   full_sequence=config.full_sequence, **model_kwargs)
+        # Every worker restores the same state so the replicas start in sync;
+        # only the chief writes
+        if config.checkpoint_dir is not None:
+            checkpointer = TrainingCheckpointer(os.path.join(config.checkpoint_dir, config.name), model,
+                                                write=chief)
+    throughput = ThroughputCallback(config.batch_size, None if config.stateful else len(X),
+                                    name=config.name)
+    callbacks = [throughput, InstrumentationCallback(config.batch_size)]
+    if config.profile_dir is not None:
+        callbacks.append(ProfilerTraceCallback(os.path.join(config.profile_dir, config.name),
+                                               config.profile_start_step, config.profile_steps))
+    if config.stateful:
+        callbacks.append(ResetStatesCallback())
+    if config.val_fraction > 0:
+        callbacks.append(EvaluationCallback(splits["val"], config.seqlen, config.eval_max_windows,
+                                            name=config.name,
+                                            streams=EVAL_STREAMS if config.stateful else None,
+                                            token_lengths=tok.token_lengths))
+
+    metrics = {}
+    losses = training_loop(model, train_datasets, X, chars, config.num_iterations,
+                           config.epochs_per_iteration, config.num_preds, name=config.name,
+                           generation_backend=config.generation_backend,
+                           rng=np.random.default_rng(config.seed), callbacks=callbacks,
+                           checkpointer=checkpointer, checkpoint_every=config.checkpoint_every,
+                           resume=config.resume, overwrite=config.overwrite, metrics=metrics)
+
+    # Score every test window once, in parallel shards if asked to
+    test = None
+    if config.test_fraction > 0:
+        if config.stateful:
+            test = evaluation.evaluate_stream(model, splits["test"], EVAL_STREAMS,
+                                              token_lengths=tok.token_lengths)
+        elif config.eval_processes > 1:
+            test = evaluation.evaluate_sharded(
+                config.model, {**config.model_kwargs, "full_sequence": config.full_sequence},
+                model.get_weights(), config.corpus_path, config.seqlen, "test",
+                config.val_fraction, config.test_fraction, config.cache_dir,
+                processes=config.eval_processes, tokenizer=config.tokenizer,
+                vocab_size=config.vocab_size)
+        else:
+            test = evaluation.evaluate(model, splits["test"], config.seqlen,
+                                       token_lengths=tok.token_lengths)
+
+    if config.save_dir is not None and chief:
+        models.save_trained_model(os.path.join(config.save_dir, config.name), model, config.model,
+                                  tok, full_sequence=config.full_sequence, **model_kwargs)
+
+    # The first epoch includes tracing / XLA compilation, so report the rest
+    steady = throughput.history[1:] or throughput.history
+    samples_per_sec = step_time_ms = None
+    if steady:
+        samples_per_sec = float(np.mean([r["samples_per_sec"] for r in steady]))
+        step_time_ms = float(np.mean([r["step_time_ms"] for r in steady]))
+
+    return {"name": config.name, "model": config.model, "policy": policy, "xla": config.xla,
+            "distribute": config.distribute, "replicas": strategy.num_replicas_in_sync,
+            "losses": losses, "final_loss": losses[-1] if losses else None,
+            "throughput": throughput.history,
+            "val_bpc": metrics.get("val_bpc", []), "val_perplexity": metrics.get("val_perplexity", []),
+            "test": test,
+            "samples_per_sec": samples_per_sec, "step_time_ms": step_time_ms,
+            "instrumentation": instrumentation.default.summary()}
+
+
+def _train_worker(args):
+    values, threads = args
+
+    # Split the cores between the concurrent runs instead of oversubscribing
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    return train(TrainConfig.from_dict(values))
+
+
+def train_many(configs, processes=1):
+    """Train several configs, `processes` at a time, each in its own process.
+
+    Returns the result dicts in the same order as `configs`.
+    """
+    configs = [c if isinstance(c, TrainConfig) else TrainConfig.from_dict(c) for c in configs]
+
+    # Build every corpus cache up front so workers never race to encode it
+    for path, cache_dir, mode, vocab_size in {(c.corpus_path, c.cache_dir, c.tokenizer, c.vocab_size)
+                                              for c in configs}:
+        tokenizers.load_tokenized_corpus(path, mode, vocab_size, cache_dir)
+
+    if processes <= 1:
+        return [train(c) for c in configs]
+
+    threads = max(1, (os.cpu_count() or 1) // processes)
+    # "spawn" gives each worker a fresh TensorFlow runtime
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(processes) as pool:
+        return pool.map(_train_worker, [(dataclasses.asdict(c), threads) for c in configs])
+
+
+def load_configs(path):
+    """Read a JSON file holding a list of TrainConfig dicts (or {"runs": [...]})."""
+    with open(path) as fin:
+        values = json.load(fin)
+    if isinstance(values, dict):
+        defaults = {k: v for k, v in values.items() if k != "runs"}
+        values = [{**defaults, **run} for run in values["runs"]]
+    return [TrainConfig.from_dict(v) for v in values]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train one or more model configs.")
+    parser.add_argument("--config", required=True, help="JSON file with the run configs")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Number of configs to train concurrently")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--resume", action="store_true",
+                        help="Resume every run from its latest checkpoint")
+    parser.add_argument("--overwrite", action="store_true",
+                        help="Let fresh runs delete existing checkpoints instead of refusing to start")
+    parser.add_argument("--instrumentation",
+                        help="Write every run's stage timings to this .json or .csv file")
+    parser.add_argument("--profile-dir", help="Capture a TensorFlow profiler trace of each run here")
+    parser.add_argument("--distribute", choices=distributed.DISTRIBUTE_MODES,
+                        help="Override every run's tf.distribute mode (multi_worker reads TF_CONFIG)")
+    args = parser.parse_args()
+
+    configs = load_configs(args.config)
+    for config in configs:
+        config.resume = config.resume or args.resume
+        config.overwrite = config.overwrite or args.overwrite
+        config.profile_dir = args.profile_dir or config.profile_dir
+        config.distribute = args.distribute or config.distribute
+
+    results = train_many(configs, args.processes)
+    for result in results:
+        line = f"{result['name']:20s} final loss: {result['final_loss']:.4f}  "
+        if result["test"] is not None:
+            line += f"test {result['test']['bpc']:.4f} bpc / {result['test']['perplexity']:.3f} ppl  "
+        if result["samples_per_sec"] is not None:
+            line += f"{result['samples_per_sec']:,.0f} samples/sec  {result['step_time_ms']:.2f} ms/step  "
+        print(line + f"({result['policy']}{', XLA' if result['xla'] else ''})")
+
+    # In a multi-worker cluster only the chief writes the reports
+    if not distributed.is_chief():
+        return
+    if args.output:
+        with open(args.output, "w") as fout:
+            json.dump(results, fout, indent=2)
+    if args.instrumentation:
+        instrumentation.save(args.instrumentation, {r["name"]: r["instrumentation"] for r in results},
+                             config=args.config)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""Transformer layers and model builder for the character-level language model.
+
+Adapted from https://keras.io/examples/nlp/text_classification_with_transformer/
+"""
+
+import tensorflow.keras as keras
+from tensorflow.keras import layers, models, ops  # `ops` is used for TensorFlow operations
+
+from attention import ATTENTION_BACKENDS, EfficientAttention
+
+# Defines a single Transformer encoder block with self-attention and feed-forward layers
+class TransformerBlock(layers.Layer):
+    def __init__(self, embed_dim, num_heads, ff_dim, rate=0.1, causal=False, attention="mha",
+                 key_dim=None, chunk_size=128, window=128):
+        super().__init__()
+
+        # With causal=True each position only attends to itself and earlier
+        # positions, so every position can be trained to predict the next one
+        self.causal = causal
+
+        # Width of each attention head. The original model makes every head
+        # as wide as the whole embedding (key_dim=embed_dim); pass
+        # key_dim=embed_dim // num_heads for correctly sized heads
+        key_dim = embed_dim if key_dim is None else key_dim
+
+        # Multi-head self-attention layer: the stock Keras layer ("mha"), or
+        # chunked / sliding-window attention for long contexts (attention.py)
+        if attention not in ATTENTION_BACKENDS:
+            raise ValueError(f"Unknown attention {attention!r}, expected one of {ATTENTION_BACKENDS}")
+        if attention == "mha":
+            self.att = layers.MultiHeadAttention(num_heads=num_heads, key_dim=key_dim)
+        else:
+            self.att = EfficientAttention(num_heads, key_dim, attention, chunk_size, window)
+
+        # Feed-forward network: two dense layers
+        self.ffn = keras.Sequential([
+            layers.Dense(ff_dim, activation="relu"),  # Project to a higher dimension
+            layers.Dense(embed_dim)                   # Return to original dimension
+        ])
+
+        # Layer normalizations for residual connections
+        self.layernorm1 = layers.LayerNormalization(epsilon=1e-6)
+        self.layernorm2 = layers.LayerNormalization(epsilon=1e-6)
+
+        # Dropout for regularization
+        self.dropout1 = layers.Dropout(rate)
+        self.dropout2 = layers.Dropout(rate)
+
+    def call(self, inputs):
+        # Self-attention + residual + normalization
+        attn_output = self.att(inputs, inputs, use_causal_mask=self.causal)
+        attn_output = self.dropout1(attn_output)
+        out1 = self.layernorm1(inputs + attn_output)
+
+        # Feed-forward + residual + normalization
+        ffn_output = self.ffn(out1)
+        ffn_output = self.dropout2(ffn_output)
+        return self.layernorm2(out1 + ffn_output)
+
+# This layer combines both token embedding and position embedding
+class TokenAndPositionEmbedding(layers.Layer):
+    def __init__(self, maxlen, vocab_size, embed_dim):
+        super().__init__()
+
+        # Embedding layer to learn vector representations of tokens (characters in your case)
+        self.token_emb = layers.Embedding(input_dim=vocab_size, output_dim=embed_dim)
+
+        # Embedding layer to learn positional encodings (instead of fixed sinusoids)
+        self.pos_emb = layers.Embedding(input_dim=maxlen, output_dim=embed_dim)
+
+    def call(self, x):
+        # Get the actual sequence length from input tensor
+        maxlen = ops.shape(x)[-1]
+
+        # Create position indices [0, 1, 2, ..., maxlen - 1]
+        positions = ops.arange(start=0, stop=maxlen, step=1)
+
+        # Embed the positions and tokens separately
+        positions = self.pos_emb(positions)
+        x = self.token_emb(x)
+
+        # Add token and position embeddings (element-wise addition)
+        return x + positions
+
+# Function to build the Transformer model using your custom layers
+def build_transformer_model(seq_len, vocab_size, embed_dim=64, num_heads=2, ff_dim=128, dropout_rate=0.1,
+                            jit_compile="auto", full_sequence=False, attention="mha", key_dim=None,
+                            chunk_size=128, window=128):
+    # Input is a sequence of integers (character indices)
+    inputs = layers.Input(shape=(seq_len,))
+
+    # Token + position embedding layer
+    embedding_layer = TokenAndPositionEmbedding(seq_len, vocab_size, embed_dim)
+    x = embedding_layer(inputs)
+
+    # Transformer block (you can stack more later if desired); causal in
+    # full-sequence mode so no position sees the characters it predicts
+    # `attention` picks the backend ("mha", "chunked" or "local" with a
+    # sliding `window`) and `key_dim` the per-head width (see TransformerBlock)
+    transformer_block = TransformerBlock(embed_dim, num_heads, ff_dim, dropout_rate, causal=full_sequence,
+                                         attention=attention, key_dim=key_dim, chunk_size=chunk_size,
+                                         window=window)
+    x = transformer_block(x)
+
+    # Only keep the final time step’s output (predict next character), or
+    # every position's output in full-sequence mode.
+    # The softmax stays in float32 even under a mixed-precision policy
+    if not full_sequence:
+        x = x[:, -1, :]
+    x = layers.Dense(vocab_size, activation="softmax", dtype="float32")(x)
+
+    # Define model and compile with sparse categorical loss (for integer labels);
+    # jit_compile=True forces XLA compilation of the train step
+    model = models.Model(inputs=inputs, outputs=x)
+    model.compile(loss="sparse_categorical_crossentropy", optimizer="adam", jit_compile=jit_compile)
+    return model